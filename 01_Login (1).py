@@ -1,6 +1,6 @@
 import streamlit as st
-from config import set_page_config, apply_custom_styling
-from database import verify_password, get_user_by_email
+from config import set_page_config, apply_custom_styling, start_session
+from database import authenticate
 
 set_page_config()
 apply_custom_styling()
@@ -21,9 +21,9 @@ with col2:
     with col_login:
         if st.button("🔓 Login", use_container_width=True):
             if email and password:
-                if verify_password(email, password):
-                    user = get_user_by_email(email)
-                    st.session_state.user = user
+                user = authenticate(email, password)
+                if user:
+                    start_session(user)
                     st.success("✅ Login successful!")
                     st.balloons()
                     if user['role'] == 'admin':
@@ -1,12 +1,11 @@
 import streamlit as st
-from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info
+from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info, require_login, logout
 from database import get_appointments
 
 set_page_config()
 apply_custom_styling()
 
-if 'user' not in st.session_state or not st.session_state.user:
-    st.switch_page("pages/01_Login.py")
+require_login()
 
 show_header()
 show_sidebar_user_info(st.session_state.user)
@@ -17,9 +16,7 @@ st.title(f"👋 Welcome, {st.session_state.user['full_name']}!")
 # Sidebar
 with st.sidebar:
     if st.button("🔓 Logout", use_container_width=True):
-        st.session_state.user = None
-        st.success("Logged out successfully!")
-        st.switch_page("pages/01_Login.py")
+        logout()
 
 # Main dashboard
 col1, col2, col3 = st.columns(3)
@@ -60,10 +57,10 @@ if appointments:
         with st.container():
             col1, col2 = st.columns([3, 1])
             with col1:
-                st.markdown(f"📅 **{apt[2]}** at **{apt[3]}**")
-                st.caption(f"Status: {apt[4]}")
+                st.markdown(f"📅 **{apt['appointment_date']}** at **{apt['appointment_time']}**")
+                st.caption(f"Status: {apt['status']}")
             with col2:
-                if apt[4] == 'pending':
+                if apt['status'] == 'pending':
                     st.warning("Pending")
                 else:
                     st.success("Completed")
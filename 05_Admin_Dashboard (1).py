@@ -1,12 +1,13 @@
 import streamlit as st
-from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info
-from database import get_all_users, get_all_appointments, get_all_patient_history
+import pandas as pd
+from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info, data_grid, require_login, logout
+from database import dashboard_summary
+from provisioning import provision_users_from_csv
 
 set_page_config()
 apply_custom_styling()
 
-if 'user' not in st.session_state or not st.session_state.user or st.session_state.user['role'] != 'admin':
-    st.switch_page("pages/01_Login.py")
+require_login(role='admin')
 
 show_header()
 show_sidebar_user_info(st.session_state.user)
@@ -14,26 +15,41 @@ show_sidebar_user_info(st.session_state.user)
 st.markdown("---")
 st.title("👨‍💼 Admin Dashboard")
 
+USER_GRID_COLUMNS = {
+    'user_id': 'ID',
+    'email': 'Email',
+    'full_name': 'Name',
+    'role': 'Role',
+    'phone': 'Phone',
+    'created_at': 'Joined',
+}
+
+APPOINTMENT_GRID_COLUMNS = {
+    'appointment_id': 'ID',
+    'user_id': 'User ID',
+    'appointment_date': 'Date',
+    'appointment_time': 'Time',
+    'status': 'Status',
+    'admin_notes': 'Notes',
+}
+
 # Sidebar
 with st.sidebar:
     admin_section = st.radio("📊 Navigation", ["Dashboard", "Users", "Appointments", "Patient History", "EDA & Analytics"])
     
     if st.button("🔓 Logout", use_container_width=True):
-        st.session_state.user = None
-        st.success("Logged out successfully!")
-        st.switch_page("pages/01_Login.py")
+        logout()
 
 # Dashboard
 if admin_section == "Dashboard":
     col1, col2, col3, col4 = st.columns(4)
     
-    users = get_all_users()
-    appointments = get_all_appointments()
+    summary = dashboard_summary(recent=5)
     
     with col1:
-        st.metric("👥 Total Users", len(users) if users else 0)
+        st.metric("👥 Total Users", summary['users'])
     with col2:
-        st.metric("📅 Appointments", len(appointments) if appointments else 0)
+        st.metric("📅 Appointments", summary['appointments'])
     with col3:
         st.metric("⭐ System Health", "100%")
     with col4:
@@ -42,49 +58,75 @@ if admin_section == "Dashboard":
     st.markdown("---")
     st.markdown("### 📊 Quick Stats")
     
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("⏳ Pending Appointments", summary['pending'])
+    with col2:
+        st.metric("✅ Completed Appointments", summary['completed'])
+    
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("**Recent Users**")
-        if users:
-            for user in users[-5:]:
-                st.text(f"• {user[2]} ({user[1]})")
+        for user in summary['recent_users']:
+            st.text(f"• {user['full_name']} ({user['email']})")
     
     with col2:
         st.markdown("**Recent Appointments**")
-        if appointments:
-            for apt in appointments[-5:]:
-                st.text(f"• {apt[2]} at {apt[3]} - {apt[4]}")
+        for apt in summary['recent_appointments']:
+            st.text(f"• {apt['appointment_date']} at {apt['appointment_time']} - {apt['status']}")
 
 # Users Management
 elif admin_section == "Users":
     st.markdown("### 👥 User Management")
     
-    users = get_all_users()
+    role_filter = st.selectbox("🔑 Role", ["All", "user", "admin"])
+    role = None if role_filter == "All" else role_filter
+    
+    data_grid("admin_users", 'users', USER_GRID_COLUMNS, filters={'role': role} if role else None,
+              sort='created_at')
     
-    if users:
-        st.dataframe(
-            [[u[0], u[1], u[2], u[3], u[4], u[5]] for u in users],
-            columns=["ID", "Email", "Name", "Role", "Phone", "Joined"],
-            use_container_width=True
-        )
-    else:
-        st.info("No users found")
+    with st.expander("📤 Bulk provision from CSV"):
+        st.caption("Columns: email, password, full_name, and optionally role, phone")
+        upload = st.file_uploader("Users CSV", type=["csv"], key="provision_csv")
+        default_role = st.selectbox("Default role", ["user", "admin"], key="provision_role")
+        
+        if upload and st.button("👥 Create Accounts", use_container_width=True):
+            progress = st.progress(0, text="Provisioning...")
+            total = max(upload.getvalue().count(b"\n") - 1, 1)
+            report = provision_users_from_csv(
+                upload,
+                default_role=default_role,
+                on_progress=lambda done: progress.progress(min(done / total, 1.0), text=f"{done} rows processed")
+            )
+            progress.empty()
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("✅ Created", report['created'])
+            with col2:
+                st.metric("♻️ Duplicates", len(report['duplicates']))
+            with col3:
+                st.metric("⚠️ Invalid", len(report['invalid']))
+            st.caption(f"{report['users_per_sec']:.1f} users/sec in {report['seconds']:.1f}s")
+            
+            problems = [[line, "Duplicate email", email] for line, email in report['duplicates']]
+            problems += [[line, "Invalid", message] for line, message in report['invalid']]
+            if problems:
+                st.dataframe(
+                    pd.DataFrame(sorted(problems), columns=["Line", "Problem", "Detail"]),
+                    use_container_width=True
+                )
 
 # Appointments
 elif admin_section == "Appointments":
     st.markdown("### 📅 Appointment Management")
     
-    appointments = get_all_appointments()
+    status_filter = st.selectbox("📌 Status", ["All", "pending", "completed"])
+    status = None if status_filter == "All" else status_filter
     
-    if appointments:
-        st.dataframe(
-            [[a[0], a[1], a[2], a[3], a[4], a[5]] for a in appointments],
-            columns=["ID", "User ID", "Date", "Time", "Status", "Notes"],
-            use_container_width=True
-        )
-    else:
-        st.info("No appointments found")
+    data_grid("admin_appointments", 'appointments', APPOINTMENT_GRID_COLUMNS,
+              filters={'status': status} if status else None, sort='appointment_date')
 
 # Patient History
 elif admin_section == "Patient History":
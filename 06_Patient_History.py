@@ -1,13 +1,14 @@
+import os
 import streamlit as st
 import pandas as pd
-from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info
-from database import get_patient_history, get_all_patient_history, add_patient_history
+from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info, keyset_pager, require_login, logout
+from database import get_patient_history_page, add_patient_history, search_patient_history, search_rank_window
+from exports import EXPORT_FORMATS, export_to_tempfile
 
 set_page_config()
 apply_custom_styling()
 
-if 'user' not in st.session_state or not st.session_state.user:
-    st.switch_page("pages/01_Login.py")
+require_login()
 
 show_header()
 show_sidebar_user_info(st.session_state.user)
@@ -23,8 +24,40 @@ with st.sidebar:
             st.switch_page("pages/04_User_Dashboard.py")
     
     if st.button("🔓 Logout", use_container_width=True):
-        st.session_state.user = None
-        st.switch_page("pages/01_Login.py")
+        logout()
+
+VIEW_COLUMNS = {
+    'patient_id': 'ID',
+    'name': 'Name',
+    'age': 'Age',
+    'gender': 'Gender',
+    'disease_name': 'Disease',
+    'diagnosis_date': 'Date',
+    'status': 'Status',
+}
+
+EXPORT_COLUMNS = {
+    'patient_id': 'Patient ID',
+    'name': 'Name',
+    'age': 'Age',
+    'gender': 'Gender',
+    'disease_name': 'Disease',
+    'symptoms': 'Symptoms',
+    'severity_level': 'Severity',
+    'height_cm': 'Height',
+    'weight_kg': 'Weight',
+    'BMI': 'BMI',
+    'treatment_given': 'Treatment',
+    'medicine_prescribed': 'Medicine',
+    'treatment_cost': 'Cost',
+    'diagnosis_date': 'Date',
+}
+
+EXPORT_FORMAT_LABELS = {
+    'csv': 'CSV',
+    'csv.gz': 'CSV (gzip)',
+    'xlsx': 'Excel',
+}
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📊 View Records", "➕ Add Record", "💾 Export Data"])
@@ -34,28 +67,48 @@ with tab1:
     st.markdown("### Your Medical Records")
     
     if st.session_state.user['role'] == 'admin':
-        records = get_all_patient_history()
         st.info("📊 Showing all patient records (Admin View)")
+        with st.expander("🔎 Filters"):
+            col_from, col_to = st.columns(2)
+            with col_from:
+                date_from = st.date_input("From", value=None)
+            with col_to:
+                date_to = st.date_input("To", value=None)
+        user_filter = None
     else:
-        records = get_patient_history(st.session_state.user['user_id'])
-    
-    if records:
-        df_data = []
-        for record in records:
-            df_data.append({
-                'ID': record[0],
-                'Name': record[2],
-                'Age': record[3],
-                'Gender': record[4],
-                'Disease': record[5],
-                'Date': record[9],
-                'Status': record[13]
-            })
-        
-        df = pd.DataFrame(df_data)
-        st.dataframe(df, use_container_width=True)
+        date_from = date_to = None
+        user_filter = st.session_state.user['user_id']
+    
+    search = st.text_input("🔍 Search notes", placeholder="Symptoms, history, treatment or medicine...").strip()
+    
+    if search:
+        hits = keyset_pager(
+            f"history_search_{user_filter}_{search}",
+            lambda after, limit: search_patient_history(search, user_id=user_filter, after=after, limit=limit),
+            page_size=20
+        )
+        window = search_rank_window()
+        if window:
+            st.caption(f"Ranked best first within each batch of {window:,} most recent matching visits")
+        if hits:
+            for hit in hits:
+                st.markdown(f"**{hit['name']}** · {hit['disease_name'] or 'N/A'} · {hit['diagnosis_date'] or ''}  \n{hit['snippet']}")
+        else:
+            st.info("No matching records")
     else:
-        st.info("No medical records found")
+        records = keyset_pager(
+            f"history_{user_filter}_{date_from}_{date_to}",
+            lambda after, limit: get_patient_history_page(
+                after, limit, user_id=user_filter, date_from=date_from, date_to=date_to,
+                columns=list(VIEW_COLUMNS)
+            )
+        )
+        
+        if records:
+            df = pd.DataFrame(records, columns=list(VIEW_COLUMNS)).rename(columns=VIEW_COLUMNS)
+            st.dataframe(df, use_container_width=True)
+        else:
+            st.info("No medical records found")
 
 # Add Record
 with tab2:
@@ -128,44 +181,34 @@ with tab2:
 with tab3:
     st.markdown("### Export Records")
     
-    if st.session_state.user['role'] == 'admin':
-        records = get_all_patient_history()
-    else:
-        records = get_patient_history(st.session_state.user['user_id'])
-    
-    if records:
-        df_data = []
-        for record in records:
-            df_data.append({
-                'Patient ID': record[0],
-                'Name': record[2],
-                'Age': record[3],
-                'Gender': record[4],
-                'Disease': record[5],
-                'Symptoms': record[6],
-                'Severity': record[7],
-                'Height': record[15],
-                'Weight': record[16],
-                'BMI': record[17],
-                'Treatment': record[20],
-                'Medicine': record[21],
-                'Cost': record[22],
-                'Date': record[9]
-            })
-        
-        df = pd.DataFrame(df_data)
-        
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 Download as CSV",
-            data=csv,
-            file_name="patient_records.csv",
-            mime="text/csv"
-        )
-        
-        st.info("✅ Data ready to export in CSV format")
-    else:
-        st.info("No records to export")
+    user_filter = None if st.session_state.user['role'] == 'admin' else st.session_state.user['user_id']
+    export_format = st.radio("Format", list(EXPORT_FORMAT_LABELS), format_func=EXPORT_FORMAT_LABELS.get,
+                             horizontal=True)
+    st.caption("The download is held in server memory while it is served; use CSV (gzip) for large exports")
+    
+    if st.button("📦 Prepare Export"):
+        status = st.empty()
+        with st.spinner("Exporting records..."):
+            path, rows = export_to_tempfile(list(EXPORT_COLUMNS), export_format, user_filter, EXPORT_COLUMNS,
+                                            on_progress=lambda n: status.caption(f"{n:,} records written"))
+        status.empty()
+        # Read once into this run's download button, then delete: nothing is kept in
+        # session state, so later reruns neither re-read the file nor leave it behind
+        try:
+            if rows:
+                extension, mime = EXPORT_FORMATS[export_format]
+                with open(path, 'rb') as f:
+                    st.download_button(
+                        label=f"📥 Download {EXPORT_FORMAT_LABELS[export_format]}",
+                        data=f,
+                        file_name=f"patient_records.{extension}",
+                        mime=mime
+                    )
+                st.info(f"✅ {rows:,} records ready to download")
+            else:
+                st.info("No records to export")
+        finally:
+            os.remove(path)
 
 st.markdown("---")
 st.markdown("**Version:** 1.0.0 | **Created:** December 2024")
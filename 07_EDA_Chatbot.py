@@ -1,15 +1,18 @@
+import os
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info
-from database import get_all_patient_history
+from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info, data_grid, require_login, logout
+from analytics import patient_overview, count_by, age_histogram, cost_by_age, binned_histogram, scatter_sample
+from snapshot import cached_read_snapshot, export_snapshot, load_state
+from chatbot import SAMPLE_QUESTIONS, answer
+from ingestion import FIELDS, ingest_patient_history, preview, suggest_mapping
 
 set_page_config()
 apply_custom_styling()
 
-if 'user' not in st.session_state or not st.session_state.user or st.session_state.user['role'] != 'admin':
-    st.switch_page("pages/01_Login.py")
+require_login(role='admin')
 
 show_header()
 show_sidebar_user_info(st.session_state.user)
@@ -21,8 +24,21 @@ with st.sidebar:
     if st.button("⬅️ Back"):
         st.switch_page("pages/05_Admin_Dashboard.py")
     if st.button("🔓 Logout", use_container_width=True):
-        st.session_state.user = None
-        st.switch_page("pages/01_Login.py")
+        logout()
+
+EDA_COLUMNS = {
+    'patient_id': 'Patient ID',
+    'name': 'Name',
+    'age': 'Age',
+    'gender': 'Gender',
+    'disease_name': 'Disease',
+    'severity_level': 'Severity',
+    'BMI': 'BMI',
+    'treatment_cost': 'Treatment Cost',
+    'diagnosis_date': 'Date',
+}
+
+IGNORE_COLUMN = '(ignore)'
 
 # Tabs
 tab1, tab2, tab3 = st.tabs(["📈 EDA Analysis", "💬 Data Chatbot", "📤 Upload Data"])
@@ -31,35 +47,19 @@ tab1, tab2, tab3 = st.tabs(["📈 EDA Analysis", "💬 Data Chatbot", "📤 Uplo
 with tab1:
     st.markdown("### Exploratory Data Analysis")
     
-    patient_records = get_all_patient_history()
+    overview = patient_overview()
     
-    if patient_records:
-        df_data = []
-        for record in patient_records:
-            df_data.append({
-                'Patient ID': record[0],
-                'Name': record[2],
-                'Age': record[3],
-                'Gender': record[4],
-                'Disease': record[5],
-                'Severity': record[7],
-                'BMI': record[17] if record[17] else 0,
-                'Treatment Cost': record[22] if record[22] else 0,
-                'Date': record[9]
-            })
-        
-        df = pd.DataFrame(df_data)
-        
+    if overview['total_patients']:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("👥 Total Patients", len(df))
+            st.metric("👥 Total Patients", overview['total_patients'])
         with col2:
-            st.metric("💰 Total Cost", f"${df['Treatment Cost'].sum():,.0f}")
+            st.metric("💰 Total Cost", f"${overview['total_cost']:,.0f}")
         with col3:
-            st.metric("📊 Avg Age", f"{df['Age'].mean():.1f} years")
+            st.metric("📊 Avg Age", f"{overview['avg_age'] or 0:.1f} years")
         with col4:
-            st.metric("📈 Avg BMI", f"{df['BMI'].mean():.1f}")
+            st.metric("📈 Avg BMI", f"{overview['avg_bmi'] or 0:.1f}")
         
         st.markdown("---")
         st.markdown("### Data Distribution")
@@ -68,83 +68,116 @@ with tab1:
         
         with col1:
             st.markdown("**Age Distribution**")
-            fig_age = px.histogram(df, x='Age', nbins=10, title='Patient Age Distribution')
+            age_bins = age_histogram(bin_width=10)
+            fig_age = px.bar(age_bins, x='label', y='patients', title='Patient Age Distribution',
+                             labels={'label': 'Age', 'patients': 'Patients'})
             st.plotly_chart(fig_age, use_container_width=True)
         
         with col2:
             st.markdown("**Gender Distribution**")
-            gender_count = df['Gender'].value_counts()
-            fig_gender = px.pie(values=gender_count.values, names=gender_count.index, title='Gender Distribution')
+            gender_count = count_by('gender')
+            fig_gender = px.pie(gender_count, values='patients', names='gender', title='Gender Distribution')
             st.plotly_chart(fig_gender, use_container_width=True)
         
         st.markdown("---")
         st.markdown("**Disease Distribution**")
-        disease_count = df['Disease'].value_counts().head(10)
-        fig_disease = px.bar(x=disease_count.values, y=disease_count.index, orientation='h', title='Top 10 Diseases')
+        disease_count = count_by('disease_name', limit=10)
+        fig_disease = px.bar(disease_count, x='patients', y='disease_name', orientation='h', title='Top 10 Diseases',
+                             labels={'disease_name': 'Disease', 'patients': 'Patients'})
         st.plotly_chart(fig_disease, use_container_width=True)
         
         st.markdown("---")
         st.markdown("**Treatment Cost Analysis**")
-        fig_cost = px.scatter(df, x='Age', y='Treatment Cost', color='Severity', title='Treatment Cost vs Age')
+        cost_points = cost_by_age('severity_level')
+        fig_cost = px.scatter(cost_points, x='age', y='avg_cost', color='severity_level', size='patients',
+                              title='Treatment Cost vs Age',
+                              labels={'age': 'Age', 'avg_cost': 'Avg Treatment Cost', 'severity_level': 'Severity'})
         st.plotly_chart(fig_cost, use_container_width=True)
-        
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            cost_bins = binned_histogram('treatment_cost')
+            fig_cost_hist = px.bar(cost_bins, x='label', y='patients', title='Treatment Cost Distribution',
+                                   labels={'label': 'Treatment Cost', 'patients': 'Patients'})
+            fig_cost_hist.update_layout(bargap=0)
+            st.plotly_chart(fig_cost_hist, use_container_width=True)
+
+        with col2:
+            points, total = scatter_sample('BMI', 'treatment_cost', group='severity_level')
+            fig_bmi = px.scatter(points, x='BMI', y='treatment_cost', color='severity_level',
+                                 custom_data=['represents'], opacity=0.6, title='BMI vs Treatment Cost',
+                                 labels={'treatment_cost': 'Treatment Cost', 'severity_level': 'Severity'})
+            fig_bmi.update_traces(
+                hovertemplate='BMI %{x:.1f}<br>Cost $%{y:,.0f}<br>Represents %{customdata[0]:,.1f} patients<extra></extra>'
+            )
+            st.plotly_chart(fig_bmi, use_container_width=True)
+            if len(points) < total:
+                st.caption(f"Showing a stratified sample of {len(points):,} of {total:,} patients")
+
         st.markdown("---")
         st.markdown("### Data Summary")
-        st.dataframe(df, use_container_width=True)
+        data_grid("eda_summary", 'patient_history', EDA_COLUMNS)
     else:
         st.info("No data available for analysis")
+    
+    with st.expander("🧊 Analytics snapshot"):
+        st.caption("Columnar Parquet copy of patient history for trend charts and external analytics tools")
+        state = load_state()
+        if state:
+            st.write(f"Up to date as of **{state.get('exported_at', '-')}** (changes through {state['watermark'][0]})")
+            # Only the partition column is read
+            months = cached_read_snapshot(['diagnosis_month'])['diagnosis_month'].astype(str).value_counts().sort_index()
+            if not months.empty:
+                fig_months = px.bar(x=months.index, y=months.values, title='Visits per Diagnosis Month',
+                                    labels={'x': 'Month', 'y': 'Visits'})
+                st.plotly_chart(fig_months, use_container_width=True)
+        else:
+            st.write("No snapshot yet")
+        if st.button("🔄 Update snapshot"):
+            with st.spinner("Exporting changed records..."):
+                report = export_snapshot()
+            st.success(f"✅ {report['rows']:,} records exported to {report['files']} files "
+                       f"({report['compacted']} partitions compacted) in {report['seconds']:.1f}s")
 
 # Chatbot
 with tab2:
     st.markdown("### Data Chatbot")
     
-    st.info("💬 Ask questions about patient data")
+    st.info("💬 Ask questions about patient data, e.g. \"average cost for diabetes patients over 60 by gender\"")
     
-    patient_records = get_all_patient_history()
+    query = st.text_input("🤖 Ask a question:", placeholder="e.g., How many patients have disease X?")
     
-    if patient_records:
-        df_data = []
-        for record in patient_records:
-            df_data.append({
-                'Age': record[3],
-                'Gender': record[4],
-                'Disease': record[5],
-                'BMI': record[17] if record[17] else 0,
-                'Cost': record[22] if record[22] else 0
-            })
-        
-        df = pd.DataFrame(df_data)
-        
-        query = st.text_input("🤖 Ask a question:", placeholder="e.g., How many patients have disease X?")
+    if st.button("💬 Get Answer") and query.strip():
+        try:
+            result = answer(query)
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+            result = False
         
-        if st.button("💬 Get Answer"):
-            if query.lower().find("total") > -1 or query.lower().find("how many") > -1:
-                st.success(f"✅ Total patients: **{len(df)}**")
-            elif query.lower().find("average age") > -1:
-                st.success(f"✅ Average age: **{df['Age'].mean():.1f}** years")
-            elif query.lower().find("disease") > -1:
-                st.success(f"✅ Top diseases: {df['Disease'].value_counts().head(5).to_dict()}")
-            elif query.lower().find("cost") > -1:
-                st.success(f"✅ Total treatment cost: **${df['Cost'].sum():,.0f}**")
-                st.success(f"✅ Average cost: **${df['Cost'].mean():,.0f}**")
-            elif query.lower().find("gender") > -1:
-                st.success(f"✅ Gender distribution: {df['Gender'].value_counts().to_dict()}")
-            elif query.lower().find("bmi") > -1:
-                st.success(f"✅ Average BMI: **{df['BMI'].mean():.1f}**")
+        if result is None:
+            st.info("💡 Try asking: 'How many patients?', 'Average age by gender', 'Top 5 diseases among smokers', etc.")
+        elif result:
+            if 'rows' in result:
+                st.success(f"✅ {result['title']}")
+                if result['rows']:
+                    chart_df = pd.DataFrame(result['rows'])
+                    group_label = chart_df.columns[0]
+                    st.dataframe(chart_df, use_container_width=True, hide_index=True)
+                    fig = px.bar(chart_df, x=group_label, y='value', title=result['title'],
+                                 labels={'value': result['title'].split(' by ')[0]})
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.info("No matching records")
             else:
-                st.info("💡 Try asking: 'How many patients?', 'What is average age?', 'Show diseases', etc.")
-        
-        with st.expander("💡 Sample Questions"):
-            st.markdown("""
-            - How many patients are in the database?
-            - What is the average age of patients?
-            - What are the most common diseases?
-            - What is the average treatment cost?
-            - Show gender distribution
-            - What is the average BMI?
-            """)
-    else:
-        st.info("No data available for chatbot")
+                st.success(f"✅ {result['title']}: **{result['value']}**")
+                st.caption(f"Based on {result['patients']:,} records")
+            with st.expander("🔍 How this was computed"):
+                st.code(result['sql'], language='sql')
+                st.write("Parameters:", list(result['params']))
+    
+    with st.expander("💡 Sample Questions"):
+        st.markdown("\n".join(f"- {question}" for question in SAMPLE_QUESTIONS))
 
 # Upload Data
 with tab3:
@@ -154,17 +187,65 @@ with tab3:
     
     if uploaded_file:
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
-            
-            st.success("✅ File uploaded successfully")
-            st.dataframe(df, use_container_width=True)
-            
-            st.info("📊 Data preview - Ready to analyze")
+            uploaded_file.seek(0)
+            sample = preview(uploaded_file, uploaded_file.name)
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
+            sample = None
+        
+        if sample is not None:
+            st.markdown("**Preview**")
+            st.dataframe(sample, use_container_width=True)
+            
+            st.markdown("**Column Mapping**")
+            suggested = suggest_mapping(sample.columns)
+            options = [IGNORE_COLUMN] + list(FIELDS)
+            mapping = {}
+            map_cols = st.columns(3)
+            for i, column in enumerate(sample.columns):
+                with map_cols[i % 3]:
+                    field = st.selectbox(str(column), options, index=options.index(suggested.get(column, IGNORE_COLUMN)),
+                                         key=f"ingest_{uploaded_file.name}_{column}")
+                if field != IGNORE_COLUMN:
+                    mapping[column] = field
+            
+            if st.button("📥 Import Records", use_container_width=True):
+                st.session_state.pop('ingest_report', None)
+                uploaded_file.seek(0)
+                progress = st.progress(0.0, text="Importing...")
+                
+                def show_progress(rows):
+                    done = min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0)
+                    progress.progress(done, text=f"{rows:,} rows processed")
+                
+                try:
+                    report = ingest_patient_history(uploaded_file, uploaded_file.name, mapping,
+                                                    st.session_state.user['user_id'], on_progress=show_progress)
+                    progress.progress(1.0, text=f"{report['rows']:,} rows processed")
+                    # Only the counts outlive this run; the reject file goes to the download button below
+                    st.session_state.ingest_report = dict(report, reject_path=None)
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+                    report = None
+                
+                if report and report['reject_path']:
+                    # Read once into this run's download button, then delete, as the history export does
+                    try:
+                        with open(report['reject_path'], 'rb') as f:
+                            st.download_button("📥 Download rejected rows", data=f, file_name="rejected_rows.csv",
+                                               mime="text/csv")
+                    finally:
+                        os.remove(report['reject_path'])
+    
+    report = st.session_state.get('ingest_report')
+    if report:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("✅ Imported", f"{report['inserted']:,}")
+        with col2:
+            st.metric("⛔ Rejected", f"{report['rejected']:,}")
+        with col3:
+            st.metric("⚡ Rows/sec", f"{report['rows_per_sec']:,.0f}")
 
 st.markdown("---")
 st.markdown("**Version:** 1.0.0 | **Created:** December 2024")
@@ -1,11 +1,12 @@
 import streamlit as st
-from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info
+from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info, require_login, logout
+from diagnosis import recommendations_for
+from diagnosis_model import cached_analyze, get_diagnosis_cache_stats, model_ready
 
 set_page_config()
 apply_custom_styling()
 
-if 'user' not in st.session_state or not st.session_state.user:
-    st.switch_page("pages/01_Login.py")
+require_login()
 
 show_header()
 show_sidebar_user_info(st.session_state.user)
@@ -18,33 +19,13 @@ with st.sidebar:
     if st.button("⬅️ Back"):
         st.switch_page("pages/04_User_Dashboard.py")
     if st.button("🔓 Logout", use_container_width=True):
-        st.session_state.user = None
-        st.switch_page("pages/01_Login.py")
-
-# Disease database
-DISEASES_DB = {
-    'fever': ['Cold', 'Flu', 'Typhoid', 'Malaria', 'COVID-19'],
-    'cough': ['Cold', 'Flu', 'Bronchitis', 'Asthma', 'COVID-19'],
-    'headache': ['Migraine', 'Tension Headache', 'Cold', 'Flu'],
-    'body pain': ['Flu', 'COVID-19', 'Muscle Strain', 'Arthritis'],
-    'runny nose': ['Cold', 'Allergy', 'Flu', 'Sinusitis'],
-    'sore throat': ['Cold', 'Flu', 'Strep Throat', 'Pharyngitis'],
-    'fatigue': ['Anemia', 'Thyroid', 'Depression', 'Chronic Fatigue'],
-    'shortness of breath': ['Asthma', 'Pneumonia', 'Anxiety', 'Heart Disease'],
-    'nausea': ['Food Poisoning', 'Gastritis', 'Pregnancy', 'Migraine'],
-    'dizziness': ['Vertigo', 'Low Blood Pressure', 'Anemia', 'Dehydration']
-}
-
-RECOMMENDATIONS_DB = {
-    'Cold': ['Rest', 'Hydration', 'Vitamin C', 'Gargle with salt water'],
-    'Flu': ['Rest', 'Fluids', 'Pain reliever', 'Consult doctor if severe'],
-    'Migraine': ['Rest in dark room', 'Pain medication', 'Avoid triggers', 'Hydration'],
-    'Fever': ['Paracetamol', 'Cold compress', 'Hydration', 'Monitor temperature'],
-    'Asthma': ['Inhaler', 'Avoid triggers', 'Exercise regularly', 'Consult specialist'],
-    'COVID-19': ['Self-isolate', 'Get tested', 'Monitor symptoms', 'Seek medical help if worsens'],
-    'Bronchitis': ['Rest', 'Cough syrup', 'Humidifier', 'See doctor if persistent'],
-    'Sore Throat': ['Throat lozenges', 'Warm water gargle', 'Honey tea', 'Avoid smoking'],
-}
+        logout()
+    
+    if st.session_state.user['role'] == 'admin':
+        cache_stats = get_diagnosis_cache_stats()
+        st.caption(f"🧠 Diagnosis cache: {cache_stats['hit_rate']:.0%} hits · {cache_stats['size']} entries")
+        if not model_ready():
+            st.caption("⏳ Learned model warming up; using the knowledge base meanwhile")
 
 col1, col2 = st.columns([2, 1])
 
@@ -75,16 +56,9 @@ if st.button("🔍 Analyze Symptoms", use_container_width=True):
     if not symptoms_text:
         st.error("❌ Please describe your symptoms")
     else:
-        symptoms_lower = symptoms_text.lower()
+        matches, source = cached_analyze(symptoms_text, severity, age, gender, limit=5)
         
-        matched_diseases = set()
-        for symptom, diseases in DISEASES_DB.items():
-            if symptom in symptoms_lower:
-                matched_diseases.update(diseases)
-        
-        if matched_diseases:
-            matched_diseases = list(matched_diseases)[:5]
-            
+        if matches:
             st.success("✅ Analysis Complete")
             
             st.markdown("---")
@@ -93,7 +67,10 @@ if st.button("🔍 Analyze Symptoms", use_container_width=True):
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("📊 Confidence", "75%")
+                if source == 'model':
+                    st.metric("📊 Confidence", f"{matches[0]['confidence']:.0%}")
+                else:
+                    st.metric("📊 Symptom Match", f"{matches[0]['confidence']:.0%}")
             with col2:
                 st.metric("⚠️ Severity", severity)
             with col3:
@@ -102,15 +79,17 @@ if st.button("🔍 Analyze Symptoms", use_container_width=True):
             st.markdown("---")
             st.markdown("### 🏥 Possible Conditions")
             
-            for i, disease in enumerate(matched_diseases, 1):
+            for i, match in enumerate(matches, 1):
+                disease = match['disease']
                 with st.container():
                     col1, col2 = st.columns([3, 1])
                     
                     with col1:
                         st.markdown(f"**{i}. {disease}**")
+                        st.caption(f"{match['confidence']:.0%} · Matched: {', '.join(match['symptoms'])}")
                         
-                        if disease in RECOMMENDATIONS_DB:
-                            recommendations = RECOMMENDATIONS_DB[disease]
+                        recommendations = recommendations_for(disease)
+                        if recommendations:
                             st.markdown("**Recommendations:**")
                             for rec in recommendations:
                                 st.markdown(f"• {rec}")
@@ -1,11 +1,10 @@
 import streamlit as st
-from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info
+from config import set_page_config, apply_custom_styling, show_header, show_sidebar_user_info, require_login, logout
 
 set_page_config()
 apply_custom_styling()
 
-if 'user' not in st.session_state or not st.session_state.user:
-    st.switch_page("pages/01_Login.py")
+require_login()
 
 show_header()
 show_sidebar_user_info(st.session_state.user)
@@ -18,8 +17,7 @@ with st.sidebar:
     if st.button("⬅️ Back"):
         st.switch_page("pages/04_User_Dashboard.py")
     if st.button("🔓 Logout", use_container_width=True):
-        st.session_state.user = None
-        st.switch_page("pages/01_Login.py")
+        logout()
 
 # Main menu
 st.markdown("---")
@@ -0,0 +1,214 @@
+"""Server-side aggregates over patient_history
+
+Every function returns a small result (a dict or a DataFrame with at most a
+few hundred rows, or CHART_CONFIG['max_points'] for sampled scatter plots),
+so the chart payload sent to the browser stays flat as the table grows.
+Counts are computed by the database; histograms and scatter samples of
+continuous columns are built with NumPy from the typed, cached
+query_patient_history() frame.
+"""
+import numpy as np
+import pandas as pd
+from database import get_backend, cached_query, query_cache, query_patient_history
+
+# Chart payload limits
+CHART_CONFIG = {
+    'max_points': 2000,       # Points per sampled scatter plot
+    'bins': 40,               # Bars per histogram
+    'grid': 20,               # Cells per axis when stratifying a scatter sample
+    'seed': 42,               # Fixed so reruns show the same sample
+}
+
+# Columns that may be used in GROUP BY
+GROUPABLE_COLUMNS = ('gender', 'disease_name', 'severity_level', 'smoking_status',
+                     'exercise_level', 'status', 'insurance_used')
+
+def _check_column(column):
+    if column not in GROUPABLE_COLUMNS:
+        raise ValueError(f"Cannot group patient_history by {column}")
+
+def patient_overview():
+    """Total patients, total treatment cost, average age and average BMI"""
+    try:
+        rows = cached_query(
+            ('patient_history',),
+            '''SELECT COUNT(*) AS total_patients,
+                      COALESCE(SUM(treatment_cost), 0) AS total_cost,
+                      AVG(age) AS avg_age,
+                      AVG(COALESCE(BMI, 0)) AS avg_bmi
+               FROM patient_history'''
+        )
+        row = rows[0] if rows else None
+    except Exception as e:
+        print(f"Error: {e}")
+        row = None
+    if not row:
+        return {'total_patients': 0, 'total_cost': 0.0, 'avg_age': None, 'avg_bmi': None}
+    return {
+        'total_patients': int(row['total_patients']),
+        'total_cost': float(row['total_cost']),
+        'avg_age': float(row['avg_age']) if row['avg_age'] is not None else None,
+        'avg_bmi': float(row['avg_bmi']) if row['avg_bmi'] is not None else None,
+    }
+
+def count_by(column, limit=None):
+    """Patient counts per value of column, most frequent first"""
+    _check_column(column)
+    sql = f'''SELECT {column}, COUNT(*) AS patients
+              FROM patient_history
+              GROUP BY {column}
+              ORDER BY patients DESC'''
+    params = ()
+    if limit:
+        sql += ' LIMIT %s'
+        params = (limit,)
+    try:
+        rows = cached_query(('patient_history',), sql, params)
+    except Exception as e:
+        print(f"Error: {e}")
+        rows = []
+    return pd.DataFrame(rows, columns=[column, 'patients'])
+
+def age_histogram(bin_width=10):
+    """Patient counts per age bin; bin_start is the inclusive lower edge"""
+    backend = get_backend()
+    bucket = backend.floor_div('age', bin_width)
+    try:
+        rows = cached_query(
+            ('patient_history',),
+            f'''SELECT {bucket} * {int(bin_width)} AS bin_start, COUNT(*) AS patients
+                FROM patient_history
+                WHERE age IS NOT NULL
+                GROUP BY bin_start
+                ORDER BY bin_start'''
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        rows = []
+    df = pd.DataFrame(rows, columns=['bin_start', 'patients'])
+    df['bin_start'] = df['bin_start'].astype('int64')
+    df['label'] = [f"{start}-{start + bin_width - 1}" for start in df['bin_start']]
+    return df
+
+def cost_by_age(group_column='severity_level'):
+    """Average treatment cost and patient count per (age, group_column)"""
+    _check_column(group_column)
+    try:
+        rows = cached_query(
+            ('patient_history',),
+            f'''SELECT age, {group_column} AS grp,
+                       AVG(COALESCE(treatment_cost, 0)) AS avg_cost,
+                       COUNT(*) AS patients
+                FROM patient_history
+                WHERE age IS NOT NULL
+                GROUP BY age, {group_column}
+                ORDER BY age'''
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        rows = []
+    df = pd.DataFrame(rows, columns=['age', 'grp', 'avg_cost', 'patients'])
+    df['avg_cost'] = df['avg_cost'].astype('float64')
+    return df.rename(columns={'grp': group_column})
+
+def binned_histogram(column, bins=None):
+    """Counts of a numeric column in equal-width bins, computed with NumPy
+
+    Returns a DataFrame with bin_start, bin_end, patients and label.
+    """
+    bins = bins or CHART_CONFIG['bins']
+
+    def load():
+        values = query_patient_history([column])[column].to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return pd.DataFrame(columns=['bin_start', 'bin_end', 'patients', 'label'])
+        counts, edges = np.histogram(values, bins=bins)
+        return pd.DataFrame({
+            'bin_start': edges[:-1],
+            'bin_end': edges[1:],
+            'patients': counts,
+            'label': [f"{a:,.0f}-{b:,.0f}" for a, b in zip(edges[:-1], edges[1:])],
+        })
+
+    try:
+        return query_cache.get_or_load(('chart', 'histogram', column, bins), load, ('patient_history',))
+    except Exception as e:
+        print(f"Error: {e}")
+        return pd.DataFrame(columns=['bin_start', 'bin_end', 'patients', 'label'])
+
+def stratified_sample(frame, x, y, group=None, max_points=None, grid=None, seed=None):
+    """At most max_points rows of frame that keep the shape of the x/y scatter
+
+    Rows are stratified by group and by a grid x grid cell of the x/y plane.
+    Every stratum keeps at least one point, so outliers and small groups
+    survive, and the remaining budget is shared in proportion to stratum
+    size, so dense regions stay dense. With more strata than max_points the
+    minimum is dropped and points are shared in proportion only, so the
+    smallest strata may be left out; their rows are then spread over the kept
+    points. Each kept row gets a 'represents' column: how many original rows
+    it stands for.
+    """
+    max_points = max_points or CHART_CONFIG['max_points']
+    grid = grid or CHART_CONFIG['grid']
+    seed = CHART_CONFIG['seed'] if seed is None else seed
+    frame = frame.dropna(subset=[x, y])
+    if len(frame) <= max_points:
+        return frame.assign(represents=1)
+
+    def cells(values):
+        values = values.to_numpy(dtype='float64')
+        low, high = values.min(), values.max()
+        scaled = (values - low) / (high - low) * grid if high > low else np.zeros(len(values))
+        return np.minimum(scaled.astype(np.int64), grid - 1)
+
+    strata = cells(frame[x]) * grid + cells(frame[y])
+    if group:
+        strata = strata + pd.factorize(frame[group])[0] * grid * grid
+    _, stratum, sizes = np.unique(strata, return_inverse=True, return_counts=True)
+
+    # One point per stratum when they fit, then the rest in proportion to size (largest remainders first)
+    minimum = 1 if len(sizes) <= max_points else 0
+    budget = max_points - minimum * len(sizes)
+    share = sizes / sizes.sum() * budget
+    quota = np.minimum(minimum + np.floor(share).astype(np.int64), sizes)
+    leftover = max_points - quota.sum()
+    if leftover > 0:
+        room = sizes - quota
+        order = np.argsort(-(share - np.floor(share)), kind='stable')
+        order = order[room[order] > 0][:leftover]
+        quota[order] += 1
+
+    # A random rank within each stratum picks quota[s] rows from stratum s
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(frame)), stratum))
+    first = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rank = np.empty(len(frame), dtype=np.int64)
+    rank[order] = np.arange(len(frame)) - np.repeat(first, sizes)
+    keep = rank < quota[stratum]
+    kept = stratum[keep]
+    represents = sizes[kept] / quota[kept]
+    if not minimum:
+        represents *= len(frame) / represents.sum()
+    return frame[keep].assign(represents=represents)
+
+def scatter_sample(x, y, group=None, max_points=None):
+    """Sampled per-patient scatter data; returns (points, total_patients)
+
+    points has x, y, group (when given) and represents columns, at most
+    max_points rows; total_patients counts every row with both x and y.
+    """
+    max_points = max_points or CHART_CONFIG['max_points']
+    columns = [x, y] + ([group] if group else [])
+
+    def load():
+        frame = query_patient_history(columns)
+        total = int(frame[[x, y]].notna().all(axis=1).sum())
+        return stratified_sample(frame, x, y, group, max_points), total
+
+    try:
+        return query_cache.get_or_load(('chart', 'scatter', tuple(columns), max_points), load,
+                                       ('patient_history',))
+    except Exception as e:
+        print(f"Error: {e}")
+        return pd.DataFrame(columns=columns + ['represents']), 0
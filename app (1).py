@@ -1,6 +1,7 @@
 import streamlit as st
 from config import set_page_config, apply_custom_styling
 from database import init_database
+from auth import sessions
 
 set_page_config()
 apply_custom_styling()
@@ -15,7 +16,8 @@ def main():
     if 'page' not in st.session_state:
         st.session_state.page = 'login'
     
-    # If user not logged in, show login page
+    # If user not logged in (or the session expired), show login page
+    st.session_state.user = sessions.validate(st.session_state.get('auth_token'))
     if not st.session_state.user:
         st.switch_page("pages/01_Login.py")
     else:
@@ -0,0 +1,65 @@
+"""Short-lived verified login sessions
+
+A session token is issued after a successful authenticate() call. Page
+guards revalidate the token in memory on every rerun instead of querying
+the users table again.
+"""
+import secrets
+import threading
+import time
+
+# Seconds a session stays valid without activity
+SESSION_TTL = 900
+
+
+class SessionStore:
+    """Thread-safe in-process map of session token -> verified user profile"""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}   # token -> (expires_at, user)
+
+    def issue(self, user):
+        """Create a token for a verified user profile"""
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._purge(time.monotonic())
+            self._sessions[token] = (time.monotonic() + self.ttl, dict(user))
+        return token
+
+    def validate(self, token):
+        """User profile for a live token (sliding expiry), or None"""
+        if not token:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= now:
+                del self._sessions[token]
+                return None
+            self._sessions[token] = (now + self.ttl, user)
+            return dict(user)
+
+    def revoke(self, token):
+        """End a session"""
+        with self._lock:
+            self._sessions.pop(token, None)
+
+    def revoke_user(self, user_id):
+        """End every session of a user (e.g. after a password change)"""
+        with self._lock:
+            stale = [t for t, (_, user) in self._sessions.items() if user.get('user_id') == user_id]
+            for token in stale:
+                del self._sessions[token]
+
+    def _purge(self, now):
+        expired = [t for t, (expires_at, _) in self._sessions.items() if expires_at <= now]
+        for token in expired:
+            del self._sessions[token]
+
+
+sessions = SessionStore()
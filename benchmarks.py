@@ -0,0 +1,729 @@
+"""Performance benchmarks for the WeCare HMS data layer
+
+Run with:  python benchmarks.py sqlite --threads 8 --seconds 5
+           python benchmarks.py backends --backend sqlite mysql
+           python benchmarks.py explain --backend sqlite mysql
+           python benchmarks.py pages --backend sqlite mysql --rows 300000
+           python benchmarks.py search --rows 1000000
+           python benchmarks.py matcher --vocab 10 1000 50000
+           python benchmarks.py knowledge-base --conditions 50000
+           python benchmarks.py frame --rows 1000000
+           python benchmarks.py export --rows 10000 200000
+           python benchmarks.py ingest --rows 20000 200000
+           python benchmarks.py charts --rows 10000 200000
+           python benchmarks.py dashboard --rows 10000 200000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+import analytics
+import database
+import exports
+import ingestion
+import migrations
+import diagnosis
+from diagnosis import SymptomMatcher
+from sqlite_connection import SQLiteConnectionManager
+from storage import DEFAULT_PAGE_SIZE, MySQLBackend, SQLiteBackend
+
+BENCH_SCHEMA = '''CREATE TABLE IF NOT EXISTS patient_history (
+    patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT,
+    age INTEGER,
+    disease_name TEXT,
+    symptoms TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+BENCH_READ = 'SELECT * FROM patient_history WHERE user_id = ? ORDER BY patient_id DESC LIMIT 20'
+BENCH_WRITE = 'INSERT INTO patient_history (user_id, name, age, disease_name, symptoms) VALUES (?, ?, ?, ?, ?)'
+
+
+def _seed(path, rows=5000):
+    conn = sqlite3.connect(path)
+    conn.execute(BENCH_SCHEMA)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_bench_user ON patient_history(user_id)')
+    conn.executemany(BENCH_WRITE, [
+        (i % 100, f"Patient {i}", 20 + i % 60, "Flu", "fever, cough") for i in range(rows)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def _connect_per_call(path):
+    """Today's behaviour: a fresh default-journal connection for every call"""
+    def read(user_id):
+        conn = sqlite3.connect(path)
+        conn.execute(BENCH_READ, (user_id,)).fetchall()
+        conn.close()
+
+    def write(user_id):
+        conn = sqlite3.connect(path)
+        conn.execute(BENCH_WRITE, (user_id, "Bench", 40, "Cold", "sore throat"))
+        conn.commit()
+        conn.close()
+
+    return read, write, lambda: None
+
+
+def _persistent(path):
+    """Per-thread WAL connection from SQLiteConnectionManager"""
+    manager = SQLiteConnectionManager(path)
+
+    def read(user_id):
+        with manager.connection() as conn:
+            conn.execute(BENCH_READ, (user_id,)).fetchall()
+
+    def write(user_id):
+        with manager.connection() as conn:
+            conn.execute(BENCH_WRITE, (user_id, "Bench", 40, "Cold", "sore throat"))
+            conn.commit()
+
+    return read, write, manager.close_all
+
+
+def _run(read, write, threads, seconds, write_ratio):
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        reads = writes = errors = 0
+        while time.perf_counter() < stop:
+            user_id = rng.randrange(100)
+            try:
+                if rng.random() < write_ratio:
+                    write(user_id)
+                    writes += 1
+                else:
+                    read(user_id)
+                    reads += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        with lock:
+            counts['reads'] += reads
+            counts['writes'] += writes
+            counts['errors'] += errors
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return {
+        'reads_per_sec': counts['reads'] / seconds,
+        'writes_per_sec': counts['writes'] / seconds,
+        'locked_errors': counts['errors'],
+    }
+
+
+def bench_sqlite(threads=8, seconds=5.0, write_ratio=0.2):
+    """Compare connect-per-call with persistent per-thread WAL connections"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, strategy in (('connect-per-call', _connect_per_call),
+                                ('persistent-wal', _persistent)):
+            path = os.path.join(tmp, f"{label}.db")
+            _seed(path)
+            read, write, cleanup = strategy(path)
+            try:
+                results[label] = _run(read, write, threads, seconds, write_ratio)
+            finally:
+                cleanup()
+    return results
+
+
+def _time_ops(fn, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return count / (time.perf_counter() - start)
+
+
+def bench_backends(backends, count=1000, db_config=None):
+    """Ops/sec of the repository API on each storage engine
+
+    MySQL runs against db_config (defaults to database.DB_CONFIG) and leaves
+    its rows behind, so point it at a scratch database.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in backends:
+            if name == 'sqlite':
+                backend = SQLiteBackend(os.path.join(tmp, 'bench.db'))
+            else:
+                backend = MySQLBackend(db_config or database.DB_CONFIG, database.POOL_CONFIG)
+            try:
+                backend.init_schema(database.hash_password)
+                tag = f"{time.time_ns()}"
+                user_id = backend.create_user(f"bench-{tag}@wecare.com", "x", "Bench User")
+                patient = {'name': 'Bench', 'age': 40, 'gender': 'Male', 'disease_name': 'Flu',
+                           'symptoms': 'fever, cough', 'severity_level': 'Mild'}
+                results[name] = {
+                    'create_user': _time_ops(
+                        lambda i: backend.create_user(f"bench-{tag}-{i}@wecare.com", "x", "Bench"), count),
+                    'get_user_by_email': _time_ops(
+                        lambda i: backend.get_user_by_email(f"bench-{tag}-{i}@wecare.com"), count),
+                    'add_patient_history': _time_ops(
+                        lambda i: backend.add_patient_history(user_id, patient), count),
+                    'get_patient_history': _time_ops(
+                        lambda i: backend.get_patient_history(user_id), max(count // 10, 1)),
+                }
+            finally:
+                backend.close()
+    return results
+
+
+def explain_hot_queries(backends, rows=2000, db_config=None):
+    """Check that every migrations.HOT_QUERIES entry seeks into its index
+
+    Seeds rows first so the planner has something to weigh; on MySQL point
+    db_config at a scratch database. Returns {backend: [(label, index, seeks, plan)]}.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in backends:
+            if name == 'sqlite':
+                backend = SQLiteBackend(os.path.join(tmp, 'explain.db'))
+            else:
+                backend = MySQLBackend(db_config or database.DB_CONFIG, database.POOL_CONFIG)
+            try:
+                backend.init_schema(database.hash_password)
+                user_id = backend.create_user(f"explain-{time.time_ns()}@wecare.com", "x", "Explain User")
+                backend.add_patient_history_bulk(
+                    ({'name': f"Patient {i}", 'age': 20 + i % 60, 'diagnosis_date': f"2024-{i % 12 + 1:02d}-01"}
+                     for i in range(rows)), user_id)
+                backend.add_appointments_bulk(
+                    (user_id, f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", f"{9 + i % 8:02d}:00") for i in range(rows))
+                if name == 'mysql':
+                    backend.execute('ANALYZE TABLE users, patient_history, appointments')
+                else:
+                    backend.execute('ANALYZE')
+                results[name] = migrations.check_hot_queries(backend)
+            finally:
+                backend.close()
+    return results
+
+
+def bench_pages(backends, rows=300000, depths=(100, 150000, 299000), repeat=20, db_config=None):
+    """Latency of an appointments page at increasing keyset depths; should stay flat
+
+    MySQL runs against db_config (defaults to database.DB_CONFIG) and leaves
+    its rows behind, so point it at a scratch database.
+    """
+    rng = random.Random(4)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in backends:
+            if name == 'sqlite':
+                backend = SQLiteBackend(os.path.join(tmp, 'pages.db'))
+            else:
+                backend = MySQLBackend(db_config or database.DB_CONFIG, database.POOL_CONFIG)
+            try:
+                backend.init_schema(database.hash_password)
+                user_id = backend.create_user(f"pages-{time.time_ns()}@wecare.com", "x", "Pages User")
+                backend.add_appointments_bulk(
+                    ((user_id, f"20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", '10:00')
+                     for _ in range(rows)), chunk_size=10000)
+                keys = [(row['appointment_date'], row['appointment_id']) for row in backend.query(
+                    'SELECT appointment_date, appointment_id FROM appointments '
+                    'ORDER BY appointment_date DESC, appointment_id DESC')]
+                for depth in depths:
+                    after = keys[min(depth, len(keys) - 1)]
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        backend.get_appointments_page(after, DEFAULT_PAGE_SIZE)
+                    results[f"{name} depth {depth:,}"] = {'ms': (time.perf_counter() - start) * 1000 / repeat}
+            finally:
+                backend.close()
+    return results
+
+
+SEARCH_WORDS = ('fever', 'cough', 'headache', 'nausea', 'fatigue', 'rash', 'chills',
+                'dizziness', 'wheezing', 'insomnia', 'palpitations', 'swelling')
+SEARCH_MEDICINES = ('paracetamol', 'ibuprofen', 'amoxicillin', 'cetirizine', 'salbutamol', 'metformin')
+
+
+def bench_search(rows=1000000, queries=('cough', 'rash wheezing', 'asthma', 'amoxi'), repeat=20, deep_page=10):
+    """Milliseconds per full-text search page on a seeded SQLite database: the first and the deep_page-th"""
+    rng = random.Random(7)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteBackend(os.path.join(tmp, 'search.db'))
+        try:
+            backend.init_schema(database.hash_password)
+            user_id = backend.create_user("search@wecare.com", "x", "Search User")
+            backend.add_patient_history_bulk(({
+                'name': f"Patient {i}",
+                'symptoms': ', '.join(rng.sample(SEARCH_WORDS, 3)),
+                'medical_history': 'asthma' if i % 1000 == 0 else 'none',
+                'treatment_given': 'rest and fluids',
+                'medicine_prescribed': rng.choice(SEARCH_MEDICINES),
+            } for i in range(rows)), user_id, chunk_size=10000)
+            for text in queries:
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    hits, after = backend.search_patient_history(text)
+                first = (time.perf_counter() - start) * 1000 / repeat
+                for _ in range(deep_page - 2):
+                    if after is not None:
+                        _, after = backend.search_patient_history(text, after=after)
+                deep = None
+                if after is not None:
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        backend.search_patient_history(text, after=after)
+                    deep = (time.perf_counter() - start) * 1000 / repeat
+                results[text] = {'ms': first, f"page {deep_page} ms": deep, 'hits': len(hits)}
+        finally:
+            backend.close()
+    return results
+
+
+MATCHER_TEXT = ("I have had a fever and a bad cough for 2 days, with a sore throat, "
+                "some body pain and shortness of breath at night")
+
+
+def _synthetic_diseases_db(size, rng):
+    """The shipped knowledge base's symptom table padded with made-up symptoms up to size entries"""
+    kb = diagnosis.load_knowledge_base()
+    db = {}
+    for s, symptom in enumerate(kb.matcher.symptoms):
+        db[symptom] = [kb.matcher.diseases[d] for d in kb.matcher.diseases_for(s)]
+    while len(db) < size:
+        words = rng.randint(1, 3)
+        symptom = ' '.join(f"sym{rng.randrange(size * 4)}" for _ in range(words))
+        db[symptom] = [f"Condition {rng.randrange(max(size // 5, 1))}" for _ in range(rng.randint(1, 5))]
+    return db
+
+
+def bench_matcher(vocab_sizes=(10, 1000, 50000), repeat=2000):
+    """Microseconds per diagnosis: substring scan vs compiled SymptomMatcher"""
+    rng = random.Random(3)
+    results = {}
+    for size in vocab_sizes:
+        db = _synthetic_diseases_db(size, rng)
+        start = time.perf_counter()
+        matcher = SymptomMatcher(db)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def substring_scan(text):
+            lower = text.lower()
+            matched = set()
+            for symptom, diseases in db.items():
+                if symptom in lower:
+                    matched.update(diseases)
+            return list(matched)[:5]
+
+        runs = max(repeat * 10 // size, 20)
+        start = time.perf_counter()
+        for _ in range(runs):
+            substring_scan(MATCHER_TEXT)
+        scan_us = (time.perf_counter() - start) * 1e6 / runs
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            matcher.match(MATCHER_TEXT)
+        matcher_us = (time.perf_counter() - start) * 1e6 / repeat
+        results[f"{size:,} symptoms"] = {'scan_us': scan_us, 'matcher_us': matcher_us, 'build_ms': build_ms}
+    return results
+
+
+KB_RECOMMENDATIONS = ('Rest', 'Hydration', 'Fluids', 'Pain reliever', 'Consult doctor if severe',
+                      'Avoid triggers', 'Monitor symptoms', 'See doctor if persistent')
+
+
+def bench_knowledge_base(sizes=(1000, 50000), symptoms_per_condition=6):
+    """Load time, memory and lookup cost of knowledge_base.json at each size"""
+    rng = random.Random(5)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            vocab = [' '.join(f"sym{rng.randrange(size * 2)}" for _ in range(rng.randint(1, 3)))
+                     for _ in range(size * 2)]
+            path = os.path.join(tmp, f"kb_{size}.json")
+            with open(path, 'w') as f:
+                json.dump({'version': 1, 'conditions': [
+                    {'name': f"Condition {i}",
+                     'symptoms': rng.sample(vocab, symptoms_per_condition),
+                     'recommendations': rng.sample(KB_RECOMMENDATIONS, 4)}
+                    for i in range(size)
+                ]}, f)
+
+            start = time.perf_counter()
+            kb = diagnosis.load_knowledge_base(path)
+            load_ms = (time.perf_counter() - start) * 1000
+            del kb
+
+            # Separate pass: tracing slows allocation down several times
+            tracemalloc.start()
+            kb = diagnosis.load_knowledge_base(path)
+            resident, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # Unchanged file: the common path on every page run
+            diagnosis._knowledge_base, diagnosis._checked_at = kb, 0.0
+            start = time.perf_counter()
+            for _ in range(1000):
+                diagnosis._checked_at = 0.0
+                diagnosis.get_knowledge_base(path)
+            check_us = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            for _ in range(1000):
+                kb.matcher.match(' and '.join(rng.sample(vocab, 3)))
+            match_us = (time.perf_counter() - start) * 1000
+            results[f"{size:,} conditions"] = {
+                'file_mb': os.path.getsize(path) / 2 ** 20,
+                'load_ms': load_ms,
+                'resident_mb': resident / 2 ** 20,
+                'peak_mb': peak / 2 ** 20,
+                'stat_check_us': check_us,
+                'match_us': match_us,
+            }
+    diagnosis._knowledge_base = None
+    return results
+
+
+FRAME_COLUMNS = ('patient_id', 'name', 'age', 'gender', 'disease_name', 'severity_level',
+                 'BMI', 'treatment_cost', 'diagnosis_date', 'created_at')
+
+# Dtypes the DataFrame loader used before columnar loading
+LEGACY_DTYPES = {'patient_id': 'Int64', 'age': 'Int64', 'BMI': 'float64',
+                 'treatment_cost': 'float64', 'created_at': 'datetime64[ns]'}
+
+
+def _frame_from_dicts(backend, columns):
+    """The previous loader: fetch every row as a dict, then build each column from them"""
+    rows = backend.select_patient_history(columns)
+    data = {}
+    for col in columns:
+        values = [row[col] for row in rows]
+        dtype = LEGACY_DTYPES.get(col, 'object')
+        if dtype.startswith('datetime'):
+            data[col] = pd.to_datetime(pd.Series(values, dtype='object'), errors='coerce')
+        else:
+            data[col] = pd.Series(values, dtype=dtype)
+    return pd.DataFrame(data, columns=list(columns))
+
+
+def bench_frame(rows=1000000, columns=FRAME_COLUMNS):
+    """Seconds, peak traced memory and frame size: dict rows vs chunked columnar loading"""
+    rng = random.Random(11)
+    diseases = [f"Condition {i}" for i in range(200)]
+    loaders = {
+        'dict rows': lambda backend: _frame_from_dicts(backend, list(columns)),
+        'columnar': lambda backend: database.load_patient_history_frame(list(columns)),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, 'frame.db')
+        backend = database.set_backend('sqlite')
+        try:
+            backend.init_schema(database.hash_password)
+            user_id = backend.create_user("frame@wecare.com", "x", "Frame User")
+            backend.add_patient_history_bulk(({
+                'name': f"Patient {i}",
+                'age': rng.randint(1, 95),
+                'gender': rng.choice(('Male', 'Female', 'Other')),
+                'disease_name': rng.choice(diseases),
+                'symptoms': 'fever',
+                'severity_level': rng.choice(('Mild', 'Moderate', 'Severe')),
+                'diagnosis_date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                'BMI': round(rng.uniform(16, 40), 1),
+                'treatment_cost': round(rng.uniform(50, 5000), 2),
+            } for i in range(rows)), user_id, chunk_size=10000)
+            for label, load in loaders.items():
+                # Timing and allocation tracing in separate passes: tracing slows allocation-heavy code
+                start = time.perf_counter()
+                frame = load(backend)
+                seconds = time.perf_counter() - start
+                frame_mb = frame.memory_usage(deep=True).sum() / 2 ** 20
+                del frame
+                tracemalloc.start()
+                load(backend)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+                results[label] = {'seconds': seconds, 'peak_mb': peak_mb, 'frame_mb': frame_mb}
+        finally:
+            backend.close()
+    return results
+
+
+def bench_export(sizes=(10000, 200000), formats=('csv', 'csv.gz', 'xlsx')):
+    """Seconds and peak traced memory per export format as the table grows
+
+    Peak memory should stay flat across sizes: rows are streamed a chunk at a time.
+    """
+    rng = random.Random(5)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, 'export.db')
+        backend = database.set_backend('sqlite')
+        try:
+            backend.init_schema(database.hash_password)
+            user_id = backend.create_user("export@wecare.com", "x", "Export User")
+            seeded = 0
+            for size in sorted(sizes):
+                backend.add_patient_history_bulk(({
+                    'name': f"Patient {i}",
+                    'age': rng.randint(1, 95),
+                    'disease_name': rng.choice(('Flu', 'Asthma', 'Migraine')),
+                    'symptoms': ', '.join(rng.sample(SEARCH_WORDS, 3)),
+                    'diagnosis_date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    'treatment_cost': round(rng.uniform(50, 5000), 2),
+                } for i in range(seeded, size)), user_id, chunk_size=10000)
+                seeded = size
+                for fmt in formats:
+                    path = os.path.join(tmp, f"export.{fmt}")
+                    start = time.perf_counter()
+                    exports.export_patient_history(path, FRAME_COLUMNS, fmt)
+                    seconds = time.perf_counter() - start
+                    tracemalloc.start()
+                    exports.export_patient_history(path, FRAME_COLUMNS, fmt)
+                    peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                    tracemalloc.stop()
+                    results[f"{fmt} {size:,}"] = {'seconds': seconds, 'peak_mb': peak_mb,
+                                                  'file_mb': os.path.getsize(path) / 2 ** 20}
+        finally:
+            backend.close()
+    return results
+
+
+def _write_upload(path, rows, rng):
+    """CSV upload in the shape clinics send, with about 5% invalid rows"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Patient Name', 'Age', 'Sex', 'Disease', 'Severity', 'Height', 'Weight',
+                         'Date', 'Cost', 'Notes'])
+        for i in range(rows):
+            height, weight = rng.randint(150, 195), rng.randint(45, 110)
+            writer.writerow([f"Patient {i}", rng.randint(1, 95) if i % 20 else 'unknown',
+                             rng.choice(('Male', 'Female')), rng.choice(('Flu', 'Asthma', 'Migraine')),
+                             rng.choice(('Mild', 'moderate', 'SEVERE')), height, weight,
+                             f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                             round(rng.uniform(50, 5000), 2), 'imported'])
+
+
+def bench_ingest(sizes=(20000, 200000)):
+    """Rows/sec and peak traced memory of the upload pipeline as files grow"""
+    rng = random.Random(3)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, 'ingest.db')
+        backend = database.set_backend('sqlite')
+        try:
+            backend.init_schema(database.hash_password)
+            user_id = backend.create_user("ingest@wecare.com", "x", "Ingest User")
+            for size in sizes:
+                path = os.path.join(tmp, f"upload-{size}.csv")
+                _write_upload(path, size, rng)
+                with open(path, 'rb') as f:
+                    mapping = ingestion.suggest_mapping(ingestion.preview(f, path).columns)
+                with open(path, 'rb') as f:
+                    report = ingestion.ingest_patient_history(f, path, mapping, user_id)
+                tracemalloc.start()
+                with open(path, 'rb') as f:
+                    traced = ingestion.ingest_patient_history(f, path, mapping, user_id)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                tracemalloc.stop()
+                for result in (report, traced):
+                    if result['reject_path']:
+                        os.remove(result['reject_path'])
+                results[f"{size:,} rows"] = {'rows_per_sec': report['rows_per_sec'], 'peak_mb': peak_mb,
+                                             'file_mb': os.path.getsize(path) / 2 ** 20,
+                                             'rejected': report['rejected']}
+        finally:
+            backend.close()
+    return results
+
+
+def bench_charts(sizes=(10000, 200000)):
+    """Scatter payload size and build time: every point vs the stratified sample
+
+    Payload is the JSON of the points a chart would embed; the sampled
+    payload should stay flat as the table grows.
+    """
+    rng = random.Random(5)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, 'charts.db')
+        backend = database.set_backend('sqlite')
+        try:
+            backend.init_schema(database.hash_password)
+            user_id = backend.create_user("charts@wecare.com", "x", "Charts User")
+            inserted = 0
+            for size in sizes:
+                backend.add_patient_history_bulk(({
+                    'name': f"Patient {i}",
+                    'age': rng.randint(1, 95),
+                    'disease_name': 'Influenza',
+                    'severity_level': rng.choices(('Mild', 'Moderate', 'Severe'), (70, 28, 2))[0],
+                    'BMI': round(rng.gauss(26, 5), 1),
+                    'treatment_cost': round(rng.lognormvariate(6, 1), 2),
+                } for i in range(inserted, size)), user_id, chunk_size=10000)
+                inserted = size
+                database.query_cache.invalidate('patient_history')
+                start = time.perf_counter()
+                frame = database.query_patient_history(['BMI', 'treatment_cost', 'severity_level'])
+                full_bytes = len(frame.to_json(orient='records'))
+                load_ms = (time.perf_counter() - start) * 1000
+                start = time.perf_counter()
+                points, total = analytics.scatter_sample('BMI', 'treatment_cost', group='severity_level')
+                sample_ms = (time.perf_counter() - start) * 1000
+                results[f"{size:,} rows"] = {
+                    'points': len(points),
+                    'full_kb': full_bytes / 1024,
+                    'sampled_kb': len(points.to_json(orient='records')) / 1024,
+                    'load_ms': load_ms,
+                    'sample_ms': sample_ms,
+                    'histogram_bins': len(analytics.binned_histogram('treatment_cost')),
+                }
+        finally:
+            backend.close()
+    return results
+
+
+def bench_dashboard(sizes=(10000, 200000), repeat=20):
+    """Admin dashboard tiles: full-table fetches vs the dashboard_summary() batch, uncached"""
+    rng = random.Random(9)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, 'dashboard.db')
+        backend = database.set_backend('sqlite')
+        try:
+            backend.init_schema(database.hash_password)
+            user_id = backend.create_user("dashboard@wecare.com", "x", "Dashboard User")
+            inserted = 0
+            for size in sizes:
+                backend.add_users_bulk(((f"user{i}@wecare.com", "x", f"User {i}", 'user', '')
+                                        for i in range(inserted, size)))
+                backend.add_appointments_bulk(((user_id, f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                                                '10:00', rng.choice(('pending', 'completed')))
+                                               for _ in range(inserted, size)))
+                inserted = size
+
+                def full_tables():
+                    users, appointments = backend.get_all_users(), backend.get_all_appointments()
+                    return len(users), len(appointments), users[-5:], appointments[-5:]
+
+                for label, load in (('full tables', full_tables),
+                                    ('summary', lambda: backend.dashboard_summary(5))):
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        load()
+                    results[f"{label} {size:,}"] = {'ms': (time.perf_counter() - start) * 1000 / repeat}
+        finally:
+            backend.close()
+    return results
+
+
+def _print_table(results):
+    for label, row in results.items():
+        print(f"{label:<20} " + "  ".join(f"{k}={v:,.1f}" if isinstance(v, float) else f"{k}={v}"
+                                          for k, v in row.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    p = sub.add_parser('sqlite', help='SQLite connect-per-call vs persistent WAL connections')
+    p.add_argument('--threads', type=int, default=8)
+    p.add_argument('--seconds', type=float, default=5.0)
+    p.add_argument('--write-ratio', type=float, default=0.2)
+
+    p = sub.add_parser('backends', help='Repository API ops/sec per storage engine')
+    p.add_argument('--backend', nargs='+', choices=['sqlite', 'mysql'], default=['sqlite'])
+    p.add_argument('--count', type=int, default=1000)
+
+    p = sub.add_parser('explain', help='Check that hot listing queries seek into their indexes')
+    p.add_argument('--backend', nargs='+', choices=['sqlite', 'mysql'], default=['sqlite'])
+    p.add_argument('--rows', type=int, default=2000)
+
+    p = sub.add_parser('pages', help='Keyset page latency as the cursor goes deeper')
+    p.add_argument('--backend', nargs='+', choices=['sqlite', 'mysql'], default=['sqlite'])
+    p.add_argument('--rows', type=int, default=300000)
+
+    p = sub.add_parser('search', help='Full-text search latency over patient notes (SQLite)')
+    p.add_argument('--rows', type=int, default=1000000)
+
+    p = sub.add_parser('matcher', help='Free Diagnosis latency as the symptom vocabulary grows')
+    p.add_argument('--vocab', type=int, nargs='+', default=[10, 1000, 50000])
+
+    p = sub.add_parser('knowledge-base', help='Knowledge base load time and memory')
+    p.add_argument('--conditions', type=int, nargs='+', default=[1000, 50000])
+
+    p = sub.add_parser('frame', help='Patient history DataFrame load time and memory (SQLite)')
+    p.add_argument('--rows', type=int, default=1000000)
+
+    p = sub.add_parser('export', help='Streaming export time and peak memory (SQLite)')
+    p.add_argument('--rows', type=int, nargs='+', default=[10000, 200000])
+
+    p = sub.add_parser('ingest', help='Upload ingestion throughput and peak memory (SQLite)')
+    p.add_argument('--rows', type=int, nargs='+', default=[20000, 200000])
+
+    p = sub.add_parser('charts', help='EDA scatter payload size, every point vs sampled (SQLite)')
+    p.add_argument('--rows', type=int, nargs='+', default=[10000, 200000])
+
+    p = sub.add_parser('dashboard', help='Admin dashboard tiles: full tables vs one summary batch (SQLite)')
+    p.add_argument('--rows', type=int, nargs='+', default=[10000, 200000])
+
+    args = parser.parse_args()
+    if args.bench == 'sqlite':
+        print(f"SQLite, {args.threads} threads, {args.seconds}s, {args.write_ratio:.0%} writes")
+        _print_table(bench_sqlite(args.threads, args.seconds, args.write_ratio))
+    elif args.bench == 'backends':
+        print(f"Repository ops/sec, {args.count} ops each")
+        _print_table(bench_backends(args.backend, args.count))
+    elif args.bench == 'pages':
+        print(f"Appointments page of {DEFAULT_PAGE_SIZE} rows, {args.rows:,} appointments")
+        _print_table(bench_pages(args.backend, args.rows, depths=(100, args.rows // 2, args.rows - 1000)))
+    elif args.bench == 'search':
+        print(f"Full-text search, {args.rows:,} visits, first page")
+        _print_table(bench_search(args.rows))
+    elif args.bench == 'matcher':
+        print("Symptom matching, one description per call")
+        _print_table(bench_matcher(args.vocab))
+    elif args.bench == 'knowledge-base':
+        print("Knowledge base: load, resident memory, per-call cost")
+        _print_table(bench_knowledge_base(args.conditions))
+    elif args.bench == 'frame':
+        print(f"Patient history DataFrame, {args.rows:,} visits, {len(FRAME_COLUMNS)} columns")
+        _print_table(bench_frame(args.rows))
+    elif args.bench == 'export':
+        print("Patient record export, one file per format and size")
+        _print_table(bench_export(args.rows))
+    elif args.bench == 'ingest':
+        print("Upload ingestion: chunked read, validation and batched insert")
+        _print_table(bench_ingest(args.rows))
+    elif args.bench == 'charts':
+        print(f"BMI vs treatment cost scatter, at most {analytics.CHART_CONFIG['max_points']:,} points")
+        _print_table(bench_charts(args.rows))
+    elif args.bench == 'dashboard':
+        print("Admin dashboard tiles, users and appointments of each size")
+        _print_table(bench_dashboard(args.rows))
+    elif args.bench == 'explain':
+        missed = 0
+        for name, checks in explain_hot_queries(args.backend, args.rows).items():
+            for label, index, seeks, plan in checks:
+                missed += not seeks
+                print(f"{name:<8} {'OK  ' if seeks else 'MISS'} {label:<28} {index}")
+                if not seeks:
+                    print(f"         plan: {plan}")
+        raise SystemExit(1 if missed else 0)
+
+
+if __name__ == '__main__':
+    main()
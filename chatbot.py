@@ -0,0 +1,308 @@
+"""Data chatbot: questions about patient_history compiled into SQL aggregates
+
+parse() turns a question into an intent dict, for example "average cost for
+diabetes patients over 60 by gender" becomes
+    {'metric': 'avg', 'measure': 'treatment_cost', 'group': 'gender',
+     'filters': [('age', '>', 60), ('disease_name', '=', 'diabetes')], 'limit': 50}
+compile_intent() turns an intent into one parameterized SELECT, and answer()
+runs it through the shared query cache. The cache key is the compiled SQL
+and parameters, so different phrasings of the same question share one
+cached result and the patient table is never loaded into the app.
+"""
+import re
+
+from database import get_backend, cached_query
+
+# Values that can be averaged, summed or compared: column -> (label, words that name it)
+MEASURES = {
+    'treatment_cost': ('treatment cost', r'treatment costs?|costs?|spend(?:ing)?|expenses?|price'),
+    'total_amount': ('total amount', r'total amounts?|bills?|billing|amounts?'),
+    'age': ('age', r'ages?|aged?'),
+    'BMI': ('BMI', r'bmi'),
+    'height_cm': ('height', r'heights?'),
+    'weight_kg': ('weight', r'weights?'),
+}
+
+# Columns to group by: column -> (label, words that name it)
+GROUPS = {
+    'gender': ('gender', r'genders?|sex'),
+    'disease_name': ('disease', r'diseases?|diagnos[ie]s|conditions?'),
+    'severity_level': ('severity', r'severity|severities|severity levels?'),
+    'smoking_status': ('smoking status', r'smoking(?: status)?|smokers'),
+    'exercise_level': ('exercise level', r'exercise(?: levels?)?'),
+    'status': ('status', r'status(?:es)?'),
+    'insurance_used': ('insurance', r'insurance'),
+    'age_group': ('age group', r'age (?:groups?|bands?|brackets?)|decades?'),
+}
+
+# Metric phrases, checked in order; the first match wins
+METRICS = (
+    ('count', r'how many|number of|count|total (?:patients|records|visits)'),
+    ('top', r'most common|top(?: \d+)?|commonest|most frequent|popular'),
+    ('top', r'distribution|breakdown|split'),
+    ('avg', r'average|avg|mean|typical'),
+    ('sum', r'total|sum'),
+    ('max', r'max(?:imum)?|highest|largest|biggest|most expensive|oldest'),
+    ('min', r'min(?:imum)?|lowest|smallest|cheapest|youngest'),
+)
+METRIC_LABELS = {'count': 'Number of patients', 'top': 'Patients', 'avg': 'Average',
+                 'sum': 'Total', 'max': 'Highest', 'min': 'Lowest'}
+SQL_FUNCTIONS = {'avg': 'AVG', 'sum': 'SUM', 'max': 'MAX', 'min': 'MIN'}
+
+# Words that imply a measure when none is named ("oldest" -> age)
+IMPLIED_MEASURES = (
+    (r'oldest|youngest', 'age'),
+    (r'most expensive|cheapest', 'treatment_cost'),
+)
+
+COMPARISONS = {
+    'over': '>', 'above': '>', 'older than': '>', 'greater than': '>', 'more than': '>', '>': '>',
+    'at least': '>=', 'under': '<', 'below': '<', 'younger than': '<', 'less than': '<', '<': '<',
+    'at most': '<=',
+}
+
+# Fixed-vocabulary filters: pattern -> (column, value compared case-insensitively)
+VALUE_FILTERS = (
+    (r'non[- ]?smok(?:ers?|ing)', ('smoking_status', 'never')),
+    (r'smokers?|smoking patients', ('smoking_status', 'current')),
+    (r'females?|women|woman|girls', ('gender', 'female')),
+    (r'males?|men|man|boys', ('gender', 'male')),
+    (r'mild', ('severity_level', 'mild')),
+    (r'moderate', ('severity_level', 'moderate')),
+    (r'severe', ('severity_level', 'severe')),
+)
+
+DEFAULT_TOP = 5
+GROUP_LIMIT = 50
+AGE_GROUP_WIDTH = 10
+
+SAMPLE_QUESTIONS = (
+    "How many patients are there?",
+    "Average cost for diabetes patients over 60 by gender",
+    "Top 10 diseases among smokers",
+    "Average BMI by age group",
+    "Total treatment cost in 2024 by severity",
+    "Oldest female patient with asthma",
+)
+
+
+def _words(pattern):
+    return re.compile(rf'\b(?:{pattern})\b')
+
+
+_MEASURE_WORDS = '|'.join(words for _, words in MEASURES.values())
+_MEASURE_COLUMNS = [(column, _words(words)) for column, (_, words) in MEASURES.items()]
+_COMPARE = re.compile(
+    rf"\b(?:({_MEASURE_WORDS})\s+(?:is\s+|of\s+)?)?({'|'.join(map(re.escape, COMPARISONS))})\s+\$?(\d+(?:\.\d+)?)"
+)
+_BETWEEN = re.compile(
+    rf"\b(?:({_MEASURE_WORDS})\s+)?(?:between|from)\s+\$?(\d+(?:\.\d+)?)\s+(?:and|to|-)\s+\$?(\d+(?:\.\d+)?)"
+)
+_AGED_RANGE = re.compile(r'\baged?\s+(\d+)\s*(?:-|to)\s*(\d+)')
+_YEAR = re.compile(r'\b(?:in|during|for)\s+((?:19|20)\d{2})\b')
+_GROUP = re.compile(rf"\b(?:by|per|for each|each|across|grouped by|split by)\s+"
+                    rf"({'|'.join(words for _, words in GROUPS.values())})\b")
+_TOP_N = re.compile(r'\btop (\d+)\b')
+
+
+def _measure_column(word):
+    for column, pattern in _MEASURE_COLUMNS:
+        if pattern.fullmatch(word):
+            return column
+    return None
+
+
+def _group_column(word):
+    for column, (_, words) in GROUPS.items():
+        if re.fullmatch(words, word):
+            return column
+    return None
+
+
+def _known_diseases():
+    """Distinct disease names on record, longest first so multi-word names win"""
+    rows = cached_query(('patient_history',),
+                        'SELECT DISTINCT disease_name FROM patient_history WHERE disease_name IS NOT NULL')
+    return sorted({row['disease_name'].strip() for row in rows if row['disease_name'].strip()},
+                  key=len, reverse=True)
+
+
+def parse(question, diseases=None):
+    """Intent dict for a question, or None if no metric, measure or grouping is recognised
+
+    diseases is the list of disease names to look for; by default the
+    distinct names in patient_history.
+    """
+    text = ' '.join(question.lower().split())
+    filters = []
+
+    def take(match):
+        """Blank out a consumed phrase so later rules do not read it again"""
+        nonlocal text
+        text = text[:match.start()] + ' ' * (match.end() - match.start()) + text[match.end():]
+
+    for match in list(_AGED_RANGE.finditer(text)):
+        filters += [('age', '>=', float(match.group(1))), ('age', '<=', float(match.group(2)))]
+        take(match)
+    for match in list(_BETWEEN.finditer(text)):
+        column = _measure_column(match.group(1)) if match.group(1) else 'age'
+        filters += [(column, '>=', float(match.group(2))), (column, '<=', float(match.group(3)))]
+        take(match)
+    for match in list(_COMPARE.finditer(text)):
+        column = _measure_column(match.group(1)) if match.group(1) else None
+        if column is None:
+            column = 'treatment_cost' if '$' in match.group(0) else 'age'
+        filters.append((column, COMPARISONS[match.group(2)], float(match.group(3))))
+        take(match)
+    for match in list(_YEAR.finditer(text)):
+        year = match.group(1)
+        filters += [('diagnosis_date', '>=', f"{year}-01-01"), ('diagnosis_date', '<=', f"{year}-12-31")]
+        take(match)
+
+    group = None
+    match = _GROUP.search(text)
+    if match:
+        group = _group_column(match.group(1))
+        take(match)
+
+    for name in (_known_diseases() if diseases is None else diseases):
+        match = re.search(rf'\b{re.escape(name.lower())}\b', text)
+        if match:
+            filters.append(('disease_name', '=', name.lower()))
+            take(match)
+            break
+    for pattern, (column, value) in VALUE_FILTERS:
+        match = _words(pattern).search(text)
+        if match and not any(f[0] == column for f in filters):
+            filters.append((column, '=', value))
+            take(match)
+
+    metric = next((m for m, pattern in METRICS if _words(pattern).search(text)), None)
+    measure = next((column for column, pattern in _MEASURE_COLUMNS if pattern.search(text)), None)
+    if measure is None:
+        measure = next((column for pattern, column in IMPLIED_MEASURES if _words(pattern).search(text)), None)
+
+    limit = GROUP_LIMIT
+    if metric == 'top':
+        top = _TOP_N.search(text)
+        limit = int(top.group(1)) if top else DEFAULT_TOP
+        if group is None:
+            # "most common diseases": the grouping is whatever is being ranked
+            group = next((column for column, (_, words) in GROUPS.items() if _words(words).search(text)),
+                         'disease_name')
+    if metric is None:
+        if measure:
+            metric = 'avg'
+        elif group or filters:
+            metric = 'count'
+        else:
+            return None
+    if metric in SQL_FUNCTIONS and measure is None:
+        return None
+    if metric in ('count', 'top'):
+        measure = None
+    return {'metric': metric, 'measure': measure, 'group': group, 'filters': filters, 'limit': limit}
+
+
+def compile_intent(intent, backend=None):
+    """(sql, params) for an intent; every value is a bound parameter"""
+    backend = backend or get_backend()
+    if intent['measure']:
+        value = f"{SQL_FUNCTIONS[intent['metric']]}({intent['measure']})"
+    else:
+        value = 'COUNT(*)'
+    clauses, params = [], []
+    for column, op, operand in intent['filters']:
+        if isinstance(operand, str) and column != 'diagnosis_date':
+            clauses.append(f"LOWER({column}) {op} %s")
+        else:
+            clauses.append(f"{column} {op} %s")
+        params.append(operand)
+    if intent['measure']:
+        clauses.append(f"{intent['measure']} IS NOT NULL")
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    group = intent['group']
+    if group is None:
+        return f"SELECT {value} AS value, COUNT(*) AS patients FROM patient_history{where}", tuple(params)
+    if group == 'age_group':
+        # Age groups read best in age order; everything else ranks by value
+        group_expr, order = f"{backend.floor_div('age', AGE_GROUP_WIDTH)} * {AGE_GROUP_WIDTH}", 'grp'
+    else:
+        group_expr, order = group, 'value DESC'
+    return (
+        f"SELECT {group_expr} AS grp, {value} AS value, COUNT(*) AS patients "
+        f"FROM patient_history{where} GROUP BY grp ORDER BY {order} LIMIT %s",
+        tuple(params) + (intent['limit'],)
+    )
+
+
+def _describe_filter(column, op, operand):
+    label = MEASURES.get(column, GROUPS.get(column, (column.replace('_', ' '),)))[0]
+    if column == 'diagnosis_date':
+        return f"diagnosed {'from' if op == '>=' else 'until'} {operand}"
+    if isinstance(operand, str):
+        return f"{label} {operand.title()}"
+    return f"{label} {op} {operand:g}"
+
+
+def describe(intent):
+    """Plain-English title for an intent, e.g. 'Average treatment cost by gender (age > 60)'"""
+    title = METRIC_LABELS[intent['metric']]
+    if intent['measure']:
+        title += f" {MEASURES[intent['measure']][0]}"
+    if intent['group']:
+        title += f" by {GROUPS[intent['group']][0]}"
+    if intent['filters']:
+        title += f" ({', '.join(_describe_filter(*f) for f in intent['filters'])})"
+    return title
+
+
+def format_value(value, measure):
+    """Display form of an aggregate of measure (None for patient counts)"""
+    if value is None:
+        return 'n/a'
+    if measure is None:
+        return f"{int(value):,}"
+    value = float(value)
+    if measure in ('treatment_cost', 'total_amount'):
+        return f"${value:,.2f}"
+    if measure == 'age':
+        return f"{value:.1f} years"
+    return f"{value:,.1f}"
+
+
+def _group_label(value, group):
+    if value is None:
+        return 'Unknown'
+    if group == 'age_group':
+        return f"{int(value)}-{int(value) + AGE_GROUP_WIDTH - 1}"
+    return value
+
+
+def answer(question):
+    """Answer a question about patient_history
+
+    Returns a dict with title, intent, sql, params, and either value (plus
+    patients, the number of records it is based on) for a single figure,
+    or rows [{group, value, patients}] for a grouped answer. Returns None
+    when the question is not understood.
+    """
+    intent = parse(question)
+    if intent is None:
+        return None
+    sql, params = compile_intent(intent)
+    rows = cached_query(('patient_history',), sql, params)
+    result = {'title': describe(intent), 'intent': intent, 'sql': sql, 'params': params}
+    if intent['group'] is None:
+        row = rows[0] if rows else {'value': None, 'patients': 0}
+        result.update(value=format_value(row['value'], intent['measure']), patients=int(row['patients']))
+    else:
+        label = GROUPS[intent['group']][0]
+        result['rows'] = [
+            {label: _group_label(row['grp'], intent['group']),
+             'value': float(row['value']) if row['value'] is not None else None,
+             'patients': int(row['patients'])}
+            for row in rows
+        ]
+    return result
@@ -1,4 +1,10 @@
 import streamlit as st
+import pandas as pd
+from auth import sessions
+from database import get_grid_page, get_grid_count
+from query_cache import freeze
+
+GRID_PAGE_SIZES = (25, 50, 100, 200)
 
 def set_page_config():
     """Configure Streamlit page settings"""
@@ -99,3 +105,114 @@ def show_sidebar_user_info(user):
             st.markdown(f"**📧 Email:** {user.get('email', 'N/A')}")
             st.markdown(f"**🔑 Role:** {user.get('role', 'user').upper()}")
             st.markdown("---")
+
+def start_session(user):
+    """Store a verified user and its session token in Streamlit state"""
+    st.session_state.user = user
+    st.session_state.auth_token = sessions.issue(user)
+
+def require_login(role=None):
+    """Page guard: revalidate the session token in memory, else go to login"""
+    user = sessions.validate(st.session_state.get('auth_token'))
+    if not user or (role and user.get('role') != role):
+        st.session_state.user = None
+        st.session_state.auth_token = None
+        st.switch_page("pages/01_Login.py")
+    st.session_state.user = user
+    return user
+
+def logout():
+    """Revoke the session and return to the login page"""
+    sessions.revoke(st.session_state.get('auth_token'))
+    st.session_state.user = None
+    st.session_state.auth_token = None
+    st.switch_page("pages/01_Login.py")
+
+def keyset_pager(key, fetch_page, page_size=50):
+    """Render Previous/Next controls and return rows for the current page
+
+    fetch_page(after, limit) must return (rows, next_cursor). Cursors are kept
+    in session state under `key`, so use a different key per filter set.
+    """
+    state_key = f"{key}_cursors"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+
+    rows, next_cursor = fetch_page(cursors[-1], page_size)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)} · {len(rows)} rows")
+    with col_next:
+        if st.button("Next ➡️", key=f"{key}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    return rows
+
+def data_grid(key, table, columns, filters=None, sort=None, descending=True, page_sizes=GRID_PAGE_SIZES):
+    """Render a sortable, searchable table that fetches one page at a time; returns the page's rows
+
+    columns maps column names of table (a storage.GRID_TABLES entry) to
+    display labels. Sorting, filters ({column: value}) and the search box
+    run in SQL, so each rerun runs one query for at most one page whatever
+    the table size. The bounded total is only counted when asked for, and
+    the count is then reused for database.GRID_COUNT_TTL seconds.
+    """
+    names, labels = list(columns), list(columns.values())
+    col_search, col_sort, col_order, col_size = st.columns([3, 2, 1, 1])
+    with col_search:
+        search = st.text_input("🔍 Search", key=f"{key}_search").strip()
+    with col_sort:
+        sort_label = st.selectbox("Sort by", labels, index=names.index(sort) if sort in names else 0,
+                                  key=f"{key}_sort")
+    with col_order:
+        order = st.selectbox("Order", ["Descending", "Ascending"], index=0 if descending else 1,
+                             key=f"{key}_order")
+    with col_size:
+        page_size = st.selectbox("Rows", page_sizes, index=min(1, len(page_sizes) - 1), key=f"{key}_size")
+    sort, descending = names[labels.index(sort_label)], order == "Descending"
+
+    # Any change of query starts again from the first page
+    query = (sort, descending, freeze(filters), search, page_size)
+    state_key = f"{key}_grid"
+    if st.session_state.get(state_key, {}).get('query') != query:
+        st.session_state[state_key] = {'query': query, 'cursors': [None], 'counted': False}
+    grid = st.session_state[state_key]
+    cursors = grid['cursors']
+
+    rows, next_cursor = get_grid_page(table, cursors[-1], page_size, names, sort, descending, filters, search)
+
+    if rows:
+        st.dataframe(pd.DataFrame(rows, columns=names).rename(columns=columns),
+                     use_container_width=True, hide_index=True)
+    else:
+        st.info("No matching rows")
+
+    first = (len(cursors) - 1) * page_size
+    caption = f"Page {len(cursors)} · rows {first + 1 if rows else first:,}-{first + len(rows):,}"
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        if grid['counted']:
+            total, accuracy = get_grid_count(table, filters, search)
+            total_text = {'exact': f"{total:,}", 'estimate': f"about {total:,}",
+                          'at least': f"{total:,}+"}[accuracy]
+            st.caption(f"{caption} of {total_text}")
+        else:
+            st.caption(caption)
+            if st.button("🔢 Count rows", key=f"{key}_count"):
+                grid['counted'] = True
+                st.rerun()
+    with col_next:
+        if st.button("Next ➡️", key=f"{key}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+    return rows
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable database connections
+
+    connect   - zero-argument callable returning a new DB-API connection
+    ping      - callable(conn) that raises if the connection is dead
+    reset     - callable(conn) run on return (e.g. rollback of open transactions)
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800,
+                 checkout_timeout=10, ping=None, reset=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size=%s max_size=%s" % (min_size, max_size))
+
+        self._connect = connect
+        self._ping = ping
+        self._reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()       # (conn, created_at), most recently used on the right
+        self._born = {}            # id(conn) -> created_at for checked-out connections
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'discarded': 0,
+        }
+
+        self._prefill()
+
+    def _prefill(self):
+        """Open min_size connections up front; failures are retried lazily"""
+        for _ in range(self.min_size):
+            try:
+                conn = self._connect()
+            except Exception as e:
+                print(f"Connection pool prefill error: {e}")
+                return
+            with self._cond:
+                self._size += 1
+                self._stats['created'] += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _open(self):
+        """Open a new connection for a slot already reserved in _size"""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return conn, time.monotonic()
+
+    def _is_usable(self, conn, created_at):
+        if self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            with self._cond:
+                self._stats['recycled'] += 1
+            return False
+        if self._ping:
+            try:
+                self._ping(conn)
+            except Exception:
+                with self._cond:
+                    self._stats['ping_failures'] += 1
+                return False
+        return True
+
+    def acquire(self):
+        """Check out a live connection, waiting up to checkout_timeout seconds"""
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("Connection pool is closed")
+            waited = False
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No connection available within {self.checkout_timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                self._cond.wait(remaining)
+            if self._idle:
+                conn, created_at = self._idle.pop()
+            else:
+                conn = None
+                self._size += 1
+
+        if conn is None:
+            conn, created_at = self._open()
+        elif not self._is_usable(conn, created_at):
+            self._close_quietly(conn)
+            conn, created_at = self._open()
+
+        with self._cond:
+            self._born[id(conn)] = created_at
+            self._stats['checkouts'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or drop it if it is broken"""
+        if not discard and self._reset:
+            try:
+                self._reset(conn)
+            except Exception:
+                discard = True
+
+        with self._cond:
+            created_at = self._born.pop(id(conn), time.monotonic())
+            if discard or self._closed:
+                self._size -= 1
+                self._stats['discarded'] += 1
+            else:
+                self._idle.append((conn, created_at))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def stats(self):
+        """Snapshot of pool sizing and usage counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return stats
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed on release"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
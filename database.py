@@ -1,6 +1,14 @@
-import pymysql
-import hashlib
-from datetime import datetime
+import os
+import threading
+import passwords
+import pandas as pd
+from pandas.api.types import union_categoricals
+from query_cache import QueryCache, freeze
+from storage import (MySQLBackend, SQLiteBackend, IntegrityError, PATIENT_HISTORY_COLUMNS, SEARCH_RANK_WINDOW,
+                     patient_projection)
+
+# Storage engine: 'mysql' or 'sqlite'
+DB_BACKEND = os.environ.get('WECARE_DB_BACKEND', 'mysql')
 
 # MySQL Connection Config
 DB_CONFIG = {
@@ -9,132 +17,153 @@ DB_CONFIG = {
     'password': 'password',   # Your MySQL password
     'database': 'wecare_hms', # Database name
     'charset': 'utf8mb4',
-    'cursorclass': pymysql.cursors.DictCursor
 }
 
+# Connection Pool Config (MySQL)
+POOL_CONFIG = {
+    'min_size': 1,            # Connections opened at startup
+    'max_size': 10,           # Hard cap on open connections
+    'max_lifetime': 1800,     # Seconds before a connection is recycled
+    'checkout_timeout': 10,   # Seconds to wait for a free connection
+}
+
+# SQLite database file
+DB_PATH = os.environ.get('WECARE_DB_PATH', 'wecare_hms.db')
+
+# pandas dtypes for patient_history columns; others load as 'string'
+PATIENT_HISTORY_DTYPES = {
+    'patient_id': 'Int64',
+    'user_id': 'Int64',
+    'age': 'Int16',
+    'appointment_id': 'Int64',
+    'gender': 'category',
+    'disease_name': 'category',
+    'severity_level': 'category',
+    'status': 'category',
+    'visit_type': 'category',
+    'smoking_status': 'category',
+    'exercise_level': 'category',
+    'insurance_used': 'category',
+    'height_cm': 'float32',
+    'weight_kg': 'float32',
+    'BMI': 'float32',
+    'treatment_cost': 'float32',
+    'total_amount': 'float32',
+    'diagnosis_date': 'datetime64[us]',
+    'appointment_date': 'datetime64[us]',
+    'follow_up_date': 'datetime64[us]',
+    'created_at': 'datetime64[us]',
+    'updated_at': 'datetime64[us]',
+}
+
+# Rows fetched per round trip when loading DataFrames
+FRAME_CHUNK_SIZE = 50000
+
+# Shared read cache, invalidated by writes to the tables it read
+CACHE_CONFIG = {
+    'max_entries': 512,       # LRU bound across all sessions
+    'ttl': 60,                # Seconds; also bounds staleness from other processes
+}
+
+# Seconds the admin dashboard tiles may lag behind other processes; writes here invalidate them at once
+DASHBOARD_TTL = 5
+
+# Seconds an admin grid's row count is reused; writes do not invalidate it, so it can lag this long
+GRID_COUNT_TTL = 300
+
+_backend = None
+_backend_lock = threading.Lock()
+query_cache = QueryCache(**CACHE_CONFIG)
+
+def _create_backend(name):
+    if name == 'mysql':
+        return MySQLBackend(DB_CONFIG, POOL_CONFIG)
+    if name == 'sqlite':
+        return SQLiteBackend(DB_PATH)
+    raise ValueError(f"Unknown database backend: {name}")
+
+def get_backend():
+    """Get the active storage backend, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend(DB_BACKEND)
+    return _backend
+
+def database_source():
+    """Identifies the database this process reads, for data derived from it"""
+    if DB_BACKEND == 'sqlite':
+        return f"sqlite:{os.path.abspath(DB_PATH)}"
+    return f"{DB_BACKEND}:{DB_CONFIG.get('host')}/{DB_CONFIG.get('database')}"
+
+def set_backend(name):
+    """Switch the storage engine ('mysql' or 'sqlite') for this process"""
+    global DB_BACKEND, _backend
+    new = _create_backend(name)
+    with _backend_lock:
+        DB_BACKEND, old, _backend = name, _backend, new
+    if old is not None:
+        old.close()
+    query_cache.clear()
+    return new
+
+def configure_pool(**options):
+    """Override POOL_CONFIG values and rebuild the MySQL pool"""
+    unknown = set(options) - set(POOL_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown pool options: {', '.join(sorted(unknown))}")
+    POOL_CONFIG.update(options)
+    if DB_BACKEND == 'mysql':
+        set_backend('mysql')
+
+def get_pool_stats():
+    """Get connection pool statistics"""
+    return get_backend().stats()
+
+def get_cache_stats():
+    """Get query cache hit/miss statistics"""
+    return query_cache.stats()
+
+def cached_read(tables, method, *args):
+    """Call a backend read method through the shared query cache"""
+    key = (DB_BACKEND, method, freeze(args))
+    return query_cache.get_or_load(key, lambda: getattr(get_backend(), method)(*args), tables)
+
+def cached_query(tables, sql, params=()):
+    """Run a SELECT through the shared query cache"""
+    key = (DB_BACKEND, 'query', sql, freeze(params))
+    return query_cache.get_or_load(key, lambda: get_backend().query(sql, params), tables)
+
 def get_connection():
-    """Get MySQL connection"""
-    try:
-        conn = pymysql.connect(**DB_CONFIG)
-        return conn
-    except pymysql.Error as e:
-        print(f"Database connection error: {e}")
-        return None
+    """Borrow a connection from the active backend as a context manager"""
+    return get_backend().connection()
 
 def init_database():
     """Initialize database with all required tables"""
-    conn = get_connection()
-    if not conn:
-        print("Failed to connect to database")
+    # Once per process: app.py calls this on every rerun
+    cost = passwords.current_cost()
+    print(f"🔐 Password hashing: {passwords.SCHEME}, cost {cost}")
+    try:
+        applied = get_backend().init_schema(hash_password)
+    except Exception as e:
+        print(f"Failed to initialize database: {e}")
         return
-    
-    c = conn.cursor()
-
-    # Users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        user_id INT AUTO_INCREMENT PRIMARY KEY,
-        email VARCHAR(255) UNIQUE NOT NULL,
-        password VARCHAR(255) NOT NULL,
-        full_name VARCHAR(255) NOT NULL,
-        role VARCHAR(50) DEFAULT 'user',
-        phone VARCHAR(20),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-
-    # Patient history table
-    c.execute('''CREATE TABLE IF NOT EXISTS patient_history (
-        patient_id INT AUTO_INCREMENT PRIMARY KEY,
-        user_id INT NOT NULL,
-        name VARCHAR(255),
-        age INT,
-        gender VARCHAR(50),
-        disease_name VARCHAR(255),
-        symptoms TEXT,
-        severity_level VARCHAR(50),
-        medical_history TEXT,
-        diagnosis_date VARCHAR(50),
-        appointment_id INT,
-        appointment_date VARCHAR(50),
-        appointment_time VARCHAR(50),
-        status VARCHAR(50),
-        visit_type VARCHAR(50),
-        height_cm FLOAT,
-        weight_kg FLOAT,
-        BMI FLOAT,
-        smoking_status VARCHAR(50),
-        exercise_level VARCHAR(50),
-        treatment_given TEXT,
-        medicine_prescribed TEXT,
-        treatment_cost FLOAT,
-        follow_up_date VARCHAR(50),
-        total_amount FLOAT,
-        insurance_used VARCHAR(50),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(user_id),
-        INDEX(user_id)
-    )''')
-
-    # Appointments table
-    c.execute('''CREATE TABLE IF NOT EXISTS appointments (
-        appointment_id INT AUTO_INCREMENT PRIMARY KEY,
-        user_id INT NOT NULL,
-        appointment_date VARCHAR(50) NOT NULL,
-        appointment_time VARCHAR(50) NOT NULL,
-        status VARCHAR(50) DEFAULT 'pending',
-        admin_notes TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(user_id),
-        INDEX(user_id)
-    )''')
-
-    conn.commit()
-
-    # ---------- SEED DEFAULT ADMIN & USER ----------
-    admin_email = "admin@wecare.com"
-    user_email = "user@wecare.com"
-
-    # Admin user
-    c.execute("SELECT 1 FROM users WHERE email = %s", (admin_email,))
-    if not c.fetchone():
-        c.execute(
-            "INSERT INTO users (email, password, full_name, role, phone) VALUES (%s, %s, %s, %s, %s)",
-            (admin_email, hash_password("admin123"), "Admin User", "admin", "")
-        )
-
-    # Normal user
-    c.execute("SELECT 1 FROM users WHERE email = %s", (user_email,))
-    if not c.fetchone():
-        c.execute(
-            "INSERT INTO users (email, password, full_name, role, phone) VALUES (%s, %s, %s, %s, %s)",
-            (user_email, hash_password("user123"), "Test User", "user", "")
-        )
-
-    conn.commit()
-    conn.close()
+    if applied:
+        print(f"🗂️ Applied schema migrations: {', '.join(map(str, applied))}")
     print("✅ Database initialized successfully!")
 
 def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password with a salted, calibrated KDF (see passwords.py)"""
+    return passwords.hash_password(password)
 
 def create_user(email, password, full_name, role='user', phone=''):
     """Create new user account"""
     try:
-        conn = get_connection()
-        if not conn:
-            return False, "Database connection failed"
-        
-        c = conn.cursor()
-        hashed_pwd = hash_password(password)
-        c.execute(
-            "INSERT INTO users (email, password, full_name, role, phone) VALUES (%s, %s, %s, %s, %s)",
-            (email, hashed_pwd, full_name, role, phone)
-        )
-        conn.commit()
-        conn.close()
+        get_backend().create_user(email, hash_password(password), full_name, role, phone)
+        query_cache.invalidate('users')
         return True, "User created successfully"
-    except pymysql.IntegrityError:
+    except IntegrityError:
         return False, "Email already exists"
     except Exception as e:
         return False, str(e)
@@ -142,15 +171,7 @@ def create_user(email, password, full_name, role='user', phone=''):
 def get_user_by_email(email):
     """Get user by email"""
     try:
-        conn = get_connection()
-        if not conn:
-            return None
-        
-        c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE email = %s', (email,))
-        user = c.fetchone()
-        conn.close()
-        
+        user = cached_read(('users',), 'get_user_by_email', email)
         if user:
             return {
                 'user_id': user['user_id'],
@@ -164,37 +185,46 @@ def get_user_by_email(email):
         print(f"Error: {e}")
         return None
 
-def verify_password(email, password):
-    """Verify user password"""
+def authenticate(email, password):
+    """Check credentials in one round-trip; returns the user profile or None"""
     try:
-        conn = get_connection()
-        if not conn:
-            return False
-        
-        c = conn.cursor()
-        hashed_pwd = hash_password(password)
-        c.execute('SELECT * FROM users WHERE email = %s AND password = %s',
-                  (email, hashed_pwd))
-        user = c.fetchone()
-        conn.close()
-        
-        return user is not None
+        # Uncached on purpose: credentials must reflect the latest write
+        user = get_backend().get_user_by_email(email)
     except Exception as e:
         print(f"Error: {e}")
-        return False
+        return None
+    if not user:
+        return None
+    try:
+        matches, needs_rehash = passwords.verify_password(password, user['password'])
+    except passwords.PasswordHasherBusy as e:
+        print(f"Error: {e}")
+        return None
+    if not matches:
+        return None
+    if needs_rehash:
+        # Legacy SHA-256 or outdated cost: upgrade now that we know the password
+        try:
+            get_backend().update_password(user['user_id'], hash_password(password))
+            query_cache.invalidate('users')
+        except Exception as e:
+            print(f"Error: {e}")
+    return {
+        'user_id': user['user_id'],
+        'email': user['email'],
+        'full_name': user['full_name'],
+        'role': user['role'],
+        'phone': user['phone']
+    }
+
+def verify_password(email, password):
+    """Verify user password"""
+    return authenticate(email, password) is not None
 
 def get_all_users():
     """Get all users (admin only)"""
     try:
-        conn = get_connection()
-        if not conn:
-            return []
-        
-        c = conn.cursor()
-        c.execute('SELECT user_id, email, full_name, role, phone, created_at FROM users')
-        users = c.fetchall()
-        conn.close()
-        return users
+        return cached_read(('users',), 'get_all_users')
     except Exception as e:
         print(f"Error: {e}")
         return []
@@ -202,45 +232,32 @@ def get_all_users():
 def add_patient_history(user_id, patient_data):
     """Add patient history record"""
     try:
-        conn = get_connection()
-        if not conn:
-            return False, "Database connection failed"
-        
-        c = conn.cursor()
-        c.execute('''INSERT INTO patient_history
-                     (user_id, name, age, gender, disease_name, symptoms, severity_level,
-                      medical_history, diagnosis_date, height_cm, weight_kg, BMI,
-                      smoking_status, exercise_level, treatment_given, medicine_prescribed,
-                      treatment_cost, follow_up_date, total_amount, insurance_used, status)
-                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                  (user_id, patient_data.get('name'), patient_data.get('age'),
-                   patient_data.get('gender'), patient_data.get('disease_name'),
-                   patient_data.get('symptoms'), patient_data.get('severity_level'),
-                   patient_data.get('medical_history'), datetime.now().strftime('%Y-%m-%d'),
-                   patient_data.get('height_cm'), patient_data.get('weight_kg'),
-                   patient_data.get('BMI'), patient_data.get('smoking_status'),
-                   patient_data.get('exercise_level'), patient_data.get('treatment_given'),
-                   patient_data.get('medicine_prescribed'), patient_data.get('treatment_cost'),
-                   patient_data.get('follow_up_date'), patient_data.get('total_amount'),
-                   patient_data.get('insurance_used'), 'completed'))
-        conn.commit()
-        conn.close()
+        get_backend().add_patient_history(user_id, patient_data)
+        query_cache.invalidate('patient_history')
         return True, "Patient record added successfully"
     except Exception as e:
         return False, str(e)
 
+def add_patient_history_bulk(records, user_id=None, chunk_size=1000):
+    """Bulk-load patient records; the supported way to import data at scale
+
+    records is any iterable of patient_data dicts (optionally with 'user_id')
+    or tuples in storage.PATIENT_INSERT_COLUMNS order. Rows are inserted in
+    chunk_size transactions. Returns a report with inserted/failed counts,
+    per-row errors [(row_index, message)] and rows_per_sec.
+    """
+    try:
+        return get_backend().add_patient_history_bulk(records, user_id, chunk_size)
+    except Exception as e:
+        return {'inserted': 0, 'failed': 0, 'errors': [(None, str(e))], 'violations': [],
+                'seconds': 0.0, 'rows_per_sec': 0.0}
+    finally:
+        query_cache.invalidate('patient_history')
+
 def get_patient_history(user_id):
     """Get patient history for specific user"""
     try:
-        conn = get_connection()
-        if not conn:
-            return []
-        
-        c = conn.cursor()
-        c.execute('SELECT * FROM patient_history WHERE user_id = %s ORDER BY created_at DESC', (user_id,))
-        records = c.fetchall()
-        conn.close()
-        return records
+        return cached_read(('patient_history',), 'get_patient_history', user_id)
     except Exception as e:
         print(f"Error: {e}")
         return []
@@ -248,50 +265,117 @@ def get_patient_history(user_id):
 def get_all_patient_history():
     """Get all patient history (admin only)"""
     try:
-        conn = get_connection()
-        if not conn:
-            return []
-        
-        c = conn.cursor()
-        c.execute('SELECT * FROM patient_history ORDER BY created_at DESC')
-        records = c.fetchall()
-        conn.close()
-        return records
+        return cached_read(('patient_history',), 'get_all_patient_history')
     except Exception as e:
         print(f"Error: {e}")
         return []
 
+def get_patient_history_page(after=None, limit=50, user_id=None, status=None,
+                             date_from=None, date_to=None, columns=None):
+    """Get one page of patient history, newest first; returns (rows, next_cursor)"""
+    try:
+        return cached_read(('patient_history',), 'get_patient_history_page', after, limit, user_id,
+                           status, date_from, date_to, columns)
+    except Exception as e:
+        print(f"Error: {e}")
+        return [], None
+
+def _typed_column(values, dtype):
+    """One column of a fetched chunk as a Series of dtype"""
+    if dtype == 'category':
+        return pd.Series(pd.Categorical(values))
+    if dtype.startswith('datetime'):
+        return pd.to_datetime(pd.Series(values, dtype='object'), errors='coerce',
+                              format='ISO8601').astype(dtype)
+    return pd.Series(values, dtype=dtype)
+
+def typed_frame(chunks, columns):
+    """DataFrame of PATIENT_HISTORY_DTYPES columns from an iterable of tuple-row chunks
+
+    Each chunk is transposed into columns and converted at once, so no
+    per-row dicts are built and at most one chunk of raw Python values is
+    alive at a time.
+    """
+    columns = list(columns)
+    dtypes = [PATIENT_HISTORY_DTYPES.get(col, 'string') for col in columns]
+    parts = [[] for _ in columns]
+    for rows in chunks:
+        for part, values, dtype in zip(parts, zip(*rows), dtypes):
+            part.append(_typed_column(values, dtype))
+    data = {}
+    for col, part, dtype in zip(columns, parts, dtypes):
+        if not part:
+            data[col] = _typed_column((), dtype)
+        elif dtype == 'category':
+            # Chunks have their own categories; merge them without going through object
+            data[col] = pd.Series(union_categoricals([p.array for p in part]))
+        else:
+            data[col] = pd.concat(part, ignore_index=True)
+    return pd.DataFrame(data, columns=columns)
+
+def load_patient_history_frame(columns, user_id=None, status=None, date_from=None,
+                               date_to=None, limit=None, chunk_size=FRAME_CHUNK_SIZE):
+    """Build a typed patient history DataFrame straight from the cursor, newest first"""
+    columns = list(columns or PATIENT_HISTORY_COLUMNS)
+    return typed_frame(get_backend().stream_patient_history(columns, user_id, status, date_from,
+                                                            date_to, limit, chunk_size), columns)
+
+def query_patient_history(columns, user_id=None, status=None, date_from=None,
+                          date_to=None, limit=None):
+    """Get selected patient history columns as a typed DataFrame, newest first
+
+    The frame is shared through the query cache; callers must not modify it
+    in place.
+    """
+    columns = list(columns or PATIENT_HISTORY_COLUMNS)
+    patient_projection(columns)  # Unknown columns are a caller bug, not a DB error
+    args = (columns, user_id, status, date_from, date_to, limit)
+    try:
+        return query_cache.get_or_load((DB_BACKEND, 'patient_history_frame', freeze(args)),
+                                       lambda: load_patient_history_frame(*args),
+                                       ('patient_history',))
+    except Exception as e:
+        print(f"Error: {e}")
+        return typed_frame((), columns)
+
+def search_patient_history(text, user_id=None, after=None, limit=20):
+    """Full-text search over visit notes, best match first; returns (hits, next_cursor)"""
+    try:
+        return cached_read(('patient_history',), 'search_patient_history', text, user_id, after, limit)
+    except Exception as e:
+        print(f"Error: {e}")
+        return [], None
+
+def search_rank_window():
+    """How many matches search ranks together, newest first, or None when it ranks them all at once"""
+    return SEARCH_RANK_WINDOW if get_backend().name == 'sqlite' else None
+
 def add_appointment(user_id, appointment_date, appointment_time):
     """Add appointment"""
     try:
-        conn = get_connection()
-        if not conn:
-            return False, "Database connection failed"
-        
-        c = conn.cursor()
-        c.execute(
-            'INSERT INTO appointments (user_id, appointment_date, appointment_time) VALUES (%s, %s, %s)',
-            (user_id, appointment_date, appointment_time)
-        )
-        conn.commit()
-        conn.close()
+        get_backend().add_appointment(user_id, appointment_date, appointment_time)
+        query_cache.invalidate('appointments')
         return True, "Appointment scheduled successfully"
     except Exception as e:
         return False, str(e)
 
+def add_appointments_bulk(appointments, chunk_size=1000):
+    """Bulk-load appointments (dicts or (user_id, date, time[, status[, notes]]) tuples)
+
+    Returns the same report as add_patient_history_bulk.
+    """
+    try:
+        return get_backend().add_appointments_bulk(appointments, chunk_size)
+    except Exception as e:
+        return {'inserted': 0, 'failed': 0, 'errors': [(None, str(e))], 'violations': [],
+                'seconds': 0.0, 'rows_per_sec': 0.0}
+    finally:
+        query_cache.invalidate('appointments')
+
 def get_appointments(user_id):
     """Get appointments for user"""
     try:
-        conn = get_connection()
-        if not conn:
-            return []
-        
-        c = conn.cursor()
-        c.execute('SELECT * FROM appointments WHERE user_id = %s ORDER BY appointment_date DESC',
-                  (user_id,))
-        appointments = c.fetchall()
-        conn.close()
-        return appointments
+        return cached_read(('appointments',), 'get_appointments', user_id)
     except Exception as e:
         print(f"Error: {e}")
         return []
@@ -299,15 +383,42 @@ def get_appointments(user_id):
 def get_all_appointments():
     """Get all appointments (admin only)"""
     try:
-        conn = get_connection()
-        if not conn:
-            return []
-        
-        c = conn.cursor()
-        c.execute('SELECT * FROM appointments ORDER BY appointment_date DESC')
-        appointments = c.fetchall()
-        conn.close()
-        return appointments
+        return cached_read(('appointments',), 'get_all_appointments')
     except Exception as e:
         print(f"Error: {e}")
         return []
+
+def get_grid_page(table, after=None, limit=50, columns=None, sort=None, descending=True,
+                  filters=None, search=None):
+    """Get one sorted, filtered page of an admin grid table; returns (rows, next_cursor)"""
+    try:
+        return cached_read((table,), 'grid_page', table, columns, sort, descending, filters,
+                           search, after, limit)
+    except Exception as e:
+        print(f"Error: {e}")
+        return [], None
+
+def get_grid_count(table, filters=None, search=None):
+    """Get a bounded row count for an admin grid; returns (rows, accuracy)"""
+    try:
+        return query_cache.get_or_load(
+            (DB_BACKEND, 'grid_count', table, freeze(filters), search),
+            lambda: get_backend().grid_count(table, filters, search),
+            ttl=GRID_COUNT_TTL
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return 0, 'exact'
+
+def dashboard_summary(recent=5):
+    """Get the admin dashboard counts and newest users and appointments in one batch"""
+    try:
+        return query_cache.get_or_load(
+            (DB_BACKEND, 'dashboard_summary', recent),
+            lambda: get_backend().dashboard_summary(recent),
+            ('users', 'appointments'), ttl=DASHBOARD_TTL
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return {'users': 0, 'appointments': 0, 'pending': 0, 'completed': 0,
+                'recent_users': [], 'recent_appointments': []}
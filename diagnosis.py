@@ -0,0 +1,243 @@
+"""Symptom matching for the Free Diagnosis page
+
+The disease knowledge base lives in knowledge_base.json:
+    {"version": 1, "conditions": [{"name": ..., "symptoms": [...], "recommendations": [...]}]}
+It is loaded once per process into a compact KnowledgeBase and reloaded
+only when the file's mtime or size changes.
+
+SymptomMatcher compiles a symptom -> diseases table once into a token
+n-gram index and an inverted index. Matching a description looks up the
+n-grams starting at each token (leftmost-longest, so "shortness of breath"
+wins over "breath"), which costs O(tokens x longest symptom) however large
+the vocabulary is. Diseases
+are ranked by the summed weight of their matched symptoms, where a symptom
+shared by fewer diseases weighs more.
+"""
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+
+KNOWLEDGE_BASE_PATH = os.environ.get(
+    'WECARE_KB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'knowledge_base.json'))
+
+# Seconds between checks of the knowledge base file for changes
+KB_CHECK_INTERVAL = 5
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SEPARATORS = re.compile(r"[,;/\n]|\band\b|\bwith\b")
+
+
+def normalize_token(token):
+    """Fold simple plurals so 'headaches' matches 'headache'"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lower-cased, normalized word tokens of text"""
+    return [normalize_token(token) for token in _TOKEN.findall((text or '').lower())]
+
+
+def split_symptoms(text):
+    """Normalized symptom phrases of a recorded symptoms field ('fever, runny nose')"""
+    phrases = []
+    for part in _SEPARATORS.split((text or '').lower()):
+        phrase = ' '.join(tokenize(part))
+        if phrase and phrase not in phrases:
+            phrases.append(phrase)
+    return phrases
+
+
+class PhraseIndex:
+    """Finds known multi-word phrases in free text via token n-gram lookups
+
+    Phrases are stored as one flat dict keyed by their token tuple, which is
+    far smaller than a nested trie at tens of thousands of phrases. Phrases
+    that tokenize alike share an entry, and a match returns all their ids.
+    """
+
+    def __init__(self, phrases=()):
+        self._ids = {}
+        self.max_tokens = 0
+        self.size = 0
+        for phrase in phrases:
+            self.add(phrase)
+
+    def add(self, phrase):
+        """Index phrase under the next id (phrases are numbered in insertion order)"""
+        tokens = tuple(sys.intern(token) for token in tokenize(phrase))
+        if tokens:
+            # A lone id is stored bare; a tuple only once a second phrase shares the tokens
+            ids = self._ids.get(tokens)
+            if ids is None:
+                self._ids[tokens] = self.size
+            else:
+                self._ids[tokens] = (ids if isinstance(ids, tuple) else (ids,)) + (self.size,)
+            self.max_tokens = max(self.max_tokens, len(tokens))
+        self.size += 1
+
+    def find(self, text):
+        """Ids of phrases in text, leftmost-longest, in order of first mention"""
+        tokens = tokenize(text)
+        found = []
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self.max_tokens, len(tokens) - i), 0, -1):
+                match = self._ids.get(tuple(tokens[i:i + length]))
+                if match is not None:
+                    for phrase_id in match if isinstance(match, tuple) else (match,):
+                        if phrase_id not in found:
+                            found.append(phrase_id)
+                    i += length
+                    break
+            else:
+                i += 1
+        return found
+
+
+class SymptomMatcher:
+    """Immutable compiled index over a symptom -> diseases table"""
+
+    def __init__(self, diseases_db):
+        # Spellings that tokenize alike ('cough', 'Coughs') are one symptom, named by the first in sort order
+        spellings = {}
+        for symptom in sorted(diseases_db):
+            spellings.setdefault(tuple(tokenize(symptom)), []).append(symptom)
+        self.symptoms = [names[0] for names in spellings.values()]
+        self._symptom_ids = {name: i for i, names in enumerate(spellings.values()) for name in names}
+        self.diseases = sorted({d for diseases in diseases_db.values() for d in diseases})
+        disease_index = {d: i for i, d in enumerate(self.diseases)}
+        self._phrases = PhraseIndex(self.symptoms)
+
+        # Rarer symptoms are more telling: idf over the disease count.
+        # Postings are one CSR-style typed array: symptom s owns
+        # _postings[_offsets[s]:_offsets[s + 1]]
+        self._offsets = array('I', [0])
+        self._postings = array('I')
+        self._weights = array('d')
+        self._disease_totals = array('d', bytes(8 * len(self.diseases)))
+        for names in spellings.values():
+            diseases = sorted({disease_index[d] for name in names for d in diseases_db[name]})
+            weight = math.log(1 + len(self.diseases) / len(diseases)) if diseases else 0.0
+            self._postings.extend(diseases)
+            self._offsets.append(len(self._postings))
+            self._weights.append(weight)
+            for d in diseases:
+                self._disease_totals[d] += weight
+
+    def diseases_for(self, symptom_id):
+        """Disease ids listed for a symptom id"""
+        return self._postings[self._offsets[symptom_id]:self._offsets[symptom_id + 1]]
+
+    def find_symptoms(self, text):
+        """Known symptoms mentioned in text, in order of first mention"""
+        return [self.symptoms[s] for s in self._phrases.find(text)]
+
+    def rank(self, symptoms, limit=5):
+        """Diseases for a list of known symptom names, best match first
+
+        Each result is a dict with disease, score (summed symptom weight),
+        coverage (share of the disease's own symptom weight matched) and the
+        matched symptoms. Ties break on coverage, then name, so the order is
+        deterministic.
+        """
+        ids = sorted({self._symptom_ids[s] for s in symptoms if s in self._symptom_ids})
+        scores = {}
+        for s in ids:
+            for d in self.diseases_for(s):
+                scores.setdefault(d, [0.0, []])
+                scores[d][0] += self._weights[s]
+                scores[d][1].append(self.symptoms[s])
+        results = [
+            {
+                'disease': self.diseases[d],
+                'score': score,
+                'coverage': score / self._disease_totals[d] if self._disease_totals[d] else 0.0,
+                'symptoms': matched,
+            }
+            for d, (score, matched) in scores.items()
+        ]
+        results.sort(key=lambda r: (-r['score'], -r['coverage'], r['disease']))
+        return results[:limit] if limit else results
+
+    def match(self, text, limit=5):
+        """Rank diseases for a free-text description; see rank()"""
+        return self.rank(self.find_symptoms(text), limit)
+
+
+class KnowledgeBase:
+    """Immutable, indexed form of a knowledge base file"""
+
+    def __init__(self, conditions, version=None, mtime=None, size=None):
+        self.version = version
+        self.mtime = mtime
+        self.size = size
+        # Interned strings: recommendations like 'Rest' repeat across thousands of conditions
+        self.recommendations = {}
+        diseases_db = {}
+        for condition in conditions:
+            name = sys.intern(condition['name'])
+            self.recommendations[name] = tuple(sys.intern(r) for r in condition.get('recommendations', ()))
+            for symptom in condition.get('symptoms', ()):
+                diseases_db.setdefault(sys.intern(symptom.lower()), []).append(name)
+        self.matcher = SymptomMatcher(diseases_db)
+
+    @property
+    def conditions(self):
+        return len(self.recommendations)
+
+
+def load_knowledge_base(path=KNOWLEDGE_BASE_PATH):
+    """Parse and index a knowledge base file"""
+    stat = os.stat(path)
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return KnowledgeBase(data['conditions'], data.get('version'), stat.st_mtime_ns, stat.st_size)
+
+
+_knowledge_base = None
+_checked_at = 0.0
+_kb_lock = threading.Lock()
+
+
+def get_knowledge_base(path=KNOWLEDGE_BASE_PATH):
+    """Process-wide knowledge base, reloaded when the file changes
+
+    The file is stat()ed at most every KB_CHECK_INTERVAL seconds. A file
+    that fails to load keeps the previous version in service.
+    """
+    global _knowledge_base, _checked_at
+    kb = _knowledge_base
+    now = time.monotonic()
+    if kb is not None and now - _checked_at < KB_CHECK_INTERVAL:
+        return kb
+    with _kb_lock:
+        if _knowledge_base is not None and now - _checked_at < KB_CHECK_INTERVAL:
+            return _knowledge_base
+        _checked_at = now
+        try:
+            stat = os.stat(path)
+            kb = _knowledge_base
+            if kb is None or (stat.st_mtime_ns, stat.st_size) != (kb.mtime, kb.size):
+                _knowledge_base = load_knowledge_base(path)
+        except (OSError, ValueError, KeyError) as e:
+            if _knowledge_base is None:
+                raise
+            print(f"Error: {e}")
+        return _knowledge_base
+
+
+def recommendations_for(disease):
+    """Recommendations for a condition, or () if it has none"""
+    return get_knowledge_base().recommendations.get(disease, ())
+
+
+def diagnose(text, limit=5):
+    """Top candidate diseases for a free-text symptom description"""
+    return get_knowledge_base().matcher.match(text, limit)
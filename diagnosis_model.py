@@ -0,0 +1,380 @@
+"""Multinomial Naive Bayes diagnosis learned from patient_history
+
+Features are the normalized symptom phrases of the `symptoms` column and
+labels are `disease_name`. Training only adds counts, so the model is
+updated incrementally from rows past its patient_id watermark; edits to
+rows it has already seen are not picked up. The model is saved to
+MODEL_PATH and reloaded on startup so page loads never retrain.
+
+Counts are sparse CSR-style NumPy arrays, the layout SymptomMatcher uses:
+phrase c owns rows/counts[offsets[c]:offsets[c + 1]], so memory grows with
+the (disease, phrase) pairs actually seen rather than diseases x phrases.
+Scoring a description gathers only the postings of the phrases it mentions
+and adds them with one vectorized np.add.at. Loading and training run on a background thread; until the
+first model is ready, predictions are empty and analyze() uses the rules.
+"""
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+import database
+import diagnosis
+from diagnosis import PhraseIndex, diagnose, split_symptoms
+from query_cache import QueryCache
+
+MODEL_PATH = os.environ.get('WECARE_MODEL_PATH', 'diagnosis_model.npz')
+MODEL_FORMAT = 3
+
+# Seconds between checks for new patient_history rows
+REFRESH_INTERVAL = 60
+
+# Rows fetched per training query
+TRAIN_BATCH = 5000
+
+# Laplace smoothing for phrase likelihoods
+ALPHA = 1.0
+
+# Memoized analyze() results, shared by every session
+DIAGNOSIS_CACHE_CONFIG = {
+    'max_entries': 2048,      # LRU bound
+    'ttl': 3600,              # Seconds; writes invalidate entries sooner
+}
+
+# Lower bounds of the age bands used in cache keys
+AGE_BANDS = (0, 13, 18, 40, 65)
+
+
+class NaiveBayesModel:
+    """Sparse phrase counts per disease with incremental fitting and softmax scoring"""
+
+    def __init__(self, alpha=ALPHA):
+        self.alpha = alpha
+        self.vocab = []             # phrase per column
+        self.diseases = []          # display name per row
+        self.watermark = 0          # highest patient_id trained on
+        self.source = None
+        self._vocab_ids = {}
+        self._disease_ids = {}      # lower-cased name -> row
+        self._phrases = PhraseIndex()
+        # Phrase c's postings: disease rows and counts in [_offsets[c], _offsets[c + 1])
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._class_counts = np.zeros(8, dtype=np.int64)
+        self._feature_totals = np.zeros(8, dtype=np.int64)
+
+    @property
+    def n_records(self):
+        return int(self._class_counts[:len(self.diseases)].sum())
+
+    def _grow(self, rows):
+        """Ensure capacity for rows diseases, doubling so growth stays amortized O(1)"""
+        capacity = len(self._class_counts)
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        for name in ('_class_counts', '_feature_totals'):
+            grown = np.zeros(capacity, dtype=np.int64)
+            old = getattr(self, name)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _phrase_id(self, phrase):
+        col = self._vocab_ids.get(phrase)
+        if col is None:
+            col = self._vocab_ids[phrase] = len(self.vocab)
+            self.vocab.append(phrase)
+            self._phrases.add(phrase)
+        return col
+
+    def _disease_id(self, name):
+        key = name.lower()
+        row = self._disease_ids.get(key)
+        if row is None:
+            row = self._disease_ids[key] = len(self.diseases)
+            self.diseases.append(name)
+        return row
+
+    def partial_fit(self, records):
+        """Add (symptoms_text, disease_name) pairs; returns how many were used"""
+        rows, cols, labels = [], [], []
+        for symptoms, disease in records:
+            disease = ' '.join((disease or '').split())
+            phrases = split_symptoms(symptoms)
+            if not disease or not phrases:
+                continue
+            row = self._disease_id(disease)
+            labels.append(row)
+            for phrase in phrases:
+                cols.append(self._phrase_id(phrase))
+                rows.append(row)
+        if not labels:
+            return 0
+        self._merge(np.array(cols, dtype=np.int64), np.array(rows, dtype=np.int64))
+        self._grow(len(self.diseases))
+        np.add.at(self._feature_totals, rows, 1)
+        np.add.at(self._class_counts, labels, 1)
+        return len(labels)
+
+    def _merge(self, cols, rows):
+        """Add one count per (cols[i], rows[i]) pair to the CSR postings"""
+        n_vocab = len(self.vocab)
+        old_cols = np.repeat(np.arange(len(self._offsets) - 1), np.diff(self._offsets))
+        cols = np.concatenate((old_cols, cols))
+        rows = np.concatenate((self._rows, rows))
+        counts = np.concatenate((self._counts, np.ones(len(rows) - len(self._rows), dtype=np.int64)))
+        order = np.lexsort((rows, cols))
+        cols, rows, counts = cols[order], rows[order], counts[order]
+        # Sum the counts of repeated (col, row) pairs
+        starts = np.flatnonzero(np.concatenate(([True], (cols[1:] != cols[:-1]) | (rows[1:] != rows[:-1]))))
+        self._rows = rows[starts].astype(np.int32)
+        self._counts = np.add.reduceat(counts, starts)
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(cols[starts], minlength=n_vocab))))
+
+    def _posting_slices(self, cols):
+        """Positions in _rows/_counts of the postings of phrase columns cols"""
+        return np.concatenate([np.arange(self._offsets[c], self._offsets[c + 1]) for c in cols])
+
+    def predict(self, text, limit=5):
+        """Diseases for a free-text description, most probable first
+
+        Each result is a dict with disease, probability (posterior over every
+        known disease) and the mentioned phrases seen with that disease;
+        diseases never seen with any mentioned phrase are left out.
+        Returns [] when the text mentions no phrase the model has seen.
+        """
+        cols = self._phrases.find(text)
+        n_diseases, n_vocab = len(self.diseases), len(self.vocab)
+        if not cols or not n_diseases:
+            return []
+        class_counts = self._class_counts[:n_diseases]
+        log_prior = np.log(class_counts) - np.log(class_counts.sum())
+        denominator = np.log(self._feature_totals[:n_diseases] + self.alpha * n_vocab)
+        # Every disease gets log(alpha) per phrase; seen pairs add their count on top
+        scores = log_prior + len(cols) * (np.log(self.alpha) - denominator)
+        postings = self._posting_slices(cols)
+        rows = self._rows[postings]
+        np.add.at(scores, rows, np.log1p(self._counts[postings] / self.alpha))
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+        # Only diseases seen with at least one mentioned phrase are candidates
+        candidates = np.unique(rows)
+        order = candidates[np.lexsort((candidates, -probabilities[candidates]))][:limit]
+        return [
+            {
+                'disease': self.diseases[d],
+                'probability': float(probabilities[d]),
+                'symptoms': [self.vocab[c] for c in cols
+                             if d in self._rows[self._offsets[c]:self._offsets[c + 1]]],
+            }
+            for d in order.tolist()
+        ]
+
+    def arrays(self):
+        """The model as NumPy arrays for save(); counts in CSR form"""
+        n_diseases = len(self.diseases)
+        return {
+            'format': np.array(MODEL_FORMAT),
+            'alpha': np.array(self.alpha),
+            'watermark': np.array(self.watermark),
+            'source': np.array(self.source or ''),
+            'vocab': np.array(self.vocab, dtype=str),
+            'diseases': np.array(self.diseases, dtype=str),
+            'offsets': self._offsets.copy(),
+            'rows': self._rows.copy(),
+            'counts': self._counts.copy(),
+            'class_counts': self._class_counts[:n_diseases].copy(),
+            'feature_totals': self._feature_totals[:n_diseases].copy(),
+        }
+
+    def save(self, path=MODEL_PATH, arrays=None):
+        """Write the model (or arrays() taken earlier) atomically as a compressed .npz"""
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, **(arrays if arrays is not None else self.arrays()))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """Model saved by save(), or None if missing or in an old format"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['format']) != MODEL_FORMAT:
+                    return None
+                model = cls(float(data['alpha']))
+                model.watermark = int(data['watermark'])
+                model.source = str(data['source']) or None
+                for phrase in data['vocab'].tolist():
+                    model._phrase_id(phrase)
+                for disease in data['diseases'].tolist():
+                    model._disease_id(disease)
+                model._offsets = data['offsets'].astype(np.int64)
+                model._rows = data['rows'].astype(np.int32)
+                model._counts = data['counts'].astype(np.int64)
+                n_diseases = len(model.diseases)
+                model._grow(n_diseases)
+                model._class_counts[:n_diseases] = data['class_counts']
+                model._feature_totals[:n_diseases] = data['feature_totals']
+                return model
+        except (OSError, KeyError, ValueError, IndexError):
+            return None
+
+
+def train_incremental(model, batch_size=TRAIN_BATCH, lock=None):
+    """Fit rows past model.watermark in batches; returns the number of rows read
+
+    When the model is being served, pass its lock: it is held only while
+    each fetched batch is fitted, never during the queries.
+    """
+    backend = database.get_backend()
+    read = 0
+    while True:
+        rows = backend.query(
+            "SELECT patient_id, symptoms, disease_name FROM patient_history "
+            "WHERE patient_id > %s AND symptoms IS NOT NULL AND disease_name IS NOT NULL "
+            "ORDER BY patient_id LIMIT %s",
+            (model.watermark, batch_size)
+        )
+        if not rows:
+            return read
+        with lock or nullcontext():
+            model.partial_fit((row['symptoms'], row['disease_name']) for row in rows)
+            model.watermark = rows[-1]['patient_id']
+        read += len(rows)
+        if len(rows) < batch_size:
+            return read
+
+
+_model = None
+_checked_at = None
+_refresher = None
+_lock = threading.Lock()
+diagnosis_cache = QueryCache(**DIAGNOSIS_CACHE_CONFIG)
+_knowledge_base = None
+
+
+def _refresh():
+    """Background load or top-up of the served model"""
+    global _model
+    try:
+        source = database.database_source()
+        with _lock:
+            model = _model
+        if model is None or model.source != source:
+            # Built privately; sessions keep using the rules until it is published
+            model = NaiveBayesModel.load()
+            if model is None or model.source != source:
+                # Trained on another database (or never): start over
+                model = NaiveBayesModel()
+                model.source = source
+            if train_incremental(model):
+                model.save()
+            with _lock:
+                _model = model
+            diagnosis_cache.invalidate('diagnosis_model')
+        elif train_incremental(model, lock=_lock):
+            with _lock:
+                arrays = model.arrays()
+            model.save(arrays=arrays)
+            diagnosis_cache.invalidate('diagnosis_model')
+    except Exception as e:
+        print(f"Error: {e}")
+
+
+def get_model(force_refresh=False, wait=False):
+    """Process-wide model, or None while the first one is still warming up
+
+    Loading from disk and training on new rows run on a background thread,
+    started at most every REFRESH_INTERVAL seconds, so page requests never
+    wait for them. wait=True blocks until a running refresh finishes.
+    """
+    global _checked_at, _refresher
+    source = database.database_source()
+    now = time.monotonic()
+    with _lock:
+        stale = _model is None or _model.source != source
+        due = force_refresh or _checked_at is None or now - _checked_at >= REFRESH_INTERVAL or (
+            stale and _refresher is None)
+        if due and (_refresher is None or not _refresher.is_alive()):
+            _checked_at = now
+            _refresher = threading.Thread(target=_refresh, name='diagnosis-model-refresh', daemon=True)
+            _refresher.start()
+        refresher = _refresher
+    if wait and refresher is not None:
+        refresher.join()
+    with _lock:
+        return _model if _model is not None and _model.source == source else None
+
+
+def model_ready():
+    """True once a model is being served; until then analyze() uses the rules"""
+    return get_model() is not None
+
+
+def predict(text, limit=5):
+    """Most probable diseases for a free-text description; see NaiveBayesModel.predict"""
+    model = get_model()
+    if model is None:
+        return []
+    with _lock:
+        return model.predict(text, limit)
+
+
+def analyze(text, limit=5):
+    """Diagnosis pipeline for the Free Diagnosis page; returns (matches, source)
+
+    Uses the learned model when it recognises the description (source
+    'model', confidence = posterior probability), else the rule-based
+    knowledge base (source 'rules', confidence = symptom coverage).
+    """
+    matches = predict(text, limit)
+    if matches:
+        return [dict(m, confidence=m['probability']) for m in matches], 'model'
+    return [dict(m, confidence=m['coverage']) for m in diagnose(text, limit)], 'rules'
+
+
+def age_band(age):
+    """Lower bound of the AGE_BANDS band containing age, or None"""
+    if age is None:
+        return None
+    return max(band for band in AGE_BANDS if band <= age)
+
+
+def canonical_symptoms(text):
+    """Order- and wording-independent form of a description
+
+    Two descriptions with the same canonical form get the same analysis:
+    both the model and the rules only look at which known phrases occur.
+    """
+    model = get_model()
+    learned = []
+    if model is not None:
+        with _lock:
+            learned = sorted(model.vocab[c] for c in model._phrases.find(text))
+    return tuple(learned), tuple(sorted(diagnosis.get_knowledge_base().matcher.find_symptoms(text)))
+
+
+def cached_analyze(text, severity=None, age=None, gender=None, limit=5):
+    """analyze() through the shared diagnosis cache; returns (matches, source)
+
+    Keyed on canonical_symptoms() plus severity, age band and gender, so
+    near-identical complaints from the same patient group share one entry.
+    Entries are dropped when the model learns new rows or the knowledge
+    base file is reloaded.
+    """
+    global _knowledge_base
+    kb = diagnosis.get_knowledge_base()
+    if kb is not _knowledge_base:
+        _knowledge_base = kb
+        diagnosis_cache.invalidate('knowledge_base')
+    key = (canonical_symptoms(text), severity, age_band(age), gender, limit)
+    return diagnosis_cache.get_or_load(key, lambda: analyze(text, limit),
+                                       ('diagnosis_model', 'knowledge_base'))
+
+
+def get_diagnosis_cache_stats():
+    """Hit/miss statistics of the diagnosis cache"""
+    return diagnosis_cache.stats()
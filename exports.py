@@ -0,0 +1,103 @@
+"""Streaming exports of patient records
+
+Rows are streamed from the database in chunks (an unbuffered server-side
+cursor on MySQL) and written straight to a file, so generating the file
+holds one chunk at a time however large the table is. Files are only
+produced when a user asks for one.
+
+Serving the file is not bounded: st.download_button reads the whole file
+and Streamlit's media manager keeps it in server memory until the session
+moves on. A download therefore costs its file size in RAM, so choose the
+gzipped CSV format for large tables. export_patient_history() writing to a
+path has no such limit.
+"""
+import csv
+import gzip
+import os
+import tempfile
+
+from database import get_backend
+from storage import patient_projection
+
+EXPORT_FORMATS = {
+    # name: (file extension, MIME type)
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+# Rows fetched per round trip
+EXPORT_CHUNK_SIZE = 5000
+
+# Data rows per worksheet; Excel's limit is 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048575
+
+
+def _write_csv(f, header, chunks, on_progress):
+    writer = csv.writer(f)
+    writer.writerow(header)
+    written = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        written += len(rows)
+        if on_progress:
+            on_progress(written)
+    return written
+
+
+def _write_xlsx(path, header, chunks, on_progress):
+    # Imported here so CSV exports work without openpyxl installed
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows to disk instead of keeping every cell object
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, written = None, XLSX_MAX_ROWS, 0
+    for rows in chunks:
+        for row in rows:
+            if sheet_rows == XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Records {len(workbook.worksheets) + 1}")
+                sheet.append(header)
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+        written += len(rows)
+        if on_progress:
+            on_progress(written)
+    if sheet is None:
+        workbook.create_sheet("Records 1").append(header)
+    workbook.save(path)
+    return written
+
+
+def export_patient_history(path, columns, fmt='csv', user_id=None, headers=None,
+                           on_progress=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write patient_history columns, newest first, to path; returns rows written
+
+    fmt is a key of EXPORT_FORMATS. headers maps column names to display
+    names. on_progress(rows_written) is called after every chunk.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    columns = list(columns)
+    patient_projection(columns)
+    header = [(headers or {}).get(col, col) for col in columns]
+    chunks = get_backend().stream_patient_history(columns, user_id=user_id, chunk_size=chunk_size)
+    if fmt == 'xlsx':
+        return _write_xlsx(path, header, chunks, on_progress)
+    opener = gzip.open if fmt == 'csv.gz' else open
+    with opener(path, 'wt', newline='', encoding='utf-8') as f:
+        return _write_csv(f, header, chunks, on_progress)
+
+
+def export_to_tempfile(columns, fmt='csv', user_id=None, headers=None, on_progress=None):
+    """export_patient_history() into a new temporary file; returns (path, rows)
+
+    The caller owns the file and removes it when done.
+    """
+    fd, path = tempfile.mkstemp(prefix='wecare_export_', suffix=f".{EXPORT_FORMATS[fmt][0]}")
+    os.close(fd)
+    try:
+        return path, export_patient_history(path, columns, fmt, user_id, headers, on_progress)
+    except Exception:
+        os.remove(path)
+        raise
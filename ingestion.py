@@ -0,0 +1,264 @@
+"""Chunked, validated import of patient records from CSV or Excel uploads
+
+Uploads are read chunk_size rows at a time (pandas' chunked CSV reader, or
+openpyxl's read-only mode for .xlsx), mapped onto patient_history fields
+and validated with vectorized column rules. Valid rows of each chunk are
+inserted in batched transactions; rejected rows are written to a reject
+CSV with their row number and reasons. Parsing and validation hold one
+chunk at a time, but a Streamlit upload is already fully in memory:
+st.file_uploader buffers the whole file before this module sees it.
+"""
+import csv
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from database import get_backend, query_cache
+from storage import PATIENT_INSERT_COLUMNS
+
+# Fields an upload column can be mapped to
+FIELDS = PATIENT_INSERT_COLUMNS
+
+# Validation rules
+INGEST_RULES = {
+    'age': (0, 120),              # Inclusive ranges for numeric fields
+    'BMI': (10, 80),
+    'height_cm': (30, 250),
+    'weight_kg': (1, 350),
+    'treatment_cost': (0, None),
+    'total_amount': (0, None),
+    'bmi_tolerance': 1.0,         # Max difference between BMI and weight / height^2
+}
+SEVERITY_LEVELS = ('Mild', 'Moderate', 'Severe')
+REQUIRED_FIELDS = ('name', 'disease_name')
+NUMERIC_FIELDS = ('user_id', 'age', 'height_cm', 'weight_kg', 'BMI', 'treatment_cost', 'total_amount')
+INTEGER_FIELDS = ('user_id', 'age')
+DATE_FIELDS = ('diagnosis_date', 'follow_up_date')
+
+# Header spellings (lower-case, letters and digits only) -> field, besides the field names themselves
+FIELD_ALIASES = {
+    'patient': 'name', 'patientname': 'name', 'fullname': 'name',
+    'sex': 'gender',
+    'disease': 'disease_name', 'diagnosis': 'disease_name', 'condition': 'disease_name',
+    'severity': 'severity_level',
+    'history': 'medical_history',
+    'date': 'diagnosis_date', 'visitdate': 'diagnosis_date',
+    'height': 'height_cm', 'weight': 'weight_kg',
+    'smoking': 'smoking_status', 'exercise': 'exercise_level',
+    'treatment': 'treatment_given',
+    'medicine': 'medicine_prescribed', 'medication': 'medicine_prescribed',
+    'cost': 'treatment_cost',
+    'followup': 'follow_up_date',
+    'total': 'total_amount', 'amount': 'total_amount',
+    'insurance': 'insurance_used',
+}
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _key(header):
+    return re.sub(r'[^a-z0-9]', '', str(header).lower())
+
+
+def suggest_mapping(headers):
+    """{header: field} for the headers that look like a patient_history field"""
+    fields = {_key(field): field for field in PATIENT_INSERT_COLUMNS}
+    fields.update(FIELD_ALIASES)
+    mapping, taken = {}, set()
+    for header in headers:
+        field = fields.get(_key(header))
+        if field and field not in taken:
+            mapping[header] = field
+            taken.add(field)
+    return mapping
+
+
+def _is_excel(filename):
+    return filename.lower().endswith(('.xlsx', '.xlsm'))
+
+
+def _excel_chunks(source, chunk_size, nrows=None):
+    # Read-only mode parses rows lazily instead of loading the whole workbook
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(h) if h is not None else f"column {i + 1}" for i, h in enumerate(next(rows, ()))]
+        chunk, read = [], 0
+        for row in rows:
+            if nrows is not None and read >= nrows:
+                break
+            chunk.append(row[:len(header)])
+            read += 1
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header, dtype=object)
+                chunk = []
+        if chunk or not read:
+            yield pd.DataFrame(chunk, columns=header, dtype=object)
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, filename, chunk_size=DEFAULT_CHUNK_SIZE, nrows=None):
+    """DataFrames of at most chunk_size raw rows from a CSV or Excel file or upload"""
+    if _is_excel(filename):
+        return _excel_chunks(source, chunk_size, nrows)
+    # Everything as text: the validation rules do the type conversion
+    return pd.read_csv(source, dtype=str, chunksize=chunk_size, nrows=nrows,
+                       encoding='utf-8-sig', skipinitialspace=True)
+
+
+def preview(source, filename, rows=5):
+    """First rows of an upload, to choose the column mapping from"""
+    return next(iter(read_chunks(source, filename, chunk_size=rows, nrows=rows)))
+
+
+def _present(values):
+    return values.notna() & (values.astype(str).str.strip() != '')
+
+
+def validate(frame):
+    """Apply the validation rules to a chunk whose columns are patient_history fields
+
+    Returns (clean, reasons): clean has typed values, reasons is a string
+    Series that is empty for valid rows. Checks that need the database, such
+    as whether a user_id exists, are left to the caller.
+    """
+    clean = frame.copy()
+    reasons = pd.Series('', index=frame.index, dtype=object)
+
+    def fail(mask, message):
+        reasons[mask] += f"{message}; "
+
+    for field in REQUIRED_FIELDS:
+        if field in clean:
+            fail(~_present(clean[field]), f"missing {field}")
+        else:
+            fail(slice(None), f"missing {field}")
+    for field in NUMERIC_FIELDS:
+        if field in clean:
+            present = _present(clean[field])
+            clean[field] = pd.to_numeric(clean[field], errors='coerce')
+            fail(present & clean[field].isna(), f"{field} is not a number")
+            low, high = INGEST_RULES.get(field, (None, None))
+            fail(clean[field].notna() & ~clean[field].between(
+                float('-inf') if low is None else low, float('inf') if high is None else high),
+                f"{field} out of range")
+            if field in INTEGER_FIELDS:
+                fail(clean[field].notna() & (clean[field] % 1 != 0), f"{field} is not a whole number")
+    if 'height_cm' in clean and 'weight_kg' in clean:
+        computed = clean['weight_kg'] / (clean['height_cm'] / 100) ** 2
+        if 'BMI' in clean:
+            fail((clean['BMI'] - computed).abs() > INGEST_RULES['bmi_tolerance'],
+                 "BMI does not match height and weight")
+            clean['BMI'] = clean['BMI'].fillna(computed.round(2))
+        else:
+            clean['BMI'] = computed.round(2)
+    if 'severity_level' in clean:
+        present = _present(clean['severity_level'])
+        clean['severity_level'] = clean['severity_level'].astype(str).str.strip().str.title().where(present)
+        fail(present & ~clean['severity_level'].isin(SEVERITY_LEVELS),
+             f"severity must be one of {', '.join(SEVERITY_LEVELS)}")
+    for field in DATE_FIELDS:
+        if field in clean:
+            present = _present(clean[field])
+            parsed = pd.to_datetime(clean[field], errors='coerce', format='ISO8601')
+            retry = present & parsed.isna()
+            if retry.any():
+                parsed[retry] = pd.to_datetime(clean[field][retry], errors='coerce', format='mixed')
+            fail(present & parsed.isna(), f"{field} is not a date")
+            clean[field] = parsed.dt.strftime('%Y-%m-%d')
+    return clean, reasons.str.rstrip('; ')
+
+
+def _insert_rows(clean, user_id):
+    """PATIENT_INSERT_COLUMNS tuples for validated rows, with the single-record defaults"""
+    records = pd.DataFrame(index=clean.index)
+    for field in PATIENT_INSERT_COLUMNS:
+        records[field] = clean[field] if field in clean else None
+    records['user_id'] = records['user_id'].fillna(user_id)
+    records['diagnosis_date'] = records['diagnosis_date'].fillna(datetime.now().strftime('%Y-%m-%d'))
+    records['status'] = records['status'].fillna('completed')
+    records = records.astype(object).where(records.notna(), None)
+    for field in ('user_id', 'age'):
+        records[field] = [None if v is None else int(v) for v in records[field]]
+    return list(records.itertuples(index=False, name=None))
+
+
+def ingest_patient_history(source, filename, mapping, user_id, chunk_size=DEFAULT_CHUNK_SIZE,
+                           batch_size=1000, on_progress=None):
+    """Validate and insert an uploaded file's rows; returns a report dict
+
+    mapping is {file column: patient_history field}; other columns are
+    ignored. Records without a mapped user_id belong to user_id. Report
+    keys: rows, inserted, rejected, reject_path (CSV of rejected rows with
+    row number and reason, or None), seconds, rows_per_sec.
+    on_progress(rows_read) is called after every chunk.
+    """
+    fields = list(mapping.values())
+    unknown = [field for field in fields if field not in PATIENT_INSERT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    repeated = sorted({field for field in fields if fields.count(field) > 1})
+    if repeated:
+        raise ValueError(f"More than one column mapped to: {', '.join(repeated)}")
+
+    report = {'rows': 0, 'inserted': 0, 'rejected': 0, 'reject_path': None,
+              'seconds': 0.0, 'rows_per_sec': 0.0}
+    start = time.perf_counter()
+    backend = get_backend()
+    fd, reject_path = tempfile.mkstemp(prefix='wecare_rejects_', suffix='.csv')
+    writer = None
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as reject_file:
+            for chunk in read_chunks(source, filename, chunk_size):
+                # Spreadsheet row numbers: row 1 is the header
+                rows = pd.RangeIndex(report['rows'] + 2, report['rows'] + 2 + len(chunk))
+                chunk.index = rows
+                fields = chunk[[col for col in mapping if col in chunk]].rename(columns=mapping)
+                clean, reasons = validate(fields)
+                if 'user_id' in clean:
+                    # SQLite does not enforce the users foreign key, so check owners here
+                    owners = clean['user_id'][(reasons == '') & clean['user_id'].notna()].astype('int64')
+                    known = backend.existing_user_ids(owners.tolist())
+                    reasons[owners.index[~owners.isin(known)]] = 'user_id does not exist'
+                valid = reasons == ''
+                rejects = [(row, reason) for row, reason in reasons[~valid].items()]
+
+                records = _insert_rows(clean[valid], user_id)
+                result = backend.add_patient_history_bulk(records, user_id, chunk_size=batch_size)
+                report['inserted'] += result['inserted']
+                valid_rows = clean.index[valid]
+                rejects += [(valid_rows[index], message) for index, message in result['errors']]
+
+                if rejects:
+                    if writer is None:
+                        writer = csv.writer(reject_file)
+                        writer.writerow(['row', 'reason'] + list(chunk.columns))
+                    rejects.sort()
+                    raw = chunk.loc[[row for row, _ in rejects]]
+                    raw = raw.astype(object).where(raw.notna(), '')
+                    writer.writerows([row, reason] + list(values)
+                                     for (row, reason), values in zip(rejects, raw.itertuples(index=False)))
+                    report['rejected'] += len(rejects)
+                report['rows'] += len(chunk)
+                if on_progress:
+                    on_progress(report['rows'])
+    except BaseException:
+        os.remove(reject_path)
+        raise
+    finally:
+        query_cache.invalidate('patient_history')
+    if report['rejected']:
+        report['reject_path'] = reject_path
+    else:
+        os.remove(reject_path)
+
+    report['seconds'] = time.perf_counter() - start
+    report['rows_per_sec'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+    return report
@@ -0,0 +1,474 @@
+"""Versioned schema migrations
+
+Each engine has an ordered list of (version, description, steps). A step is
+a SQL string or a callable taking (backend, cursor). migrate() applies every
+version above the one recorded in schema_version, one transaction per
+version where the engine allows it (MySQL commits DDL implicitly), and
+records each version as it lands. Released migrations are never edited;
+schema changes go in a new version.
+"""
+from datetime import date, datetime, time, timedelta
+
+SCHEMA_VERSION_TABLE = '''CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+# MySQL named lock held while migrating, so app servers starting together
+# do not race each other
+MYSQL_LOCK = 'wecare_hms_migrations'
+MYSQL_LOCK_TIMEOUT = 60
+
+# Composite indexes for the hot listing queries: name -> (table, columns)
+INDEXES = {
+    'idx_users_created': ('users', ('created_at', 'user_id')),
+    'idx_patient_history_user_created': ('patient_history', ('user_id', 'created_at')),
+    'idx_patient_history_created': ('patient_history', ('created_at', 'patient_id')),
+    'idx_appointments_user_date': ('appointments', ('user_id', 'appointment_date')),
+    'idx_appointments_date_time': ('appointments', ('appointment_date', 'appointment_time')),
+    'idx_appointments_date_id': ('appointments', ('appointment_date', 'appointment_id')),
+    'idx_patient_history_updated': ('patient_history', ('updated_at', 'patient_id')),
+}
+
+# Indexes added by version 3; later versions add their own
+LISTING_INDEXES = (
+    'idx_users_created', 'idx_patient_history_user_created', 'idx_patient_history_created',
+    'idx_appointments_user_date', 'idx_appointments_date_time', 'idx_appointments_date_id',
+)
+
+# Free-text patient_history columns covered by search_patient_history()
+SEARCH_COLUMNS = ('symptoms', 'medical_history', 'treatment_given', 'medicine_prescribed')
+
+# Queries the listing pages run, with the index each one must seek into. Pages
+# are checked past their first one, with a keyset cursor: an ordered scan
+# serves page one cheaply but every deeper page would cost O(offset).
+HOT_QUERIES = (
+    ('patient history of a user', 'idx_patient_history_user_created',
+     'SELECT * FROM patient_history WHERE user_id = %s ORDER BY created_at DESC', (1,)),
+    ('patient history page', 'idx_patient_history_created',
+     'SELECT * FROM patient_history WHERE created_at <= %s AND (created_at < %s OR patient_id < %s) '
+     'ORDER BY created_at DESC, patient_id DESC LIMIT %s',
+     ('2024-06-01 00:00:00', '2024-06-01 00:00:00', 1000, 51)),
+    ('users page', 'idx_users_created',
+     'SELECT user_id, email, full_name, role, phone, created_at FROM users '
+     'WHERE created_at <= %s AND (created_at < %s OR user_id < %s) '
+     'ORDER BY created_at DESC, user_id DESC LIMIT %s',
+     ('2024-06-01 00:00:00', '2024-06-01 00:00:00', 1000, 51)),
+    ('appointments of a user', 'idx_appointments_user_date',
+     'SELECT * FROM appointments WHERE user_id = %s ORDER BY appointment_date DESC', (1,)),
+    ('appointments by date', 'idx_appointments_date_time',
+     'SELECT * FROM appointments WHERE appointment_date >= %s AND appointment_date < %s '
+     'ORDER BY appointment_date, appointment_time', ('2024-06-01', '2024-06-08')),
+    ('appointments page', 'idx_appointments_date_id',
+     'SELECT * FROM appointments WHERE appointment_date <= %s '
+     'AND (appointment_date < %s OR appointment_id < %s) '
+     'ORDER BY appointment_date DESC, appointment_id DESC LIMIT %s',
+     ('2024-06-01', '2024-06-01', 1000, 51)),
+    ('snapshot changes', 'idx_patient_history_updated',
+     'SELECT * FROM patient_history WHERE updated_at >= %s AND (updated_at > %s OR patient_id > %s) '
+     'AND updated_at <= %s ORDER BY updated_at, patient_id',
+     ('2024-01-01 00:00:00', '2024-01-01 00:00:00', 0, '2024-01-02 00:00:00')),
+)
+
+
+# ---------- SHARED STEPS ----------
+
+# Legacy text formats accepted when converting to DATE/TIME, tried in order
+LEGACY_DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S',
+                       '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y', '%m/%d/%Y',
+                       '%d %B %Y', '%d %b %Y', '%B %d, %Y', '%b %d, %Y')
+LEGACY_TIME_FORMATS = ('%H:%M:%S', '%H:%M', '%I:%M %p', '%I:%M:%S %p', '%I %p', '%H.%M')
+
+
+def _parse_legacy(value, formats, out):
+    """value rewritten as out, from the first of formats that parses it; None if none do"""
+    text = str(value).strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt).strftime(out)
+        except ValueError:
+            continue
+    return None
+
+
+def _normalise(table, key, column, formats, out, required=False):
+    """Step rewriting legacy text in column to ISO form ahead of a DATE/TIME conversion
+
+    Unparseable values become NULL, or, when required (a NOT NULL column),
+    stop the migration with the offending keys instead of letting the
+    conversion fail or keep them. Both engines run the same step, so they
+    convert the same data the same way.
+    """
+    def step(backend, c):
+        c.execute(f"SELECT {key}, {column} FROM {table} WHERE {column} IS NOT NULL")
+        updates, bad = [], []
+        for row in c.fetchall():
+            raw = row[column]
+            if isinstance(raw, (date, time, timedelta)):
+                continue
+            value = _parse_legacy(raw, formats, out)
+            if value is None and required:
+                bad.append(row[key])
+            elif value != raw:
+                updates.append((value, row[key]))
+        if bad:
+            raise RuntimeError(
+                f"Cannot convert {table}.{column}: {len(bad)} values are not in a known format "
+                f"({key} {', '.join(map(str, bad[:20]))}{', ...' if len(bad) > 20 else ''}). "
+                f"Correct them and restart."
+            )
+        if updates:
+            c.executemany(backend.sql(f"UPDATE {table} SET {column} = %s WHERE {key} = %s"), updates)
+    return step
+
+
+# Version 2 preparation, shared by both engines
+NORMALISE_V2 = (
+    _normalise('patient_history', 'patient_id', 'diagnosis_date', LEGACY_DATE_FORMATS, '%Y-%m-%d'),
+    _normalise('patient_history', 'patient_id', 'appointment_date', LEGACY_DATE_FORMATS, '%Y-%m-%d'),
+    _normalise('patient_history', 'patient_id', 'appointment_time', LEGACY_TIME_FORMATS, '%H:%M:%S'),
+    _normalise('patient_history', 'patient_id', 'follow_up_date', LEGACY_DATE_FORMATS, '%Y-%m-%d'),
+    _normalise('appointments', 'appointment_id', 'appointment_date', LEGACY_DATE_FORMATS, '%Y-%m-%d',
+               required=True),
+    _normalise('appointments', 'appointment_id', 'appointment_time', LEGACY_TIME_FORMATS, '%H:%M:%S',
+               required=True),
+)
+
+
+# ---------- MYSQL ----------
+
+def _mysql_add_index(name):
+    """Step creating an index unless it already exists (MySQL has no IF NOT EXISTS)"""
+    table, columns = INDEXES[name]
+
+    def step(backend, c):
+        c.execute(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+            (table, name)
+        )
+        if not c.fetchone():
+            c.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+    return step
+
+
+def _mysql_add_fulltext(backend, c):
+    c.execute(
+        "SELECT 1 FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'patient_history' "
+        "AND index_name = 'ft_patient_history_notes'"
+    )
+    if not c.fetchone():
+        c.execute(f"ALTER TABLE patient_history ADD FULLTEXT INDEX ft_patient_history_notes "
+                  f"({', '.join(SEARCH_COLUMNS)})")
+
+
+MYSQL_MIGRATIONS = (
+    (1, 'baseline tables', (
+        '''CREATE TABLE IF NOT EXISTS users (
+            user_id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            full_name VARCHAR(255) NOT NULL,
+            role VARCHAR(50) DEFAULT 'user',
+            phone VARCHAR(20),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS patient_history (
+            patient_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(255),
+            age INT,
+            gender VARCHAR(50),
+            disease_name VARCHAR(255),
+            symptoms TEXT,
+            severity_level VARCHAR(50),
+            medical_history TEXT,
+            diagnosis_date VARCHAR(50),
+            appointment_id INT,
+            appointment_date VARCHAR(50),
+            appointment_time VARCHAR(50),
+            status VARCHAR(50),
+            visit_type VARCHAR(50),
+            height_cm FLOAT,
+            weight_kg FLOAT,
+            BMI FLOAT,
+            smoking_status VARCHAR(50),
+            exercise_level VARCHAR(50),
+            treatment_given TEXT,
+            medicine_prescribed TEXT,
+            treatment_cost FLOAT,
+            follow_up_date VARCHAR(50),
+            total_amount FLOAT,
+            insurance_used VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id),
+            INDEX(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS appointments (
+            appointment_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            appointment_date VARCHAR(50) NOT NULL,
+            appointment_time VARCHAR(50) NOT NULL,
+            status VARCHAR(50) DEFAULT 'pending',
+            admin_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id),
+            INDEX(user_id)
+        )''',
+    )),
+    # Values are normalised first so the ALTERs cannot fail in strict mode
+    (2, 'DATE/TIME types for visit and appointment dates', NORMALISE_V2 + (
+        '''ALTER TABLE patient_history
+            MODIFY diagnosis_date DATE,
+            MODIFY appointment_date DATE,
+            MODIFY appointment_time TIME,
+            MODIFY follow_up_date DATE''',
+        '''ALTER TABLE appointments
+            MODIFY appointment_date DATE NOT NULL,
+            MODIFY appointment_time TIME NOT NULL''',
+    )),
+    (3, 'composite indexes for listing queries', tuple(_mysql_add_index(name) for name in LISTING_INDEXES)),
+    (4, 'full-text index on visit notes', (_mysql_add_fulltext,)),
+    # updated_at already has ON UPDATE CURRENT_TIMESTAMP
+    (5, 'change-tracking index for snapshots', (_mysql_add_index('idx_patient_history_updated'),)),
+)
+
+
+# ---------- SQLITE ----------
+
+# SQLite cannot change a column type in place, so version 2 rebuilds both
+# tables after the same NORMALISE_V2 steps as MySQL; date()/time() then
+# only see ISO text or NULL.
+SQLITE_PATIENT_HISTORY_V2 = '''CREATE TABLE patient_history_v2 (
+    patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT,
+    age INTEGER,
+    gender TEXT,
+    disease_name TEXT,
+    symptoms TEXT,
+    severity_level TEXT,
+    medical_history TEXT,
+    diagnosis_date DATE,
+    appointment_id INTEGER,
+    appointment_date DATE,
+    appointment_time TIME,
+    status TEXT,
+    visit_type TEXT,
+    height_cm REAL,
+    weight_kg REAL,
+    BMI REAL,
+    smoking_status TEXT,
+    exercise_level TEXT,
+    treatment_given TEXT,
+    medicine_prescribed TEXT,
+    treatment_cost REAL,
+    follow_up_date DATE,
+    total_amount REAL,
+    insurance_used TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(user_id) REFERENCES users(user_id)
+)'''
+
+SQLITE_APPOINTMENTS_V2 = '''CREATE TABLE appointments_v2 (
+    appointment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    appointment_date DATE NOT NULL,
+    appointment_time TIME NOT NULL,
+    status TEXT DEFAULT 'pending',
+    admin_notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(user_id) REFERENCES users(user_id)
+)'''
+
+SQLITE_MIGRATIONS = (
+    (1, 'baseline tables', (
+        '''CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            full_name TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS patient_history (
+            patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT,
+            age INTEGER,
+            gender TEXT,
+            disease_name TEXT,
+            symptoms TEXT,
+            severity_level TEXT,
+            medical_history TEXT,
+            diagnosis_date TEXT,
+            appointment_id INTEGER,
+            appointment_date TEXT,
+            appointment_time TEXT,
+            status TEXT,
+            visit_type TEXT,
+            height_cm REAL,
+            weight_kg REAL,
+            BMI REAL,
+            smoking_status TEXT,
+            exercise_level TEXT,
+            treatment_given TEXT,
+            medicine_prescribed TEXT,
+            treatment_cost REAL,
+            follow_up_date TEXT,
+            total_amount REAL,
+            insurance_used TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_patient_history_user_id ON patient_history(user_id)',
+        '''CREATE TABLE IF NOT EXISTS appointments (
+            appointment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            appointment_date TEXT NOT NULL,
+            appointment_time TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            admin_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_appointments_user_id ON appointments(user_id)',
+    )),
+    (2, 'DATE/TIME types for visit and appointment dates', NORMALISE_V2 + (
+        SQLITE_PATIENT_HISTORY_V2,
+        '''INSERT INTO patient_history_v2 SELECT
+            patient_id, user_id, name, age, gender, disease_name, symptoms,
+            severity_level, medical_history, date(diagnosis_date), appointment_id,
+            date(appointment_date), time(appointment_time), status, visit_type,
+            height_cm, weight_kg, BMI, smoking_status, exercise_level,
+            treatment_given, medicine_prescribed, treatment_cost, date(follow_up_date),
+            total_amount, insurance_used, created_at, updated_at
+        FROM patient_history''',
+        'DROP TABLE patient_history',
+        'ALTER TABLE patient_history_v2 RENAME TO patient_history',
+        'CREATE INDEX idx_patient_history_user_id ON patient_history(user_id)',
+        SQLITE_APPOINTMENTS_V2,
+        '''INSERT INTO appointments_v2 SELECT
+            appointment_id, user_id,
+            date(appointment_date), time(appointment_time),
+            status, admin_notes, created_at
+        FROM appointments''',
+        'DROP TABLE appointments',
+        'ALTER TABLE appointments_v2 RENAME TO appointments',
+        'CREATE INDEX idx_appointments_user_id ON appointments(user_id)',
+    )),
+    (3, 'composite indexes for listing queries', tuple(
+        f"CREATE INDEX IF NOT EXISTS {name} ON {INDEXES[name][0]} ({', '.join(INDEXES[name][1])})"
+        for name in LISTING_INDEXES
+    ) + ('ANALYZE',)),
+    (4, 'full-text index on visit notes', (
+        # External-content FTS5 table: stores only the index, rows stay in patient_history
+        f'''CREATE VIRTUAL TABLE patient_history_fts USING fts5(
+            {', '.join(SEARCH_COLUMNS)},
+            content='patient_history', content_rowid='patient_id',
+            tokenize='porter unicode61', prefix='2 3'
+        )''',
+        f'''CREATE TRIGGER patient_history_fts_insert AFTER INSERT ON patient_history BEGIN
+            INSERT INTO patient_history_fts (rowid, {', '.join(SEARCH_COLUMNS)})
+            VALUES (new.patient_id, {', '.join('new.' + col for col in SEARCH_COLUMNS)});
+        END''',
+        f'''CREATE TRIGGER patient_history_fts_delete AFTER DELETE ON patient_history BEGIN
+            INSERT INTO patient_history_fts (patient_history_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+            VALUES ('delete', old.patient_id, {', '.join('old.' + col for col in SEARCH_COLUMNS)});
+        END''',
+        f'''CREATE TRIGGER patient_history_fts_update AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)}
+            ON patient_history BEGIN
+            INSERT INTO patient_history_fts (patient_history_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+            VALUES ('delete', old.patient_id, {', '.join('old.' + col for col in SEARCH_COLUMNS)});
+            INSERT INTO patient_history_fts (rowid, {', '.join(SEARCH_COLUMNS)})
+            VALUES (new.patient_id, {', '.join('new.' + col for col in SEARCH_COLUMNS)});
+        END''',
+        "INSERT INTO patient_history_fts (patient_history_fts) VALUES ('rebuild')",
+    )),
+    (5, 'change-tracking index for snapshots', (
+        'CREATE INDEX IF NOT EXISTS idx_patient_history_updated ON patient_history (updated_at, patient_id)',
+        # SQLite has no ON UPDATE CURRENT_TIMESTAMP; bump updated_at unless the UPDATE set it
+        '''CREATE TRIGGER patient_history_touch AFTER UPDATE ON patient_history
+            WHEN new.updated_at IS old.updated_at BEGIN
+            UPDATE patient_history SET updated_at = CURRENT_TIMESTAMP WHERE patient_id = new.patient_id;
+        END''',
+        'ANALYZE',
+    )),
+)
+
+MIGRATIONS = {
+    'mysql': MYSQL_MIGRATIONS,
+    'sqlite': SQLITE_MIGRATIONS,
+}
+
+
+# ---------- RUNNER ----------
+
+def current_version(c):
+    """Highest applied version, or 0 for a fresh database"""
+    c.execute('SELECT MAX(version) AS version FROM schema_version')
+    row = c.fetchone()
+    return (row['version'] if row else None) or 0
+
+
+def _begin(backend, c):
+    if backend.name == 'sqlite':
+        # Take the write lock up front so a concurrent starter waits here
+        c.execute('BEGIN IMMEDIATE')
+
+
+def migrate(backend, target=None):
+    """Apply pending migrations up to target (default: latest); returns applied versions"""
+    migrations = MIGRATIONS[backend.name]
+    target = migrations[-1][0] if target is None else target
+    applied = []
+    with backend.connection() as conn:
+        c = conn.cursor()
+        c.execute(SCHEMA_VERSION_TABLE)
+        conn.commit()
+        if backend.name == 'mysql':
+            c.execute('SELECT GET_LOCK(%s, %s) AS locked', (MYSQL_LOCK, MYSQL_LOCK_TIMEOUT))
+            if not c.fetchone()['locked']:
+                raise RuntimeError("Timed out waiting for another process to finish migrating")
+        try:
+            for version, description, steps in migrations:
+                if version > target:
+                    break
+                _begin(backend, c)
+                # Re-read under the lock: another process may have just migrated
+                if version <= current_version(c):
+                    conn.rollback()
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(backend, c)
+                    else:
+                        c.execute(step)
+                c.execute(backend.sql('INSERT INTO schema_version (version, description) VALUES (%s, %s)'),
+                          (version, description))
+                conn.commit()
+                applied.append(version)
+        finally:
+            if backend.name == 'mysql':
+                c.execute('SELECT RELEASE_LOCK(%s)', (MYSQL_LOCK,))
+                c.fetchall()
+    return applied
+
+
+def check_hot_queries(backend):
+    """EXPLAIN each HOT_QUERIES entry; returns [(label, index, seeks, plan)]
+
+    seeks is True when the plan looks rows up through index (SEARCH on
+    SQLite, a const/ref/range access on MySQL), not merely scans it.
+    """
+    results = []
+    for label, index, sql, params in HOT_QUERIES:
+        plan = backend.explain(sql, params)
+        results.append((label, index, backend.plan_reads_range(plan, index), plan))
+    return results
@@ -0,0 +1,183 @@
+"""Versioned, salted password hashing
+
+Stored formats:
+    scrypt$<log2_n>$<r>$<p>$<salt>$<hash>      current scheme
+    pbkdf2_sha256$<iterations>$<salt>$<hash>   fallback without OpenSSL scrypt
+    <64 hex chars>                             legacy unsalted SHA-256
+
+Salt and hash are URL-safe base64. The cost is calibrated once per process
+so that one hash takes roughly TARGET_MS on this machine, and verification
+runs in a small bounded thread pool (hashlib releases the GIL while hashing).
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Target time for one hash on this machine, in milliseconds
+TARGET_MS = 100
+
+# Concurrent hashes allowed; more logins queue, up to MAX_PENDING
+WORKERS = 4
+MAX_PENDING = 64
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# Cost floors; calibration only ever raises these
+SCRYPT_MIN_LOG2_N = 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_MIN_ITERATIONS = 200000
+
+SCHEME = 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256'
+
+_cost = {'scrypt': SCRYPT_MIN_LOG2_N, 'pbkdf2_sha256': PBKDF2_MIN_ITERATIONS}
+_calibrated = False
+_calibrate_lock = threading.Lock()
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='password-kdf')
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already queued"""
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, log2_n, r, p):
+    n = 1 << log2_n
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + (1 << 20), dklen=HASH_BYTES)
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=HASH_BYTES)
+
+
+def _timed_ms(fn, *args, runs=3):
+    """Fastest of runs calls of fn, in milliseconds; the minimum filters out scheduling noise"""
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def calibrate(target_ms=TARGET_MS, force=False):
+    """Raise the cost until one hash takes about target_ms; returns the cost
+
+    Runs once per process: later calls return the chosen cost unless force
+    is set, so every hash and needs_rehash check in a process agree.
+    """
+    global _calibrated
+    with _calibrate_lock:
+        if _calibrated and not force:
+            return _cost[SCHEME]
+        salt = os.urandom(SALT_BYTES)
+        if SCHEME == 'scrypt':
+            log2_n = SCRYPT_MIN_LOG2_N
+            while log2_n < 20:
+                elapsed_ms = _timed_ms(_scrypt, 'calibration', salt, log2_n, SCRYPT_R, SCRYPT_P)
+                # Each step doubles the work; stop before overshooting by 2x
+                if elapsed_ms * 2 > target_ms * 1.5:
+                    break
+                log2_n += 1
+            _cost['scrypt'] = log2_n
+        else:
+            probe = 50000
+            per_iteration_ms = _timed_ms(_pbkdf2, 'calibration', salt, probe) / probe
+            _cost['pbkdf2_sha256'] = max(PBKDF2_MIN_ITERATIONS, int(target_ms / per_iteration_ms))
+        _calibrated = True
+        return _cost[SCHEME]
+
+
+def current_cost():
+    """Cost parameter new hashes use, calibrating on first call"""
+    if not _calibrated:
+        calibrate()
+    return _cost[SCHEME]
+
+
+def _hash_now(password):
+    salt = os.urandom(SALT_BYTES)
+    if SCHEME == 'scrypt':
+        log2_n = current_cost()
+        digest = _scrypt(password, salt, log2_n, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${log2_n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+    iterations = current_cost()
+    digest = _pbkdf2(password, salt, iterations)
+    return f"pbkdf2_sha256${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def _verify_now(password, stored):
+    """(matches, needs_rehash) for a stored hash in any supported format
+
+    A malformed hash never matches.
+    """
+    try:
+        return _verify_parsed(password, stored)
+    except (ValueError, TypeError):
+        # Bad numbers or base64, or cost parameters scrypt rejects
+        return False, False
+
+
+def _verify_parsed(password, stored):
+    parts = stored.split('$')
+    if parts[0] == 'scrypt' and len(parts) == 6:
+        log2_n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        digest = _scrypt(password, _unb64(parts[4]), log2_n, r, p)
+        matches = hmac.compare_digest(digest, _unb64(parts[5]))
+        return matches, SCHEME != 'scrypt' or log2_n < current_cost() or r != SCRYPT_R or p != SCRYPT_P
+    if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+        iterations = int(parts[1])
+        digest = _pbkdf2(password, _unb64(parts[2]), iterations)
+        matches = hmac.compare_digest(digest, _unb64(parts[3]))
+        return matches, SCHEME != 'pbkdf2_sha256' or iterations < current_cost()
+    if len(stored) == 64:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored.lower()), True
+    return False, False
+
+
+def _run(fn, *args):
+    """Run fn on the KDF pool, refusing work when MAX_PENDING is reached"""
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy("Too many concurrent logins, please retry")
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    """Salted KDF hash of password in the current versioned format"""
+    return _run(_hash_now, password)
+
+
+def hash_many(passwords, workers=None):
+    """Hash a batch of passwords in parallel, preserving order
+
+    Uses its own pool so bulk provisioning never queues ahead of logins.
+    """
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or WORKERS,
+                            thread_name_prefix='password-bulk') as pool:
+        return list(pool.map(_hash_now, passwords))
+
+
+def verify_password(password, stored):
+    """Check password against a stored hash; returns (matches, needs_rehash)"""
+    if not stored:
+        return False, False
+    return _run(_verify_now, password, stored)
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def freeze(value):
+    """Hashable form of a cache-key argument (lists, dicts and sets included)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(v) for v in value))
+    return value
+
+
+class _Flight:
+    """A load in progress that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryCache:
+    """Process-wide TTL + LRU cache for read results
+
+    Entries are tagged with the tables they read and dropped when any of those
+    tables is invalidated. Concurrent misses on the same key share one load.
+    Cached values are shared between sessions and must not be mutated.
+    """
+
+    def __init__(self, max_entries=512, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, tables, value)
+        self._flights = {}              # key -> _Flight
+        self._generations = {}          # table -> write counter
+        self._epoch = 0                 # bumped by clear()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def _generation(self, tables):
+        return (self._epoch,) + tuple(self._generations.get(t, 0) for t in tables)
+
+    def get_or_load(self, key, loader, tables=(), ttl=None):
+        """Return the cached value for key, calling loader() once on a miss"""
+        tables = tuple(tables)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[2]
+                del self._entries[key]
+                self._stats['expirations'] += 1
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self._stats['misses'] += 1
+                leader = True
+                generation = self._generation(tables)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # Skip storing if a write landed while we were loading
+                if flight.error is None and self._generation(tables) == generation:
+                    expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+                    self._entries[key] = (expires_at, tables, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self._stats['evictions'] += 1
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, *tables):
+        """Drop every entry that read any of tables"""
+        tables = set(tables)
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [key for key, (_, tagged, _) in self._entries.items() if tables.intersection(tagged)]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+
+    def stats(self):
+        """Hit/miss counters, current size and hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
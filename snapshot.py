@@ -0,0 +1,293 @@
+"""Incremental Parquet snapshot of patient_history for analytics
+
+Layout under SNAPSHOT_DIR (Hive-style partitions, readable by any Parquet
+tool):
+    diagnosis_month=2024-05/part-<run>-<n>.parquet
+    _state.json                 watermark and source database
+
+Each export run reads only rows whose (updated_at, patient_id) is past the
+watermark and appends them as new files to their month's partition. The
+month is that of diagnosis_date, or created_at when it is missing. A row
+that changes is appended again, so readers keep the newest copy of each
+patient_id. After an export, the partitions it wrote to and those with many
+files are compacted: one that has many files or holds superseded copies is
+rewritten as one file of current rows. Other partitions are not read, so an
+old copy left behind when a visit's month changes stays until
+compact_snapshot(). Deleted rows are only dropped by a full rebuild
+(export_snapshot(full=True)).
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+from storage import PATIENT_HISTORY_COLUMNS
+
+SNAPSHOT_DIR = os.environ.get('WECARE_SNAPSHOT_DIR', 'snapshots/patient_history')
+SNAPSHOT_FORMAT = 1
+STATE_FILE = '_state.json'    # Leading underscore: Parquet readers skip it
+PARTITION_COLUMN = 'diagnosis_month'
+
+SNAPSHOT_CONFIG = {
+    'chunk_size': 50000,      # Rows fetched and written per batch
+    'lag': 2,                 # Seconds; newer changes wait for the next run so in-flight writes are not skipped
+    'compact_min_files': 8,   # Partitions with at least this many files are compacted after an export
+}
+
+# Watermark before the first export
+EPOCH = ('1970-01-01 00:00:00', 0)
+
+_ARROW_TYPES = {
+    'Int64': pa.int64(),
+    'Int16': pa.int16(),
+    'float32': pa.float32(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'string': pa.string(),
+}
+
+# One fixed schema for every file, so chunks whose columns happen to be all-null still line up
+SCHEMA = pa.schema([
+    (col, pa.timestamp('us') if dtype.startswith('datetime') else _ARROW_TYPES[dtype])
+    for col, dtype in ((col, database.PATIENT_HISTORY_DTYPES.get(col, 'string'))
+                       for col in PATIENT_HISTORY_COLUMNS)
+])
+
+CHANGES_SQL = (
+    f"SELECT {', '.join(PATIENT_HISTORY_COLUMNS)} FROM patient_history "
+    "WHERE updated_at >= %s AND (updated_at > %s OR patient_id > %s) AND updated_at <= %s "
+    "ORDER BY updated_at, patient_id"
+)
+
+_lock = threading.Lock()
+
+
+def load_state(path=SNAPSHOT_DIR):
+    """Saved snapshot state, or None if there is no usable snapshot at path"""
+    try:
+        with open(os.path.join(path, STATE_FILE), encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get('format') == SNAPSHOT_FORMAT else None
+
+
+def _save_state(path, state):
+    tmp = os.path.join(path, f".{STATE_FILE}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, os.path.join(path, STATE_FILE))
+
+
+def _partition_files(path):
+    """{partition directory: [parquet files]} of a snapshot"""
+    partitions = {}
+    for file in sorted(glob.glob(os.path.join(path, f"{PARTITION_COLUMN}=*", 'part-*.parquet'))):
+        partitions.setdefault(os.path.dirname(file), []).append(file)
+    return partitions
+
+
+def _clear(path):
+    """Remove snapshot files only, never anything else that lives under path"""
+    for files in _partition_files(path).values():
+        for file in files:
+            os.remove(file)
+    for directory in glob.glob(os.path.join(path, f"{PARTITION_COLUMN}=*")):
+        if not os.listdir(directory):
+            os.rmdir(directory)
+    if os.path.exists(os.path.join(path, STATE_FILE)):
+        os.remove(os.path.join(path, STATE_FILE))
+
+
+def _write(frame, directory, name):
+    """Write frame as directory/name, atomically (readers ignore dot-files)"""
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False), tmp)
+    os.replace(tmp, os.path.join(directory, name))
+
+
+def _months(frame):
+    """Partition value per row: diagnosis month, else month created, else 'unknown'"""
+    dates = frame['diagnosis_date'].fillna(frame['created_at'])
+    return dates.dt.strftime('%Y-%m').fillna('unknown')
+
+
+def _cutoff(backend, lag):
+    """Database clock minus lag, as a timestamp literal both engines compare correctly"""
+    now = backend.query_one('SELECT CURRENT_TIMESTAMP AS now')['now']
+    if isinstance(now, str):
+        now = datetime.datetime.fromisoformat(now)
+    return (now - datetime.timedelta(seconds=lag)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def export_snapshot(path=SNAPSHOT_DIR, full=False, chunk_size=None, lag=None, compact=True):
+    """Append rows changed since the last run to the snapshot; returns a report dict
+
+    Starts over when full is set, when there is no snapshot yet, or when the
+    snapshot was taken from another database. Report keys: rows, files,
+    partitions, compacted, watermark, full, seconds.
+    """
+    chunk_size = chunk_size or SNAPSHOT_CONFIG['chunk_size']
+    lag = SNAPSHOT_CONFIG['lag'] if lag is None else lag
+    start = time.perf_counter()
+    with _lock:
+        state = load_state(path)
+        source = database.database_source()
+        if full or state is None or state.get('source') != source:
+            _clear(path)
+            state = {'format': SNAPSHOT_FORMAT, 'source': source, 'watermark': list(EPOCH)}
+            full = True
+        os.makedirs(path, exist_ok=True)
+
+        backend = database.get_backend()
+        last_ts, last_id = state['watermark']
+        run = f"{time.time_ns():x}"
+        report = {'rows': 0, 'files': 0, 'partitions': set(), 'compacted': 0}
+        for _, rows in backend.stream(CHANGES_SQL, (last_ts, last_ts, last_id, _cutoff(backend, lag)),
+                                      chunk_size):
+            frame = database.typed_frame((rows,), PATIENT_HISTORY_COLUMNS)
+            for month, part in frame.groupby(_months(frame), sort=False):
+                directory = os.path.join(path, f"{PARTITION_COLUMN}={month}")
+                _write(part, directory, f"part-{run}-{report['files']:05d}.parquet")
+                report['files'] += 1
+                report['partitions'].add(month)
+            report['rows'] += len(rows)
+            # Saved per chunk: a crash re-exports at most one chunk, and readers drop the repeats
+            last = rows[-1]
+            state['watermark'] = [str(last[PATIENT_HISTORY_COLUMNS.index('updated_at')]),
+                                  last[PATIENT_HISTORY_COLUMNS.index('patient_id')]]
+            _save_state(path, state)
+        state['exported_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        _save_state(path, state)
+
+        if compact:
+            written = {os.path.join(path, f"{PARTITION_COLUMN}={month}") for month in report['partitions']}
+            report['compacted'] = _compact(path, SNAPSHOT_CONFIG['compact_min_files'], written)
+    database.query_cache.invalidate('patient_history_snapshot')
+    report.update(partitions=sorted(report['partitions']), watermark=tuple(state['watermark']),
+                  full=full, seconds=time.perf_counter() - start)
+    return report
+
+
+def _latest(frame):
+    """Newest copy of each patient_id in frame"""
+    if not frame['patient_id'].duplicated().any():
+        return frame
+    return frame.sort_values(['updated_at', 'patient_id'], kind='stable').drop_duplicates(
+        'patient_id', keep='last')
+
+
+def _newest_versions(path):
+    """updated_at of the newest copy of each patient_id, from two narrow columns of every file"""
+    index = pd.read_parquet(path, columns=['patient_id', 'updated_at'], engine='pyarrow')
+    return index.groupby('patient_id')['updated_at'].max()
+
+
+def _current(frame, newest):
+    """Rows of frame that are the newest copy of their visit"""
+    frame = _latest(frame)
+    return frame[frame['updated_at'].values == newest.reindex(frame['patient_id']).values]
+
+
+def _compact(path, min_files, written=None):
+    """Rewrite partitions with at least min_files files, or with superseded rows, as one file each
+
+    When written is given, only those partition directories and the ones
+    with at least min_files files are considered. Superseded rows are found
+    from the patient_id/updated_at columns of the considered partitions;
+    full files are read only for partitions that get rewritten. Returns the
+    number of partitions rewritten.
+    """
+    partitions = _partition_files(path)
+    if written is not None:
+        partitions = {directory: files for directory, files in partitions.items()
+                      if directory in written or len(files) >= min_files}
+    if not partitions:
+        return 0
+    # A visit whose diagnosis month changed leaves its old copy in another partition
+    index = {directory: pd.concat([pd.read_parquet(file, columns=['patient_id', 'updated_at'])
+                                   for file in files], ignore_index=True)
+             for directory, files in partitions.items()}
+    newest = pd.concat(index.values(), ignore_index=True).groupby('patient_id')['updated_at'].max()
+    rewritten = 0
+    run = f"{time.time_ns():x}"
+    for directory, files in partitions.items():
+        keys = index[directory]
+        superseded = keys['patient_id'].duplicated().any() or (
+            keys['updated_at'].values != newest.reindex(keys['patient_id']).values).any()
+        if len(files) < min_files and not superseded:
+            continue
+        current = _current(pd.concat([pd.read_parquet(file) for file in files], ignore_index=True), newest)
+        if len(current):
+            _write(current[list(PATIENT_HISTORY_COLUMNS)], directory, f"part-{run}-compact.parquet")
+        for file in files:
+            os.remove(file)
+        if not os.listdir(directory):
+            os.rmdir(directory)
+        rewritten += 1
+    return rewritten
+
+def compact_snapshot(path=SNAPSHOT_DIR, min_files=2):
+    """Compact every partition with at least min_files files or superseded rows; returns partitions compacted"""
+    with _lock:
+        compacted = _compact(path, min_files)
+    database.query_cache.invalidate('patient_history_snapshot')
+    return compacted
+
+
+def read_snapshot(columns=None, months=None, path=SNAPSHOT_DIR):
+    """Newest copy of every snapshotted visit, reading only the requested columns
+
+    columns may include 'diagnosis_month'. months is an inclusive
+    ('YYYY-MM', 'YYYY-MM') range; partitions outside it are not read.
+    Raises FileNotFoundError if there is no snapshot at path.
+    """
+    if load_state(path) is None:
+        raise FileNotFoundError(f"No snapshot at {path}")
+    columns = list(columns or PATIENT_HISTORY_COLUMNS)
+    read = list(dict.fromkeys(columns + ['patient_id', 'updated_at']))
+    filters = None
+    if months:
+        filters = [(PARTITION_COLUMN, '>=', months[0]), (PARTITION_COLUMN, '<=', months[1])]
+    if not _partition_files(path):
+        frame = pd.DataFrame({col: pd.Series(dtype=database.PATIENT_HISTORY_DTYPES.get(col, 'string'))
+                              for col in read})
+    else:
+        frame = pd.read_parquet(path, columns=read, filters=filters, engine='pyarrow')
+        # Newer copies of these visits may sit in partitions the filter skipped
+        frame = _current(frame, _newest_versions(path)) if months else _latest(frame)
+    return frame[columns].reset_index(drop=True)
+
+
+def cached_read_snapshot(columns=None, months=None, path=SNAPSHOT_DIR):
+    """read_snapshot() through the shared query cache; exports invalidate it"""
+    key = ('snapshot', path, tuple(columns or ()), tuple(months or ()))
+    return database.query_cache.get_or_load(key, lambda: read_snapshot(columns, months, path),
+                                            ('patient_history_snapshot',))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the patient_history Parquet snapshot')
+    parser.add_argument('--path', default=SNAPSHOT_DIR)
+    parser.add_argument('--full', action='store_true', help='rebuild from scratch')
+    parser.add_argument('--compact', action='store_true', help='compact every multi-file partition')
+    args = parser.parse_args()
+    if args.compact:
+        print(f"Compacted {compact_snapshot(args.path)} partitions")
+        return
+    report = export_snapshot(args.path, full=args.full)
+    print(f"{'Rebuilt' if report['full'] else 'Updated'} snapshot: {report['rows']:,} rows, "
+          f"{report['files']} files, {report['compacted']} partitions compacted, "
+          f"watermark {report['watermark']} ({report['seconds']:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import itertools
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+# SQLite tuning applied to every connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # Readers no longer block the single writer
+    'synchronous': 'NORMAL',    # Safe with WAL, avoids an fsync per commit
+    'cache_size': -16000,       # Page cache size in KiB (negative = KiB)
+    'mmap_size': 268435456,     # Map up to 256 MB of the file into memory
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,       # Milliseconds to wait on a locked database
+}
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class SQLiteConnectionManager:
+    """Keeps one long-lived, tuned SQLite connection per live thread
+
+    A thread's connection is closed once the thread has exited: when its
+    Thread object is collected, or at the next checkout by any thread,
+    whichever comes first. Streamlit runs every rerun on a new thread, so
+    connections must not outlive their thread.
+    """
+
+    def __init__(self, path, pragmas=None, cached_statements=256, row_factory=None):
+        self.path = path
+        self.row_factory = row_factory
+        self.pragmas = dict(SQLITE_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}    # key -> (weakref to owning thread, conn)
+        self._keys = itertools.count()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.pragmas.get('busy_timeout', 5000) / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if self.row_factory:
+            conn.row_factory = self.row_factory
+        return conn
+
+    def _discard(self, key):
+        with self._lock:
+            entry = self._connections.pop(key, None)
+        if entry is not None:
+            _close_quietly(entry[1])
+
+    def _prune(self):
+        """Close the connections of threads that have exited"""
+        with self._lock:
+            dead = [key for key, (thread, _) in self._connections.items()
+                    if thread() is None or not thread().is_alive()]
+            closing = [self._connections.pop(key)[1] for key in dead]
+        for conn in closing:
+            _close_quietly(conn)
+
+    def open_connections(self):
+        """Number of connections currently open"""
+        with self._lock:
+            return len(self._connections)
+
+    def get(self):
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self._prune()
+            conn = self._open()
+            thread = threading.current_thread()
+            with self._lock:
+                key = next(self._keys)
+                self._connections[key] = (weakref.ref(thread), conn)
+            weakref.finalize(thread, self._discard, key)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Use this thread's connection; open transactions are rolled back on errors"""
+        conn = self.get()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+
+    def close_all(self):
+        """Close every connection opened by this manager"""
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for _, conn in connections.values():
+            _close_quietly(conn)
+        self._local = threading.local()
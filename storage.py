@@ -0,0 +1,816 @@
+"""Storage backends for WeCare HMS
+
+Both engines implement the same repository API and return rows as plain
+dicts keyed by column name, so page code never depends on the engine.
+SQL is written once with %s placeholders; the SQLite backend rewrites
+them to ?.
+"""
+import re
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from connection_pool import ConnectionPool
+from migrations import SEARCH_COLUMNS, migrate
+from sqlite_connection import SQLiteConnectionManager
+
+USER_COLUMNS = ('user_id', 'email', 'full_name', 'role', 'phone', 'created_at')
+
+PATIENT_HISTORY_COLUMNS = (
+    'patient_id', 'user_id', 'name', 'age', 'gender', 'disease_name', 'symptoms',
+    'severity_level', 'medical_history', 'diagnosis_date', 'appointment_id',
+    'appointment_date', 'appointment_time', 'status', 'visit_type', 'height_cm',
+    'weight_kg', 'BMI', 'smoking_status', 'exercise_level', 'treatment_given',
+    'medicine_prescribed', 'treatment_cost', 'follow_up_date', 'total_amount',
+    'insurance_used', 'created_at', 'updated_at',
+)
+
+PATIENT_INSERT_COLUMNS = (
+    'user_id', 'name', 'age', 'gender', 'disease_name', 'symptoms', 'severity_level',
+    'medical_history', 'diagnosis_date', 'height_cm', 'weight_kg', 'BMI',
+    'smoking_status', 'exercise_level', 'treatment_given', 'medicine_prescribed',
+    'treatment_cost', 'follow_up_date', 'total_amount', 'insurance_used', 'status',
+)
+
+APPOINTMENT_INSERT_COLUMNS = ('user_id', 'appointment_date', 'appointment_time', 'status', 'admin_notes')
+
+APPOINTMENT_COLUMNS = ('appointment_id',) + APPOINTMENT_INSERT_COLUMNS + ('created_at',)
+
+# Columns returned with every search hit, besides snippet and score
+SEARCH_RESULT_COLUMNS = ('patient_id', 'user_id', 'name', 'disease_name', 'diagnosis_date', 'status')
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_SEARCH_PAGE_SIZE = 20
+
+# BM25 scores every candidate it ranks, so SQLite ranks matches in windows of
+# this many, newest first: best first within a window, and every window is
+# exhausted before older matches are shown. Older strong matches come after
+# newer weak ones, but no page scores more than a window or two.
+SEARCH_RANK_WINDOW = 2000
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_STREAM_CHUNK = 50000
+
+# Tables the admin data grid can browse
+GRID_TABLES = {
+    # table: key column, columns that can be shown, sorted and filtered, columns the search box matches
+    'users': {'key': 'user_id', 'columns': USER_COLUMNS, 'search': ('email', 'full_name', 'phone')},
+    'appointments': {'key': 'appointment_id', 'columns': APPOINTMENT_COLUMNS,
+                     'search': ('status', 'admin_notes')},
+    'patient_history': {'key': 'patient_id', 'columns': PATIENT_HISTORY_COLUMNS,
+                        'search': ('name', 'disease_name')},
+}
+
+# Grid counts are exact up to this many rows, estimated beyond it
+GRID_COUNT_LIMIT = 10000
+
+# Admin dashboard counts in a single statement: one scan of appointments for every status tile
+DASHBOARD_COUNTS_SQL = (
+    "SELECT (SELECT COUNT(*) FROM users) AS users, COUNT(*) AS appointments, "
+    "COALESCE(SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0) AS pending, "
+    "COALESCE(SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), 0) AS completed "
+    "FROM appointments"
+)
+
+DEFAULT_ACCOUNTS = (
+    # email, password, full_name, role
+    ('admin@wecare.com', 'admin123', 'Admin User', 'admin'),
+    ('user@wecare.com', 'user123', 'Test User', 'user'),
+)
+
+
+# EXPLAIN access types that look rows up through an index instead of scanning it
+MYSQL_RANGE_ACCESS = ('const', 'eq_ref', 'ref', 'ref_or_null', 'range')
+
+
+class IntegrityError(Exception):
+    """Raised when a write violates a unique or foreign key constraint"""
+
+
+def _date_range_filters(column, date_from=None, date_to=None):
+    """Inclusive date range on column as keyset_page filters"""
+    filters = []
+    if date_from:
+        filters.append((f"{column} >= %s", (str(date_from),)))
+    if date_to:
+        if isinstance(date_to, str):
+            date_to = date.fromisoformat(date_to)
+        filters.append((f"{column} < %s", (str(date_to + timedelta(days=1)),)))
+    return filters
+
+
+def _where(filters):
+    """WHERE clause and parameters from (sql_fragment, params) pairs"""
+    clauses, params = [], []
+    for fragment, values in filters:
+        clauses.append(fragment)
+        params.extend(values)
+    return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def _keyset_segments(order_col, key_col, after, descending=True, nullable=False):
+    """Filters for the rows past cursor after=(order value, key), in (order_col, key_col) order
+
+    Each filter opens with a plain bound on order_col, so engines read it as
+    an index range instead of scanning from the top of the index. Both
+    engines sort NULLs first ascending and last descending; for a nullable
+    order_col the NULL rows are a separate segment, read after (descending)
+    or before (ascending) the others. None means no filter.
+    """
+    if after is None:
+        return [None]
+    last_order, last_key = after
+    op = '<' if descending else '>'
+    if last_order is None:
+        nulls = (f"{order_col} IS NULL AND {key_col} {op} %s", (last_key,))
+        return [nulls] if descending else [nulls, (f"{order_col} IS NOT NULL", ())]
+    past = (f"{order_col} {op}= %s AND ({order_col} {op} %s OR {key_col} {op} %s)",
+            (last_order, last_order, last_key))
+    if nullable and descending:
+        return [past, (f"{order_col} IS NULL", ())]
+    return [past]
+
+
+def patient_projection(columns=None, required=()):
+    """Validated SELECT list for patient_history; None means every column"""
+    if columns is None:
+        return '*'
+    unknown = [col for col in columns if col not in PATIENT_HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown patient_history columns: {', '.join(unknown)}")
+    selected = list(dict.fromkeys(list(columns) + list(required)))
+    return ', '.join(selected)
+
+
+def search_terms(text, min_length=1):
+    """Lower-cased word tokens of a search box query, duplicates removed"""
+    words = re.findall(r"\w+", (text or '').lower())
+    return [word for word in dict.fromkeys(words) if len(word) >= min_length]
+
+
+def highlight(row, terms, width=12):
+    """Snippet of about width words around the first term hit, terms in **bold**"""
+    pattern = re.compile(r"\b(" + '|'.join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    for col in SEARCH_COLUMNS:
+        words = (row.get(col) or '').split()
+        for i, word in enumerate(words):
+            if pattern.search(word):
+                start = max(i - width // 2, 0)
+                window = [pattern.sub(lambda m: f"**{m.group(0)}**", w) for w in words[start:start + width]]
+                return ('…' if start else '') + ' '.join(window) + ('…' if start + width < len(words) else '')
+    return ''
+
+
+class StorageBackend:
+    """Repository API shared by every database engine"""
+
+    name = None
+
+    # ---------- ENGINE HOOKS ----------
+
+    def connection(self):
+        """Context manager yielding a DB-API connection"""
+        raise NotImplementedError
+
+    def sql(self, text):
+        """Adapt canonical %s-style SQL to this engine's paramstyle"""
+        return text
+
+    def _is_integrity_error(self, error):
+        raise NotImplementedError
+
+    def floor_div(self, expr, divisor):
+        """SQL expression for floor(expr / divisor) with an integer divisor"""
+        return f"FLOOR({expr} / {int(divisor)})"
+
+    def tuple_cursor(self, conn):
+        """Cursor on conn that returns rows as tuples"""
+        raise NotImplementedError
+
+    def explain(self, sql, params=()):
+        """Query plan rows for a SELECT"""
+        return self.query(f"EXPLAIN {sql}", params)
+
+    def plan_reads_range(self, plan, index):
+        """True if an explain() plan seeks into index (an equality or range lookup)
+
+        An ordered scan of the whole index does not count: its cost grows
+        with the table, not with the rows returned.
+        """
+        raise NotImplementedError
+
+    def table_row_estimate(self, table):
+        """Approximate row count of table from engine metadata, without scanning it"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Engine-specific connection statistics"""
+        return {}
+
+    def close(self):
+        """Release all connections held by the backend"""
+
+    # ---------- GENERIC HELPERS ----------
+
+    def query(self, sql, params=()):
+        """Run a SELECT and return all rows as dicts"""
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute(self.sql(sql), params)
+            return c.fetchall()
+
+    def stream(self, sql, params=(), chunk_size=DEFAULT_STREAM_CHUNK):
+        """Run a SELECT and yield (column_names, rows) chunks of plain tuples
+
+        Rows are fetched chunk_size at a time from a cursor that does not
+        build dicts (and, on MySQL, does not buffer the whole result).
+        """
+        with self.connection() as conn:
+            c = self.tuple_cursor(conn)
+            try:
+                c.execute(self.sql(sql), params)
+                names = [col[0] for col in c.description]
+                while True:
+                    rows = c.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield names, rows
+            finally:
+                c.close()
+
+    def query_one(self, sql, params=()):
+        """Run a SELECT and return the first row as a dict, or None"""
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute(self.sql(sql), params)
+            return c.fetchone()
+
+    def execute(self, sql, params=()):
+        """Run a single write statement and commit; returns lastrowid"""
+        try:
+            with self.connection() as conn:
+                c = conn.cursor()
+                c.execute(self.sql(sql), params)
+                conn.commit()
+                return c.lastrowid
+        except Exception as e:
+            if self._is_integrity_error(e):
+                raise IntegrityError(str(e)) from e
+            raise
+
+    def keyset_page(self, table, order_col, key_col, after=None, limit=DEFAULT_PAGE_SIZE,
+                    filters=(), columns='*', descending=True, nullable=False):
+        """One page of rows ordered by (order_col, key_col), descending by default
+
+        after    - cursor from the previous page, or None for the first page
+        filters  - (sql_fragment, params) pairs ANDed into the WHERE clause
+        nullable - order_col may hold NULLs
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        direction = 'DESC' if descending else 'ASC'
+        rows = []
+        for segment in _keyset_segments(order_col, key_col, after, descending, nullable):
+            where, params = _where(list(filters) + ([segment] if segment else []))
+            rows += self.query(
+                f"SELECT {columns} FROM {table}{where} "
+                f"ORDER BY {order_col} {direction}, {key_col} {direction} LIMIT %s",
+                tuple(params) + (limit + 1 - len(rows),)
+            )
+            if len(rows) > limit:
+                break
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, (last[order_col], last[key_col])
+        return rows, None
+
+    def _grid_filters(self, table, filters=None, search=None):
+        """Validated GRID_TABLES spec and keyset_page filters for a grid query"""
+        if table not in GRID_TABLES:
+            raise ValueError(f"No data grid for table {table}")
+        spec = GRID_TABLES[table]
+        conditions = []
+        for col, value in sorted((filters or {}).items()):
+            if col not in spec['columns']:
+                raise ValueError(f"Unknown {table} column: {col}")
+            conditions.append((f"{col} = %s", (value,)))
+        # Every word must appear in one of the search columns
+        for term in search_terms(search):
+            conditions.append((
+                '(' + ' OR '.join(f"LOWER({col}) LIKE %s" for col in spec['search']) + ')',
+                (f"%{term}%",) * len(spec['search'])
+            ))
+        return spec, conditions
+
+    def grid_page(self, table, columns=None, sort=None, descending=True, filters=None,
+                  search=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """One page of a GRID_TABLES table, sorted and filtered in SQL
+
+        sort is any grid column (the key column by default), filters maps
+        columns to required values and search is matched word by word
+        against the table's search columns. Returns (rows, next_cursor)
+        like keyset_page.
+        """
+        spec, conditions = self._grid_filters(table, filters, search)
+        key = spec['key']
+        sort = sort or key
+        columns = list(columns or spec['columns'])
+        unknown = [col for col in columns + [sort] if col not in spec['columns']]
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {', '.join(unknown)}")
+        projection = ', '.join(dict.fromkeys(columns + [sort, key]))
+        return self.keyset_page(table, sort, key, after, limit, conditions, projection,
+                                descending, nullable=sort != key)
+
+    def grid_count(self, table, filters=None, search=None, limit=GRID_COUNT_LIMIT):
+        """Rows matching a grid query; returns (rows, accuracy)
+
+        Counts at most limit + 1 rows. accuracy is 'exact'; 'estimate' for
+        an unfiltered table above limit, from engine metadata; or
+        'at least' for a filtered query above limit, with rows = limit.
+        """
+        _, conditions = self._grid_filters(table, filters, search)
+        where, params = _where(conditions)
+        counted = self.query_one(
+            f"SELECT COUNT(*) AS n FROM (SELECT 1 FROM {table}{where} LIMIT %s) bounded",
+            tuple(params) + (limit + 1,)
+        )['n']
+        if counted <= limit:
+            return counted, 'exact'
+        if not conditions:
+            return max(int(self.table_row_estimate(table) or 0), counted), 'estimate'
+        return limit, 'at least'
+
+    def bulk_insert(self, table, columns, rows, to_params, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Insert rows in chunks, one transaction and one executemany per chunk
+
+        to_params(row) converts an input row to a parameter tuple and may raise
+        to reject it. If a chunk fails, it is retried row by row so that only
+        the offending rows are rejected. Returns a report dict:
+        inserted, failed, errors [(row_index, message)], violations
+        [row_index, ...] for unique/foreign key failures, seconds, rows_per_sec.
+        """
+        placeholders = ', '.join(['%s'] * len(columns))
+        sql = self.sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})")
+        report = {'inserted': 0, 'failed': 0, 'errors': [], 'violations': []}
+        start = time.perf_counter()
+
+        def reject(index, error):
+            report['failed'] += 1
+            report['errors'].append((index, str(error)))
+
+        iterator = enumerate(rows)
+        with self.connection() as conn:
+            c = conn.cursor()
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+
+                batch = []
+                for index, row in chunk:
+                    try:
+                        batch.append((index, tuple(to_params(row))))
+                    except Exception as e:
+                        reject(index, e)
+                if not batch:
+                    continue
+
+                try:
+                    c.executemany(sql, [params for _, params in batch])
+                    conn.commit()
+                    report['inserted'] += len(batch)
+                    continue
+                except Exception:
+                    conn.rollback()
+
+                # Isolate the bad rows; statement failures keep the transaction open
+                for index, params in batch:
+                    try:
+                        c.execute(sql, params)
+                        report['inserted'] += 1
+                    except Exception as e:
+                        if self._is_integrity_error(e):
+                            report['violations'].append(index)
+                        reject(index, e)
+                conn.commit()
+
+        report['errors'].sort(key=lambda error: error[0])
+        report['violations'].sort()
+        report['seconds'] = time.perf_counter() - start
+        report['rows_per_sec'] = report['inserted'] / report['seconds'] if report['seconds'] else 0.0
+        return report
+
+    def init_schema(self, password_hasher):
+        """Apply pending migrations and seed the default accounts; returns applied versions"""
+        applied = migrate(self)
+        with self.connection() as conn:
+            c = conn.cursor()
+
+            # ---------- SEED DEFAULT ADMIN & USER ----------
+            for email, password, full_name, role in DEFAULT_ACCOUNTS:
+                c.execute(self.sql("SELECT 1 FROM users WHERE email = %s"), (email,))
+                if not c.fetchone():
+                    c.execute(
+                        self.sql("INSERT INTO users (email, password, full_name, role, phone) "
+                                 "VALUES (%s, %s, %s, %s, %s)"),
+                        (email, password_hasher(password), full_name, role, "")
+                    )
+            conn.commit()
+        return applied
+
+    # ---------- USERS ----------
+
+    def create_user(self, email, password_hash, full_name, role='user', phone=''):
+        """Insert a user; raises IntegrityError if the email exists"""
+        return self.execute(
+            "INSERT INTO users (email, password, full_name, role, phone) VALUES (%s, %s, %s, %s, %s)",
+            (email, password_hash, full_name, role, phone)
+        )
+
+    def add_users_bulk(self, users, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Bulk insert (email, password_hash, full_name, role, phone) tuples
+
+        Duplicate emails show up in the report's violations list.
+        """
+        return self.bulk_insert('users', ('email', 'password', 'full_name', 'role', 'phone'),
+                                users, tuple, chunk_size)
+
+    def update_password(self, user_id, password_hash):
+        self.execute('UPDATE users SET password = %s WHERE user_id = %s', (password_hash, user_id))
+
+    def get_user_by_email(self, email):
+        """Full user row including the password hash, or None"""
+        return self.query_one('SELECT * FROM users WHERE email = %s', (email,))
+
+    def get_all_users(self):
+        return self.query(f"SELECT {', '.join(USER_COLUMNS)} FROM users")
+
+    def existing_user_ids(self, user_ids):
+        """The subset of user_ids that belong to a user"""
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return set()
+        rows = self.query(
+            f"SELECT user_id FROM users WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+            tuple(user_ids)
+        )
+        return {row['user_id'] for row in rows}
+
+    def get_users_page(self, after=None, limit=DEFAULT_PAGE_SIZE, role=None,
+                       date_from=None, date_to=None):
+        """Users newest first, keyed on (created_at, user_id)"""
+        filters = _date_range_filters('created_at', date_from, date_to)
+        if role:
+            filters.append(('role = %s', (role,)))
+        return self.keyset_page('users', 'created_at', 'user_id', after, limit,
+                                filters, ', '.join(USER_COLUMNS))
+
+    # ---------- PATIENT HISTORY ----------
+
+    def patient_history_params(self, user_id, patient_data):
+        """Parameter tuple for PATIENT_INSERT_COLUMNS from a patient_data dict"""
+        return (
+            user_id, patient_data.get('name'), patient_data.get('age'),
+            patient_data.get('gender'), patient_data.get('disease_name'),
+            patient_data.get('symptoms'), patient_data.get('severity_level'),
+            patient_data.get('medical_history'),
+            patient_data.get('diagnosis_date') or datetime.now().strftime('%Y-%m-%d'),
+            patient_data.get('height_cm'), patient_data.get('weight_kg'),
+            patient_data.get('BMI'), patient_data.get('smoking_status'),
+            patient_data.get('exercise_level'), patient_data.get('treatment_given'),
+            patient_data.get('medicine_prescribed'), patient_data.get('treatment_cost'),
+            patient_data.get('follow_up_date'), patient_data.get('total_amount'),
+            patient_data.get('insurance_used'), patient_data.get('status') or 'completed',
+        )
+
+    def add_patient_history(self, user_id, patient_data):
+        placeholders = ', '.join(['%s'] * len(PATIENT_INSERT_COLUMNS))
+        return self.execute(
+            f"INSERT INTO patient_history ({', '.join(PATIENT_INSERT_COLUMNS)}) VALUES ({placeholders})",
+            self.patient_history_params(user_id, patient_data)
+        )
+
+    def add_patient_history_bulk(self, records, user_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Bulk insert patient_data dicts or PATIENT_INSERT_COLUMNS-ordered tuples
+
+        Dicts take their owner from a 'user_id' key, falling back to user_id.
+        """
+        def to_params(record):
+            if isinstance(record, dict):
+                owner = record.get('user_id', user_id)
+                if owner is None:
+                    raise ValueError("Missing user_id")
+                return self.patient_history_params(owner, record)
+            if len(record) != len(PATIENT_INSERT_COLUMNS):
+                raise ValueError(f"Expected {len(PATIENT_INSERT_COLUMNS)} values, got {len(record)}")
+            return record
+
+        return self.bulk_insert('patient_history', PATIENT_INSERT_COLUMNS, records, to_params, chunk_size)
+
+    def get_patient_history(self, user_id):
+        return self.query('SELECT * FROM patient_history WHERE user_id = %s ORDER BY created_at DESC',
+                          (user_id,))
+
+    def get_all_patient_history(self):
+        return self.query('SELECT * FROM patient_history ORDER BY created_at DESC')
+
+    def _patient_filters(self, user_id=None, status=None, date_from=None, date_to=None):
+        filters = _date_range_filters('created_at', date_from, date_to)
+        if user_id is not None:
+            filters.append(('user_id = %s', (user_id,)))
+        if status:
+            filters.append(('status = %s', (status,)))
+        return filters
+
+    def get_patient_history_page(self, after=None, limit=DEFAULT_PAGE_SIZE, user_id=None,
+                                 status=None, date_from=None, date_to=None, columns=None):
+        """Patient visits newest first, keyed on (created_at, patient_id)"""
+        return self.keyset_page(
+            'patient_history', 'created_at', 'patient_id', after, limit,
+            self._patient_filters(user_id, status, date_from, date_to),
+            patient_projection(columns, required=('created_at', 'patient_id'))
+        )
+
+    def _select_patient_history_sql(self, columns, user_id=None, status=None, date_from=None,
+                                    date_to=None, limit=None):
+        where, params = _where(self._patient_filters(user_id, status, date_from, date_to))
+        sql = f"SELECT {patient_projection(columns)} FROM patient_history{where} ORDER BY created_at DESC, patient_id DESC"
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        return sql, tuple(params)
+
+    def select_patient_history(self, columns, user_id=None, status=None, date_from=None,
+                               date_to=None, limit=None):
+        """Only the requested patient_history columns, newest first"""
+        return self.query(*self._select_patient_history_sql(
+            columns, user_id, status, date_from, date_to, limit))
+
+    def stream_patient_history(self, columns, user_id=None, status=None, date_from=None,
+                               date_to=None, limit=None, chunk_size=DEFAULT_STREAM_CHUNK):
+        """select_patient_history as stream() chunks of tuples in column order"""
+        sql, params = self._select_patient_history_sql(columns, user_id, status, date_from,
+                                                       date_to, limit)
+        for _, rows in self.stream(sql, params, chunk_size):
+            yield rows
+
+    def search_patient_history(self, text, user_id=None, after=None, limit=DEFAULT_SEARCH_PAGE_SIZE):
+        """Visits whose notes match every word of text, best match first
+
+        Each hit has SEARCH_RESULT_COLUMNS plus a **highlighted** snippet and
+        a score. MySQL ranks every match; SQLite ranks SEARCH_RANK_WINDOW
+        matches at a time, newest first. Returns (rows, next_cursor) like
+        keyset_page so it works with the same pager; the cursor is opaque.
+        """
+        raise NotImplementedError
+
+    # ---------- DASHBOARD ----------
+
+    def dashboard_summary(self, recent=5):
+        """Admin KPI tiles in one connection checkout
+
+        Returns counts (users, appointments, pending, completed) plus the
+        newest recent users by created_at and the most recently booked
+        recent appointments, each read through an index.
+        """
+        with self.connection() as conn:
+            c = conn.cursor()
+            c.execute(self.sql(DASHBOARD_COUNTS_SQL))
+            summary = {key: int(value or 0) for key, value in c.fetchone().items()}
+            c.execute(self.sql(
+                f"SELECT {', '.join(USER_COLUMNS)} FROM users "
+                "ORDER BY created_at DESC, user_id DESC LIMIT %s"), (recent,))
+            summary['recent_users'] = c.fetchall()
+            c.execute(self.sql(
+                f"SELECT {', '.join(APPOINTMENT_COLUMNS)} FROM appointments "
+                "ORDER BY appointment_id DESC LIMIT %s"), (recent,))
+            summary['recent_appointments'] = c.fetchall()
+        return summary
+
+    # ---------- APPOINTMENTS ----------
+
+    def add_appointment(self, user_id, appointment_date, appointment_time):
+        return self.execute(
+            'INSERT INTO appointments (user_id, appointment_date, appointment_time) VALUES (%s, %s, %s)',
+            (user_id, appointment_date, appointment_time)
+        )
+
+    def add_appointments_bulk(self, appointments, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Bulk insert appointment dicts or (user_id, date, time[, status[, notes]]) tuples"""
+        def to_params(appointment):
+            if isinstance(appointment, dict):
+                appointment = tuple(appointment.get(col) for col in APPOINTMENT_INSERT_COLUMNS)
+            if not 3 <= len(appointment) <= len(APPOINTMENT_INSERT_COLUMNS):
+                raise ValueError(f"Expected 3 to 5 values, got {len(appointment)}")
+            user_id, appointment_date, appointment_time, *rest = appointment
+            status = rest[0] if rest and rest[0] else 'pending'
+            admin_notes = rest[1] if len(rest) > 1 else None
+            if user_id is None or not appointment_date or not appointment_time:
+                raise ValueError("user_id, appointment_date and appointment_time are required")
+            return (user_id, str(appointment_date), str(appointment_time), status, admin_notes)
+
+        return self.bulk_insert('appointments', APPOINTMENT_INSERT_COLUMNS, appointments, to_params, chunk_size)
+
+    def get_appointments(self, user_id):
+        return self.query('SELECT * FROM appointments WHERE user_id = %s ORDER BY appointment_date DESC',
+                          (user_id,))
+
+    def get_all_appointments(self):
+        return self.query('SELECT * FROM appointments ORDER BY appointment_date DESC, appointment_time DESC')
+
+    def get_appointments_page(self, after=None, limit=DEFAULT_PAGE_SIZE, user_id=None,
+                              status=None, date_from=None, date_to=None):
+        """Appointments latest date first, keyed on (appointment_date, appointment_id)"""
+        filters = _date_range_filters('appointment_date', date_from, date_to)
+        if user_id is not None:
+            filters.append(('user_id = %s', (user_id,)))
+        if status:
+            filters.append(('status = %s', (status,)))
+        return self.keyset_page('appointments', 'appointment_date', 'appointment_id', after, limit, filters)
+
+
+def _mysql_decimal(value):
+    # SUM of integers comes back as a DECIMAL without a fraction; SQLite returns an int
+    return float(value) if '.' in value else int(value)
+
+
+class MySQLBackend(StorageBackend):
+    """pymysql engine with a pooled, health-checked connection set"""
+
+    name = 'mysql'
+
+    def __init__(self, db_config, pool_config=None):
+        import pymysql
+
+        self._pymysql = pymysql
+        config = dict(db_config)
+        config['cursorclass'] = pymysql.cursors.DictCursor
+        # Rows shaped as SQLite returns them: dates, times and timestamps as ISO
+        # strings, DECIMAL results (AVG, SUM) as float or int
+        config['conv'] = dict(pymysql.converters.conversions)
+        for field_type in ('DATE', 'TIME', 'DATETIME', 'TIMESTAMP'):
+            config['conv'][getattr(pymysql.constants.FIELD_TYPE, field_type)] = str
+        for field_type in ('DECIMAL', 'NEWDECIMAL'):
+            config['conv'][getattr(pymysql.constants.FIELD_TYPE, field_type)] = _mysql_decimal
+        self.pool = ConnectionPool(
+            lambda: pymysql.connect(**config),
+            ping=lambda conn: conn.ping(reconnect=False),
+            # End any open transaction so the next borrower sees fresh data
+            reset=lambda conn: conn.rollback(),
+            **(pool_config or {})
+        )
+
+    def connection(self):
+        return self.pool.connection()
+
+    def _is_integrity_error(self, error):
+        return isinstance(error, self._pymysql.IntegrityError)
+
+    def tuple_cursor(self, conn):
+        # Unbuffered: rows stream from the server instead of being held client-side
+        return conn.cursor(self._pymysql.cursors.SSCursor)
+
+    def plan_reads_range(self, plan, index):
+        return any(row.get('key') == index and row.get('type') in MYSQL_RANGE_ACCESS for row in plan)
+
+    def table_row_estimate(self, table):
+        # InnoDB's sampled statistics; no scan
+        row = self.query_one(
+            'SELECT TABLE_ROWS AS n FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            (table,)
+        )
+        return row['n'] if row else 0
+
+    def search_patient_history(self, text, user_id=None, after=None, limit=DEFAULT_SEARCH_PAGE_SIZE):
+        # InnoDB skips tokens shorter than innodb_ft_min_token_size (3)
+        terms = search_terms(text, min_length=3)
+        if not terms:
+            return [], None
+        match = f"MATCH({', '.join(SEARCH_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)"
+        against = ' '.join(f"+{term}*" for term in terms)
+        where, params = match, [against, against]
+        if user_id is not None:
+            where += " AND user_id = %s"
+            params.append(user_id)
+        if after is not None:
+            # Keyset on (score, patient_id): resume after the last hit shown
+            where += f" AND ({match} < %s OR ({match} = %s AND patient_id > %s))"
+            params.extend((against, after[0], against, after[0], after[1]))
+        rows = self.query(
+            f"SELECT {', '.join(SEARCH_RESULT_COLUMNS + SEARCH_COLUMNS)}, {match} AS score "
+            f"FROM patient_history WHERE {where} "
+            f"ORDER BY score DESC, patient_id LIMIT %s",
+            tuple(params) + (limit + 1,)
+        )
+        hits = [dict({col: row[col] for col in SEARCH_RESULT_COLUMNS},
+                     snippet=highlight(row, terms), score=row['score'])
+                for row in rows[:limit]]
+        return hits, ((hits[-1]['score'], hits[-1]['patient_id']) if len(rows) > limit else None)
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close()
+
+
+def _dict_factory(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SQLiteBackend(StorageBackend):
+    """sqlite3 engine with one persistent WAL connection per live thread"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, pragmas=None):
+        self.path = path
+        self.manager = SQLiteConnectionManager(path, pragmas=pragmas, row_factory=_dict_factory)
+
+    def connection(self):
+        return self.manager.connection()
+
+    def sql(self, text):
+        return text.replace('%s', '?')
+
+    def floor_div(self, expr, divisor):
+        return f"CAST({expr} / {int(divisor)} AS INTEGER)"
+
+    def tuple_cursor(self, conn):
+        c = conn.cursor()
+        c.row_factory = None
+        return c
+
+    def explain(self, sql, params=()):
+        return self.query(f"EXPLAIN QUERY PLAN {sql}", params)
+
+    def plan_reads_range(self, plan, index):
+        return any(row['detail'].startswith('SEARCH') and index in row['detail'].split() for row in plan)
+
+    def table_row_estimate(self, table):
+        # Rowids are assigned in increasing order; the span is exact until rows are deleted
+        row = self.query_one(f"SELECT MAX(rowid) - MIN(rowid) + 1 AS n FROM {table}")
+        return row['n'] or 0
+
+    def search_patient_history(self, text, user_id=None, after=None, limit=DEFAULT_SEARCH_PAGE_SIZE):
+        terms = search_terms(text)
+        if not terms:
+            return [], None
+        # Quote each word so FTS5 operators typed by users are matched literally;
+        # the last word is a prefix so partially typed words still match
+        phrases = [f'"{term}"' for term in terms]
+        phrases[-1] += '*'
+        match = ' '.join(phrases)
+        owner, owner_params = "", ()
+        if user_id is not None:
+            owner, owner_params = " AND p.user_id = %s", (user_id,)
+        # The cursor is (window top rowid, rank, rowid) of the last hit shown
+        top, last_rank, last_id = after or (None, None, None)
+        hits = []
+        while len(hits) <= limit:
+            below, below_params = ("", ()) if top is None else (" AND f.rowid < %s", (top,))
+            # FTS5 walks matches in rowid order cheaply; find where this window ends
+            floor = self.query_one(
+                f"SELECT MIN(id) AS floor FROM (SELECT f.rowid AS id FROM patient_history_fts f "
+                f"JOIN patient_history p ON p.patient_id = f.rowid "
+                f"WHERE f.patient_history_fts MATCH %s{owner}{below} ORDER BY f.rowid DESC LIMIT %s)",
+                (match,) + owner_params + below_params + (SEARCH_RANK_WINDOW,)
+            )['floor']
+            if floor is None:
+                break
+            where, params = f"f.patient_history_fts MATCH %s{owner}{below} AND f.rowid >= %s", \
+                (match,) + owner_params + below_params + (floor,)
+            if last_rank is not None:
+                where += " AND (f.rank > %s OR (f.rank = %s AND f.rowid > %s))"
+                params += (last_rank, last_rank, last_id)
+            rows = self.query(
+                f"SELECT {', '.join('p.' + col for col in SEARCH_RESULT_COLUMNS)}, "
+                f"snippet(patient_history_fts, -1, '**', '**', '…', 12) AS snippet, f.rank AS rank "
+                f"FROM patient_history_fts f JOIN patient_history p ON p.patient_id = f.rowid "
+                f"WHERE {where} ORDER BY f.rank, f.rowid LIMIT %s",
+                params + (limit + 1 - len(hits),)
+            )
+            hits += [(top, row) for row in rows]
+            # This window is used up: the next one starts below it
+            top, last_rank, last_id = floor, None, None
+        cursor = None
+        if len(hits) > limit:
+            window, row = hits[limit - 1]
+            cursor = (window, row['rank'], row['patient_id'])
+        page = []
+        for _, row in hits[:limit]:
+            rank = row.pop('rank')
+            page.append(dict(row, score=-rank))
+        return page, cursor
+
+    def _is_integrity_error(self, error):
+        return isinstance(error, sqlite3.IntegrityError)
+
+    def stats(self):
+        return {'open_connections': self.manager.open_connections()}
+
+    def close(self):
+        self.manager.close_all()
+
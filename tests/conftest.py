@@ -0,0 +1,44 @@
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import MySQLBackend, SQLiteBackend  # noqa: E402
+
+
+def _fast_hash(password):
+    # Legacy SHA-256 format: seeding accounts should not run the KDF
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def _seed(backend, rows=3000):
+    user_id = backend.create_user(f"plans-{rows}@wecare.com", "x", "Plans User")
+    backend.add_users_bulk((f"plans-{i}@wecare.com", "x", f"User {i}", 'user', '') for i in range(rows))
+    backend.add_patient_history_bulk(
+        ({'name': f"Patient {i}", 'age': 20 + i % 60, 'diagnosis_date': f"2024-{i % 12 + 1:02d}-01"}
+         for i in range(rows)), user_id)
+    backend.add_appointments_bulk(
+        (user_id, f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", f"{9 + i % 8:02d}:00") for i in range(rows))
+    if backend.name == 'mysql':
+        backend.execute('ANALYZE TABLE users, patient_history, appointments')
+    else:
+        backend.execute('ANALYZE')
+
+
+@pytest.fixture(scope='module', params=['sqlite', 'mysql'])
+def backend(request, tmp_path_factory):
+    """Migrated, seeded backend; MySQL only when WECARE_TEST_MYSQL points it at a scratch database"""
+    if request.param == 'sqlite':
+        backend = SQLiteBackend(str(tmp_path_factory.mktemp('plans') / 'plans.db'))
+    else:
+        if not os.environ.get('WECARE_TEST_MYSQL'):
+            pytest.skip("set WECARE_TEST_MYSQL=1 to run against database.DB_CONFIG")
+        import database
+        backend = MySQLBackend(database.DB_CONFIG, database.POOL_CONFIG)
+    backend.init_schema(_fast_hash)
+    _seed(backend)
+    yield backend
+    backend.close()
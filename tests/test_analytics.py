@@ -0,0 +1,15 @@
+"""Scatter samples stay within the chart payload cap"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import stratified_sample
+
+
+@pytest.mark.parametrize('max_points, grid', [(2000, 5), (500, 20), (100, 30)])
+def test_stratified_sample_keeps_the_cap_and_every_row_represented(max_points, grid):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'x': rng.random(50000), 'y': rng.random(50000), 'g': rng.integers(0, 10, 50000)})
+    sample = stratified_sample(frame, 'x', 'y', 'g', max_points=max_points, grid=grid)
+    assert len(sample) == max_points
+    assert sample['represents'].sum() == pytest.approx(len(frame))
@@ -0,0 +1,16 @@
+"""Phrase lookups over free-text symptom descriptions"""
+from diagnosis import PhraseIndex, SymptomMatcher
+
+
+def test_phrases_that_tokenize_alike_all_match():
+    index = PhraseIndex(['sore throat', 'Sore-Throat', 'fever', 'sore  throat'])
+    assert index.find("a fever and a sore throat") == [2, 0, 1, 3]
+
+
+def test_matcher_merges_spellings_that_tokenize_alike():
+    matcher = SymptomMatcher({'cough': ['Flu'], 'coughs': ['Flu', 'Strep'], 'fever': ['Flu']})
+    assert matcher.find_symptoms("bad coughs") == ['cough']
+    flu, strep = sorted(matcher.match("coughs and fever"), key=lambda r: r['disease'])
+    assert flu['symptoms'] == ['cough', 'fever'] and flu['coverage'] == 1.0
+    assert strep['symptoms'] == ['cough'] and strep['coverage'] == 1.0
+    assert matcher.rank(['coughs', 'cough']) == matcher.rank(['cough'])
@@ -0,0 +1,11 @@
+"""Upload validation rules"""
+import pandas as pd
+
+from ingestion import validate
+
+
+def test_whole_number_fields_reject_fractions():
+    frame = pd.DataFrame({'name': ['A', 'B', 'C'], 'disease_name': ['flu'] * 3,
+                          'age': ['30', '30.5', '41.0'], 'user_id': ['1', '2', '3.7']})
+    _, reasons = validate(frame)
+    assert list(reasons) == ['', 'age is not a whole number', 'user_id is not a whole number']
@@ -0,0 +1,67 @@
+"""Hot listing queries must seek into their indexes, not scan them"""
+import pytest
+
+import storage
+from migrations import HOT_QUERIES, check_hot_queries
+
+
+@pytest.mark.parametrize('label', [query[0] for query in HOT_QUERIES])
+def test_hot_query_seeks_into_its_index(backend, label):
+    checks = {checked[0]: checked for checked in check_hot_queries(backend)}
+    _, index, seeks, plan = checks[label]
+    assert seeks, f"{label} does not seek into {index}: {plan}"
+
+
+def test_scanning_an_index_is_not_a_seek(backend):
+    if backend.name != 'sqlite':
+        pytest.skip("MySQL may still plan an index merge for the OR-only form")
+    # The OR-only cursor form walks idx_appointments_date_id from the top
+    plan = backend.explain(
+        'SELECT * FROM appointments WHERE (appointment_date < %s OR '
+        '(appointment_date = %s AND appointment_id < %s)) '
+        'ORDER BY appointment_date DESC, appointment_id DESC LIMIT %s',
+        ('2024-06-01', '2024-06-01', 1000, 51)
+    )
+    assert not backend.plan_reads_range(plan, 'idx_appointments_date_id'), plan
+
+
+def _page_queries(backend, monkeypatch, fetch):
+    """(sql, params) of every query fetch(backend) runs"""
+    seen = []
+    query = backend.query
+
+    def recording(sql, params=()):
+        seen.append((sql, params))
+        return query(sql, params)
+
+    monkeypatch.setattr(backend, 'query', recording)
+    fetch(backend)
+    monkeypatch.undo()
+    return seen
+
+
+def _second_page(method, **kwargs):
+    def fetch(backend):
+        _, cursor = getattr(backend, method)(limit=50, **kwargs)
+        assert cursor is not None
+        getattr(backend, method)(after=cursor, limit=50, **kwargs)
+    return fetch
+
+
+@pytest.mark.parametrize('fetch, index', [
+    (_second_page('get_users_page'), 'idx_users_created'),
+    (_second_page('get_patient_history_page'), 'idx_patient_history_created'),
+    (_second_page('get_appointments_page'), 'idx_appointments_date_id'),
+], ids=['users', 'patient_history', 'appointments'])
+def test_keyset_pages_seek_past_the_first_page(backend, monkeypatch, fetch, index):
+    sql, params = _page_queries(backend, monkeypatch, fetch)[-1]
+    plan = backend.explain(sql, params)
+    assert backend.plan_reads_range(plan, index), plan
+
+
+def test_nullable_grid_sort_reads_non_null_rows_as_a_range(backend):
+    cursor = ('Patient 5', 10)
+    segments = storage._keyset_segments('name', 'patient_id', cursor, descending=True, nullable=True)
+    fragment, params = segments[0]
+    assert fragment.startswith('name <= %s')
+    assert segments[1] == ('name IS NULL', ())
@@ -0,0 +1,21 @@
+"""Both engines return rows of the same shape"""
+import pytest
+
+ROW_TYPES = [
+    ('SELECT user_id, email, created_at FROM users ORDER BY user_id LIMIT 1',
+     {'user_id': int, 'email': str, 'created_at': str}),
+    ('SELECT patient_id, age, diagnosis_date, created_at, updated_at FROM patient_history '
+     'ORDER BY patient_id LIMIT 1',
+     {'patient_id': int, 'age': int, 'diagnosis_date': str, 'created_at': str, 'updated_at': str}),
+    ('SELECT appointment_id, appointment_date, appointment_time FROM appointments '
+     'ORDER BY appointment_id LIMIT 1',
+     {'appointment_id': int, 'appointment_date': str, 'appointment_time': str}),
+    ('SELECT COUNT(*) AS n, SUM(age) AS total_age, AVG(age) AS avg_age FROM patient_history',
+     {'n': int, 'total_age': int, 'avg_age': float}),
+]
+
+
+@pytest.mark.parametrize('sql, types', ROW_TYPES, ids=['users', 'patient_history', 'appointments', 'aggregates'])
+def test_row_types_match_across_engines(backend, sql, types):
+    row = backend.query_one(sql)
+    assert {col: type(value) for col, value in row.items()} == types
@@ -0,0 +1,30 @@
+"""Full-text search pages through every match, best first within each rank window"""
+import hashlib
+
+import storage
+from storage import SQLiteBackend
+
+
+def test_sqlite_search_pages_reach_every_match(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'SEARCH_RANK_WINDOW', 1000)
+    backend = SQLiteBackend(str(tmp_path / 'search.db'))
+    try:
+        backend.init_schema(lambda password: hashlib.sha256(password.encode()).hexdigest())
+        user_id = backend.create_user("search@wecare.com", "x", "Search User")
+        backend.add_patient_history_bulk(
+            ({'name': f"Patient {i}", 'symptoms': 'fever' + ' fever' * (i % 3)} for i in range(5000)), user_id)
+        for owner in (None, user_id):
+            hits, after = [], None
+            while True:
+                page, after = backend.search_patient_history('fever', user_id=owner, after=after, limit=300)
+                hits += page
+                if after is None:
+                    break
+            assert sorted(hit['patient_id'] for hit in hits) == list(range(1, 5001))
+            # Newest 1000 matches first, each window ranked best first
+            for window in range(5):
+                ranked = hits[window * 1000:(window + 1) * 1000]
+                assert {hit['patient_id'] for hit in ranked} == set(range(4001 - window * 1000, 5001 - window * 1000))
+                assert [hit['score'] for hit in ranked] == sorted((hit['score'] for hit in ranked), reverse=True)
+    finally:
+        backend.close()